@@ -0,0 +1,28 @@
+from rest_framework.authentication import BaseAuthentication
+
+from accounts import utils
+
+"""
+DRF authentication of players by the player_api_key and player_secret_key of a request,
+checked against the player cache of `accounts.cache` rather than the database.  The
+default authentication of every view (settings.REST_FRAMEWORK), which then read their
+request's body as request.data, as the authentication has already parsed it.
+"""
+
+
+class PlayerKeyAuthentication(BaseAuthentication):
+    """ Authenticates the player of a request's player_api_key and player_secret_key, from
+    its body, never its query string, which would put the secret in logs.  request.user is then a :py:class:`accounts.utils.CachedPlayer`
+    and request.auth its player key.  Missing or mismatched keys leave the request
+    unauthenticated, for the view to answer as it answers any invalid request.
+    """
+
+    def authenticate(self, request):
+        data = request.data if hasattr(request.data, 'get') else {}
+        player_key, secret_key = data.get('player_api_key'), data.get('player_secret_key')
+        if not isinstance(player_key, str) or not isinstance(secret_key, str) or not player_key:
+            return None
+        player = utils.authenticate_player(player_key, secret_key)
+        if not player:
+            return None
+        return player, player_key
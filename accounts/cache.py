@@ -0,0 +1,223 @@
+import collections
+import hashlib
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from parkle import state_utils
+
+"""
+Cache of player authentication, in front of the ParklePlayer table, which every
+authenticated request would otherwise query for data that rarely changes.
+
+Each player key maps to (player id, sha256 of the secret key), kept:
+
+    in process:  an LRU of recent players, each entry trusted for TTL seconds.
+    in redis:    "{<player tag>}player_auth:<player_key>":  {
+                     "entry": "<player id>:<secret hash>",
+                     "generation": incremented by every invalidation,
+                 }, shared by every process and kept for REDIS_TTL seconds.
+
+Saving or deleting a player invalidates its key (see `invalidate_player`), in redis and
+in this process;  other processes may trust their copy for up to TTL seconds more.
+An entry loaded from the database is only cached if its key was not invalidated while
+it loaded, so a load racing a change cannot cache the player as it was.  A key with no
+player is never cached, so guessing keys cannot fill redis, and a new player is found
+as soon as they are saved.
+"""
+
+# Overridden by settings.PARKLE_PLAYER_CACHE
+DEFAULT_PLAYER_CACHE_SETTINGS = {
+    'SIZE': 10000,            # Players kept in each process
+    'TTL': 30,                # Seconds a process trusts its copy of a player
+    'REDIS_TTL': 60 * 60,     # Seconds a player is kept in redis
+    'REDIS': True,            # Share the cache in redis, False for deployments without redis
+}
+
+# Caches the entry of a player key, unless the key was invalidated since it was read.
+#   KEYS: player auth hash
+#   ARGV: generation read (or ""), entry, ttl
+# Returns: 1 if cached, else 0
+CACHE_PLAYER_LUA = """
+if (redis.call('HGET', KEYS[1], 'generation') or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'entry', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# Forgets the entry of a player key, and bumps its generation so no load in progress caches it.
+#   KEYS: player auth hash
+#   ARGV: ttl
+INVALIDATE_PLAYER_LUA = """
+redis.call('HDEL', KEYS[1], 'entry')
+redis.call('HINCRBY', KEYS[1], 'generation', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+cache_player_script = state_utils.LuaScript(CACHE_PLAYER_LUA)
+invalidate_player_script = state_utils.LuaScript(INVALIDATE_PLAYER_LUA)
+
+PLAYER_CACHE_SETTINGS = None
+LOCAL_CACHE = None  # Created from settings on first use, see `get_local_cache`
+
+
+def player_cache_settings():
+    """ The cache settings, defaults updated by settings.PARKLE_PLAYER_CACHE, read on first use """
+    global PLAYER_CACHE_SETTINGS
+    if PLAYER_CACHE_SETTINGS is None:
+        try:
+            overrides = getattr(settings, 'PARKLE_PLAYER_CACHE', {})
+        except ImproperlyConfigured:  # Used outside of django, such as from a script
+            overrides = {}
+        PLAYER_CACHE_SETTINGS = dict(DEFAULT_PLAYER_CACHE_SETTINGS, **overrides)
+    return PLAYER_CACHE_SETTINGS
+
+
+class LRUCache(object):
+    """ Thread safe least recently used cache, whose entries expire ttl seconds after they are set. """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()  # key: (value, expires at), least recently used first
+        self.generation = 0  # Incremented by every invalidation, see `set`
+        self.lock = threading.Lock()
+
+    def get(self, key, now=None):
+        """ :return: the value of key, or None if it is not cached or has expired """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, now=None, generation=None):
+        """ Cache value for key, unless a generation is given and any key was invalidated since it was read. """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (value, now + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.generation += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def get_local_cache():
+    """ The process wide cache of players, created from settings on first use. """
+    global LOCAL_CACHE
+    if LOCAL_CACHE is None:
+        config = player_cache_settings()
+        LOCAL_CACHE = LRUCache(config['SIZE'], config['TTL'])
+    return LOCAL_CACHE
+
+
+def hash_secret(secret_key):
+    return hashlib.sha256(secret_key.encode('utf-8')).hexdigest()
+
+
+def secret_matches(entry, secret_key):
+    """ Whether secret_key is the secret of a cached (player id, secret hash) entry. """
+    return hmac.compare_digest(entry[1], hash_secret(secret_key))
+
+
+def player_cache_key(player_key):
+    return '{%s}player_auth:%s' % (state_utils.player_tag(player_key), player_key)
+
+
+def _pack_entry(entry):
+    return '%d:%s' % entry
+
+
+def _unpack_entry(value):
+    player_id, secret_hash = value.decode('utf-8').split(':')
+    return int(player_id), secret_hash
+
+
+def get_player_entry(player_key, load):
+    """ The cached (player id, secret hash) of a player key, loaded on a miss.
+    :param load: function of the player key, returning its (player id, secret hash) or None
+    :return: (player id, secret hash), or None if there is no such player
+    """
+    local = get_local_cache()
+    entry = local.get(player_key)
+    if entry is not None:
+        return entry
+    generation = local.generation
+    config = player_cache_settings()
+    if not config['REDIS']:
+        entry = load(player_key)
+    else:
+        conn = state_utils.get_connection(state_utils.player_tag(player_key))
+        key = player_cache_key(player_key)
+        value, redis_generation = conn.hmget(key, 'entry', 'generation')
+        if value is not None:
+            entry = _unpack_entry(value)
+        else:
+            entry = load(player_key)
+            if entry is None:  # A key with no player is never cached
+                return None
+            if not cache_player_script(conn, [key], [redis_generation or b'', _pack_entry(entry), config['REDIS_TTL']]):
+                return entry  # Invalidated while it loaded
+    if entry is not None:
+        local.set(player_key, entry, generation=generation)
+    return entry
+
+
+async def aget_player_entry(player_key, aload):
+    """ asyncio version of `get_player_entry`.
+    :param aload: coroutine function of the player key, returning its (player id, secret hash) or None
+    """
+    local = get_local_cache()
+    entry = local.get(player_key)
+    if entry is not None:
+        return entry
+    generation = local.generation
+    config = player_cache_settings()
+    if not config['REDIS']:
+        entry = await aload(player_key)
+    else:
+        conn = state_utils.get_async_connection(state_utils.player_tag(player_key))
+        key = player_cache_key(player_key)
+        value, redis_generation = await conn.hmget(key, 'entry', 'generation')
+        if value is not None:
+            entry = _unpack_entry(value)
+        else:
+            entry = await aload(player_key)
+            if entry is None:
+                return None
+            args = [redis_generation or b'', _pack_entry(entry), config['REDIS_TTL']]
+            if not await cache_player_script.acall(conn, [key], args):
+                return entry
+    if entry is not None:
+        local.set(player_key, entry, generation=generation)
+    return entry
+
+
+def invalidate_player(player_key):
+    """ Forget a player key, after its player was created, changed or deleted. """
+    get_local_cache().invalidate(player_key)
+    config = player_cache_settings()
+    if player_key and config['REDIS']:
+        conn = state_utils.get_connection(state_utils.player_tag(player_key))
+        invalidate_player_script(conn, [player_cache_key(player_key)], [config['REDIS_TTL']])
@@ -1,11 +1,34 @@
-from django.db import models
+from django.db import models, transaction
+
+from accounts import cache
 
 
 # Create your models here.
 class ParklePlayer(models.Model):
     """ Consider this our User model for a Registered Parkle Player.
+    Saving or deleting a player invalidates its cached authentication, see `accounts.cache`.
     """
     username = models.CharField(max_length=30, unique=True)
     email = models.EmailField(unique=True)
     player_key = models.CharField(max_length=32, unique=True)  # max length of uuid.hex
     secret_key = models.CharField(max_length=32, unique=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        player = super().from_db(db, field_names, values)
+        player._loaded_player_key = player.__dict__.get('player_key')
+        return player
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_cache()
+        self._loaded_player_key = self.player_key
+
+    def delete(self, *args, **kwargs):
+        self._invalidate_cache()
+        return super().delete(*args, **kwargs)
+
+    def _invalidate_cache(self):
+        """ Forget the player's key, and the key it was loaded with, once the change is committed. """
+        player_keys = {self.player_key, getattr(self, '_loaded_player_key', None)} - {None, ''}
+        transaction.on_commit(lambda: [cache.invalidate_player(player_key) for player_key in player_keys])
@@ -0,0 +1,92 @@
+
+# Test cases for the accounts player authentication cache
+
+import pytest
+
+from accounts import cache
+from parkle import state_utils
+
+
+def test_lru_cache():
+    """ Test that the least recently used entries are evicted, and entries expire after the ttl.
+    """
+    lru = cache.LRUCache(size=2, ttl=10)
+    lru.set('a', 1, now=0)
+    lru.set('b', 2, now=0)
+    assert lru.get('a', now=1) == 1
+    lru.set('c', 3, now=1)
+    assert lru.get('b', now=1) is None, "Expected b, the least recently used, evicted."
+    assert lru.get('a', now=9) == 1 and lru.get('c', now=11) is None
+    lru.invalidate('a')
+    assert lru.get('a', now=1) is None and not lru.entries
+
+
+def test_player_entry_cache(monkeypatch):
+    """ Test that a player is loaded once, until invalidated, and that a missing player is not kept.
+    """
+    monkeypatch.setattr(cache, 'PLAYER_CACHE_SETTINGS', dict(cache.DEFAULT_PLAYER_CACHE_SETTINGS, REDIS=False))
+    monkeypatch.setattr(cache, 'LOCAL_CACHE', None)
+    players = {'A': (1, cache.hash_secret('secret'))}
+    loads = []
+
+    def load(player_key):
+        loads.append(player_key)
+        return players.get(player_key)
+
+    assert cache.get_player_entry('A', load) == cache.get_player_entry('A', load) == players['A']
+    assert cache.secret_matches(players['A'], 'secret') and not cache.secret_matches(players['A'], 'guess')
+    assert cache.get_player_entry('B', load) is None
+    players['B'] = (2, cache.hash_secret('other'))
+    assert cache.get_player_entry('B', load) == players['B']
+
+    players['A'] = (1, cache.hash_secret('changed'))
+    cache.invalidate_player('A')
+    assert cache.get_player_entry('A', load) == players['A']
+    assert loads == ['A', 'B', 'B', 'A']
+
+
+def racing_load(players, loads):
+    """ Loader of players that reads a player, then sees it changed before its entry is cached. """
+    def load(player_key):
+        loads.append(player_key)
+        entry = players.get(player_key)
+        if len(loads) == 1:
+            players[player_key] = (1, cache.hash_secret('changed'))
+            cache.invalidate_player(player_key)
+        return entry
+    return load
+
+
+def test_player_entry_invalidated_while_loading(monkeypatch):
+    """ Test that a player changed while it loads is not cached as it was, in process.
+    """
+    monkeypatch.setattr(cache, 'PLAYER_CACHE_SETTINGS', dict(cache.DEFAULT_PLAYER_CACHE_SETTINGS, REDIS=False))
+    monkeypatch.setattr(cache, 'LOCAL_CACHE', None)
+    players, loads = {'A': (1, cache.hash_secret('secret'))}, []
+    load = racing_load(players, loads)
+    assert cache.get_player_entry('A', load) == (1, cache.hash_secret('secret'))
+    assert cache.get_player_entry('A', load) == cache.get_player_entry('A', load) == players['A']
+    assert loads == ['A', 'A']
+
+
+def test_redis_player_entry(monkeypatch):
+    """ Test the player cache shared in redis, where a player changed while it loads is not
+    cached as it was, and a cached entry is found by other processes.
+    """
+    fakeredis = pytest.importorskip('fakeredis')
+    conn = fakeredis.FakeRedis()
+    monkeypatch.setattr(state_utils, 'get_connection', lambda tag=None: conn)
+    monkeypatch.setattr(cache, 'PLAYER_CACHE_SETTINGS', dict(cache.DEFAULT_PLAYER_CACHE_SETTINGS))
+    monkeypatch.setattr(cache, 'LOCAL_CACHE', None)
+    players, loads = {'A': (1, cache.hash_secret('secret'))}, []
+    load = racing_load(players, loads)
+    assert cache.get_player_entry('A', load) == (1, cache.hash_secret('secret'))
+    assert not conn.hget(cache.player_cache_key('A'), 'entry'), "Expected the stale entry not cached."
+    assert cache.get_player_entry('A', load) == players['A']
+
+    cache.get_local_cache().clear()  # As another process
+    assert cache.get_player_entry('A', load) == players['A'] and cache.get_player_entry('B', load) is None
+    assert cache.get_player_entry('B', load) is None
+    assert loads == ['A', 'A', 'B', 'B'], "Expected a key with no player loaded each time, never cached."
+    assert not conn.exists(cache.player_cache_key('B'))
+    assert 0 < conn.ttl(cache.player_cache_key('A')) <= cache.DEFAULT_PLAYER_CACHE_SETTINGS['REDIS_TTL']
@@ -1,6 +1,7 @@
 import logging
 import uuid
 
+from accounts import cache
 from accounts.models import ParklePlayer
 
 log = logging.getLogger(__name__)
@@ -16,17 +17,51 @@ def finalize_new_player(player, email):
     return player
 
 
-def validate_player_key(player_key, data):
+def game_player(player):
+    """ How games, their events and the leaderboards name a player:  by their id, as games and
+    state backends name players by opaque strings, and never by the player's keys.
+    :param player: :py:class:`ParklePlayer` or :py:class:`CachedPlayer`
     """
-    :param player_key: player key to validate
+    return str(player.id)
+
+
+class CachedPlayer(object):
+    """ A player authenticated through the player cache, see `accounts.cache`. """
+    is_authenticated = True
+
+    def __init__(self, player_id, player_key):
+        self.id = self.pk = player_id
+        self.player_key = player_key
+
+
+def _load_player_entry(player_key):
+    player = ParklePlayer.objects.filter(player_key=player_key).values_list('id', 'secret_key').first()
+    return None if player is None else (player[0], cache.hash_secret(player[1]))
+
+
+async def _aload_player_entry(player_key):
+    player = await ParklePlayer.objects.filter(player_key=player_key).values_list('id', 'secret_key').afirst()
+    return None if player is None else (player[0], cache.hash_secret(player[1]))
+
+
+def _authenticated_player(player_key, secret_key, entry):
+    if entry is None:
+        return False
+    if not cache.secret_matches(entry, secret_key):
+        w = u"Security key mismatch for player key {0}".format(player_key)
+        log.warning(w)
+        return False
+    return CachedPlayer(entry[0], player_key)
+
+
+def authenticate_player(player_key, secret_key):
+    """ Check a player's keys against the player cache, querying the database only on a miss.
+    :return: :py:class:`CachedPlayer`, or False if the keys are not a player's
     """
-    try:
-        player = ParklePlayer.objects.get(player_key=player_key)
-        secret_key = data.pop(u'player_secret_key')
-        if player.secret_key != secret_key:
-            w = u"Security key mismatch for player key {0}".format(player_key)
-            log.warning(w)
-            return False
-        return player
-    except ParklePlayer.DoesNotExist:
-        return False
\ No newline at end of file
+    return _authenticated_player(player_key, secret_key, cache.get_player_entry(player_key, _load_player_entry))
+
+
+async def aauthenticate_player(player_key, secret_key):
+    """ asyncio version of `authenticate_player`. """
+    entry = await cache.aget_player_entry(player_key, _aload_player_entry)
+    return _authenticated_player(player_key, secret_key, entry)
@@ -0,0 +1,170 @@
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from api import serializers
+from api import views
+from accounts import utils as account_utils
+
+from parkle import backends
+from parkle import utils
+
+"""
+Async versions of the game end-points, served by the ASGI application (asgi.py) in
+place of their DRF views in `api.views`, which they answer exactly as.
+
+rest_framework's APIView cannot await, so these are plain django views:  they await
+the state backend's asyncio methods and the async ORM, instead of holding a worker
+thread through every redis and database round trip.
+"""
+
+
+class AsyncAPIView(View):
+    """ Base of the async end-points, exempt from CSRF and answering a malformed JSON body
+    as rest_framework's APIView does.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ParseError as e:
+            return json_response({"detail": e.detail}, e.status_code)
+
+
+def json_response(data, status_code, headers=None):
+    return JsonResponse(data, status=status_code, headers=headers, safe=False)
+
+
+def validation_error_response():
+    return json_response({"error": "Sorry, the requested action was not valid."}, status.HTTP_400_BAD_REQUEST)
+
+
+async def authenticated_player(data):
+    """ Async `api.views.authenticated_player`, of the player_api_key and player_secret_key of validated data. """
+    player = await account_utils.aauthenticate_player(data.pop('player_api_key'), data.pop('player_secret_key'))
+    return account_utils.game_player(player) if player else None
+
+
+class GameStateView(AsyncAPIView):
+    """ Async `api.views.GameStateView`, with the same conditional requests. """
+
+    async def post(self, request):
+        request_data = JSONParser().parse(request)
+        serializer = serializers.GameStateSerializer(data=request_data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        game_uuid = data.pop('game_uuid')
+        player = await authenticated_player(data)
+        if player is None:
+            return validation_error_response()
+        known_version = data.pop('known_version', None)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        backend = backends.get_backend()
+
+        if known_version is not None or if_none_match:
+            version = await backend.aget_game_version(game_uuid, player)
+            if views.state_not_modified(game_uuid, version, known_version, if_none_match):
+                return HttpResponse(status=status.HTTP_304_NOT_MODIFIED,
+                                    headers={'ETag': views.game_etag(game_uuid, version)})
+
+        game_state = await backend.aget_game_state(game_uuid)
+        result, result_status = views.game_state_status(game_state, player)
+        if result_status != status.HTTP_200_OK:
+            return json_response(result, result_status)
+        return json_response(game_state, status.HTTP_200_OK,
+                             headers={'ETag': views.game_etag(game_uuid, game_state["version"])})
+
+
+class GameActionView(AsyncAPIView):
+    """ Async `api.views.GameActionView`. """
+
+    async def post(self, request):
+        request_data = JSONParser().parse(request)
+        serializer = serializers.GameActionSerializer(data=request_data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        game_uuid = data.pop('game_uuid')
+        player = await authenticated_player(data)
+        if player is None:
+            return validation_error_response()
+        try:
+            kept_set = utils.pack_dice_string(data.pop('kept_set'))
+        except (ValueError, AssertionError):
+            e = {"error": "Dice list provided was not valid in form or scoring."}
+            return json_response(e, status.HTTP_400_BAD_REQUEST)
+
+        result = await backends.get_backend().aperform_game_action(game_uuid, player, kept_set, data.pop('action'))
+        if "error" in result:
+            return json_response(result, status.HTTP_400_BAD_REQUEST)
+        return json_response(result, status.HTTP_200_OK)
+
+
+class GameActionsView(AsyncAPIView):
+    """ Async `api.views.GameActionsView`. """
+
+    async def post(self, request):
+        request_data = JSONParser().parse(request)
+        serializer = serializers.GameActionsSerializer(data=request_data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        actions = serializer.validated_data['actions']
+        players = [await account_utils.aauthenticate_player(action['player_api_key'], action['player_secret_key'])
+                   for action in actions]
+        results, calls = views.game_actions_args(actions, players)
+        performed = await backends.get_backend().aperform_game_actions([args for i, args in calls])
+        for (i, args), result in zip(calls, performed):
+            results[i] = result
+        return json_response({"results": results}, status.HTTP_200_OK)
+
+
+class CreateGameView(AsyncAPIView):
+    """ Async `api.views.CreateGameView`. """
+
+    async def post(self, request):
+        request_data = JSONParser().parse(request)
+        serializer = serializers.InitiateGameSerializer(data=request_data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        player = await authenticated_player(data)
+        if player is None:
+            return validation_error_response()
+
+        e = views.bot_opponent_error(data.pop('computer_bot_username', None))
+        if e:
+            return json_response(e, status.HTTP_400_BAD_REQUEST)
+
+        game_state = await backends.get_backend().ainitiate_game(player)
+        if "error" in game_state:
+            return json_response(game_state, status.HTTP_400_BAD_REQUEST)
+        return json_response(game_state, status.HTTP_201_CREATED)
+
+
+class GameAddPlayer(AsyncAPIView):
+    """ Async `api.views.GameAddPlayer`. """
+
+    async def post(self, request):
+        request_data = JSONParser().parse(request)
+        serializer = serializers.JoinGameSerializer(data=request_data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        game_uuid = data.pop('game_uuid')
+        player = await authenticated_player(data)
+        if player is None:
+            return validation_error_response()
+
+        game_state = await backends.get_backend().ainitiate_game(player, game_uuid)
+        if "error" in game_state:
+            return json_response(game_state, status.HTTP_400_BAD_REQUEST)
+        return json_response(game_state, status.HTTP_200_OK)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import re
+import urllib.parse
+
+from accounts import utils as account_utils
+from parkle import backends
+from parkle import state_utils
+
+import logging
+log = logging.getLogger(__name__)
+
+"""
+Server-sent events of a game as they happen, so clients need not poll game-state/.
+
+    GET /v1/game-events/<game_uuid>/?player_api_key=<key>&player_secret_key=<secret>
+
+The stream opens with a "state" event of the complete game state, then sends each
+game event (create, join, keep, roll, farkle, bank, won) as it is logged, with its
+event id.  A reconnecting EventSource sends the Last-Event-ID header, and is sent
+only the events it missed;  a Last-Event-ID that is not an event id is ignored, and
+the stream opens with the state as for a new client.  The stream ends after the "won" event, or after the
+state of a game already won.
+
+Each worker holds one redis pub/sub connection, shared by all of its streams.
+"""
+
+EVENTS_PATH = '/v1/game-events/'
+KEEPALIVE_SECONDS = 15.0
+EVENT_ID = re.compile(r'^\d+-\d+$')  # As redis stream ids, "<milliseconds>-<sequence>"
+
+
+class GameEventsApplication(object):
+    """ ASGI application serving game event streams, passing every other request on
+    to the wrapped (Django) application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(EVENTS_PATH):
+            return await game_events(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+
+def event_order(event_id):
+    """ Sortable (milliseconds, sequence) of a stream event id. """
+    milliseconds, sequence = event_id.split('-')
+    return int(milliseconds), int(sequence)
+
+
+def format_event(kind, data, event_id=None):
+    """ :return: `bytes` of one server-sent event """
+    lines = [f"event: {kind}", f"data: {json.dumps(data)}"]
+    if event_id is not None:
+        lines.insert(0, f"id: {event_id}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+async def send_json(send, status, data):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+
+async def game_events(scope, receive, send):
+    """ Stream a game's events to one of its players. """
+    game_uuid = scope['path'][len(EVENTS_PATH):].strip('/')
+    query = urllib.parse.parse_qs(scope.get('query_string', b'').decode('utf-8'))
+    player_key = query.get('player_api_key', [''])[0]
+    secret_key = query.get('player_secret_key', [''])[0]
+    last_event_id = dict(scope.get('headers', [])).get(b'last-event-id', b'').decode('latin-1')
+    if not EVENT_ID.match(last_event_id):
+        last_event_id = None
+
+    player = await account_utils.aauthenticate_player(player_key, secret_key) if player_key else False
+    if not player:
+        return await send_json(send, 403, {"error": "Sorry, the requested action was not valid."})
+    backend = backends.get_backend()
+    game_state = await backend.aget_game_state(game_uuid)
+    if "error" in game_state:
+        return await send_json(send, 404, game_state)
+    if account_utils.game_player(player) not in game_state["players"]:
+        return await send_json(send, 403, {"error": "It appears you are not a player in the requested game."})
+
+    # Subscribe before reading the log, so no event falls between the two
+    queue = await backend.asubscribe_game(game_uuid)
+    try:
+        events = await backend.aread_game_events(game_uuid, after=last_event_id or '0-0')
+        if last_event_id is None and not events:  # Reclaimed since its state was read
+            return await send_json(send, 404, {"error": state_utils.GAME_STATE_ERRORS['no_game']})
+        await stream_events(game_uuid, game_state, events, last_event_id, queue, receive, send)
+    finally:
+        await backend.aunsubscribe_game(game_uuid, queue)
+
+
+async def stream_events(game_uuid, game_state, events, last_event_id, queue, receive, send):
+    """ Send the game state or the logged events after last_event_id, then each update
+    from the queue until the game is won or the client disconnects.
+    """
+    over = game_state["winner"] is not None  # Then the whole log has been read, won event and all
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')]})
+        if last_event_id is None:
+            last_event_id = events[-1]["id"]
+            game_state = state_utils.replay_game(game_uuid, events)
+            await send_body(send, format_event('state', game_state, last_event_id))
+            over = game_state["winner"] is not None
+            events = []
+        while True:
+            for event in events:
+                if event_order(event["id"]) <= event_order(last_event_id):
+                    continue  # Already sent, from the log
+                last_event_id = event["id"]
+                await send_body(send, format_event(event["event"], event, last_event_id))
+                if event["event"] == 'won':
+                    return
+            if over:
+                return
+            update = asyncio.ensure_future(queue.get())
+            done, pending = await asyncio.wait([update, disconnected], timeout=KEEPALIVE_SECONDS,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                update.cancel()
+                return
+            if update in done:
+                events = update.result()
+            else:
+                update.cancel()
+                events = []
+                await send_body(send, b': keepalive\n\n')
+    finally:
+        disconnected.cancel()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from parkle import state_utils
+
 
 class RequestPlayerSerializer(serializers.Serializer):
     username = serializers.CharField()
@@ -12,14 +14,44 @@ class InitiateGameSerializer(serializers.Serializer):
     computer_bot_username = serializers.CharField(required=False)
 
 
+class JoinGameSerializer(serializers.Serializer):
+    game_uuid = serializers.CharField()
+    player_api_key = serializers.CharField()
+    player_secret_key = serializers.CharField()
+
+
 class GameStateSerializer(serializers.Serializer):
     game_uuid = serializers.CharField()
     player_api_key = serializers.CharField()
+    player_secret_key = serializers.CharField()
+    known_version = serializers.IntegerField(required=False)  # Version the client has, unchanged is a 304
+
+
+class GameStatesSerializer(serializers.Serializer):
+    game_uuids = serializers.ListField(child=serializers.CharField(), min_length=1, max_length=200)
+    player_api_key = serializers.CharField()
+    player_secret_key = serializers.CharField()
 
 
 class GameActionSerializer(serializers.Serializer):
     game_uuid = serializers.CharField()
     player_api_key = serializers.CharField()
-    kept_set = serializers.CharField()
+    player_secret_key = serializers.CharField()
+    kept_set = serializers.CharField(allow_blank=True)  # Comma separated dice, blank to start a turn
+    action = serializers.ChoiceField(choices=['roll', 'bank'], default='roll')
+
+
+class GameActionsSerializer(serializers.Serializer):
+    actions = GameActionSerializer(many=True, min_length=1, max_length=100)  # Performed in order
 
 
+class LeaderboardSerializer(serializers.Serializer):
+    board = serializers.ChoiceField(choices=state_utils.LEADERBOARDS, default='alltime')
+    count = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class LeaderboardPlayerSerializer(serializers.Serializer):
+    board = serializers.ChoiceField(choices=state_utils.LEADERBOARDS, default='alltime')
+    player_api_key = serializers.CharField()
+    player_secret_key = serializers.CharField()
+    count = serializers.IntegerField(min_value=0, max_value=50, default=5)  # Players on each side, for around/
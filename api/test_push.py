@@ -0,0 +1,118 @@
+
+# Test cases for the server-sent game event streams
+
+import asyncio
+import json
+
+from accounts import utils as account_utils
+from api import push
+from parkle import backends
+from parkle import utils as parkle_utils
+
+
+def parse_events(body):
+    """ :return: `list` of (event, data) from a server-sent event stream body """
+    events = []
+    for message in body.decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.split('\n') if line and not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+async def stream(game_uuid, player, messages, last_event_id=None, secret_key=None):
+    """ Collect a game's event stream for a player until the server ends it, or messages is done.
+    With messages None, only until the server ends it.
+    :return: (status, body)
+    """
+    sent = []
+    headers = [(b'last-event-id', last_event_id.encode('utf-8'))] if last_event_id else []
+    query = f'player_api_key={player.player_key}&player_secret_key={secret_key or player.secret_key}'
+    scope = {'type': 'http', 'path': f'/v1/game-events/{game_uuid}/', 'headers': headers,
+             'query_string': query.encode('utf-8')}
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    async def application():
+        await push.GameEventsApplication(None)(scope, receive, send)
+
+    task = asyncio.ensure_future(application())
+    if messages is not None:
+        await messages()
+        await asyncio.sleep(0.01)
+        disconnect.set()
+    await task
+    body = b''.join(message.get('body', b'') for message in sent)
+    return sent[0]['status'], body
+
+
+def test_game_events_stream(monkeypatch, new_player):
+    """ Test that a player is sent the game state, then each event as it happens,
+    and that a reconnecting client is sent only the events it missed.
+    """
+    backend = backends.MemoryBackend()
+    monkeypatch.setattr(backends, 'BACKEND', backend)
+    a, b, c = new_player('a'), new_player('b'), new_player('c')
+    game_uuid = backend.initiate_game(account_utils.game_player(a))['game_uuid']
+
+    async def play():
+        await asyncio.sleep(0.01)
+        backend.initiate_game(account_utils.game_player(b), game_uuid)
+        backend.perform_game_action(game_uuid, account_utils.game_player(a), [])
+
+    status, body = asyncio.run(stream(game_uuid, a, play))
+    events = parse_events(body)
+    assert status == 200
+    assert events[0][0] == 'state' and events[0][1]['players'] == [str(a.id)]
+    assert [kind for kind, data in events[1:]] == ['join', 'roll']
+    assert a.player_key not in body.decode('utf-8'), "Expected players named by id, never by their keys."
+
+    async def nothing():
+        pass
+
+    status, body = asyncio.run(stream(game_uuid, b, nothing, last_event_id=events[1][1]['id']))
+    assert parse_events(body) == events[2:]
+    for last_event_id in ('garbage', '$', '1-x', '\xff'):
+        status, body = asyncio.run(stream(game_uuid, b, nothing, last_event_id=last_event_id))
+        assert status == 200 and [kind for kind, data in parse_events(body)] == ['state'], \
+            "Expected a Last-Event-ID that is not an event id to be sent the state, as a new client."
+
+    assert asyncio.run(stream(game_uuid, c, nothing))[0] == 403
+    assert asyncio.run(stream(game_uuid, b, nothing, secret_key=a.secret_key))[0] == 403
+    assert asyncio.run(stream('missing', a, nothing))[0] == 404
+
+
+def test_game_events_end(monkeypatch, new_player):
+    """ Test that the stream of a game already won ends after its state, and that a game
+    reclaimed between reading its state and its log is not found.
+    """
+    backend = backends.MemoryBackend()
+    monkeypatch.setattr(backends, 'BACKEND', backend)
+    a = new_player('a')
+    player = account_utils.game_player(a)
+    game_uuid = backend.initiate_game(player)['game_uuid']
+    backend.games[game_uuid]['scores'][player] = parkle_utils.WINNING_SCORE - 300
+    monkeypatch.setattr(parkle_utils, 'dice_roll', lambda n: [1, 1, 1, 2, 3, 4][:n])
+    backend.perform_game_action(game_uuid, player, [])
+    backend.perform_game_action(game_uuid, player, [1, 1, 1], 'bank')
+
+    async def nothing():
+        pass
+
+    status, body = asyncio.run(asyncio.wait_for(stream(game_uuid, a, None), 1))
+    events = parse_events(body)
+    assert status == 200 and [kind for kind, data in events] == ['state'] and events[0][1]['winner'] == player
+    last_event_id = backend.read_game_events(game_uuid)[-1]['id']
+    assert parse_events(asyncio.run(asyncio.wait_for(stream(game_uuid, a, None, last_event_id), 1))[1]) == []
+
+    async def reclaimed(game_uuid, after='0-0', count=None, block=None):
+        return []
+
+    monkeypatch.setattr(backend, 'aread_game_events', reclaimed)
+    assert asyncio.run(stream(game_uuid, a, nothing))[0] == 404
@@ -0,0 +1,133 @@
+
+# Test cases for the API end-points
+
+import asyncio
+import json
+
+import pytest
+from rest_framework.test import APIRequestFactory
+
+from accounts import utils as account_utils
+from api import async_views
+from api import views
+from parkle import backends
+from parkle import utils as parkle_utils
+
+NOT_VALID = {"error": "Sorry, the requested action was not valid."}
+
+
+def call(view, request):
+    """ :return: (status, data, response) of a DRF or async view answering a request """
+    response = view(request)
+    if asyncio.iscoroutine(response):
+        response = asyncio.run(response)
+    if hasattr(response, 'render'):
+        response.render()
+    return response.status_code, json.loads(response.content) if response.content else None, response
+
+
+@pytest.mark.parametrize('game_views', [views, async_views], ids=['drf', 'async'])
+def test_game_views(monkeypatch, new_player, game_views):
+    """ Test a game played through the DRF game end-points and their async versions, which
+    must answer alike:  create, join, conditional state reads, actions and batches.
+    """
+    monkeypatch.setattr(backends, 'BACKEND', backends.MemoryBackend())
+    monkeypatch.setattr(parkle_utils, 'dice_roll', lambda n: [1, 1, 1, 5, 2, 3][:n])
+    a, b, c = new_player('a'), new_player('b'), new_player('c')
+    keys = {player: {'player_api_key': player.player_key, 'player_secret_key': player.secret_key}
+            for player in (a, b, c)}
+    factory = APIRequestFactory()
+
+    def post(view, data, **headers):
+        return call(view.as_view(), factory.post('/', data, format='json', **headers))
+
+    status, game, response = post(game_views.CreateGameView, keys[a])
+    assert status == 201 and game['players'] == [str(a.id)]
+    game_uuid = game['game_uuid']
+    status, game, response = post(game_views.GameAddPlayer, dict(keys[b], game_uuid=game_uuid))
+    assert status == 200 and game['players'] == [str(a.id), str(b.id)]
+
+    query = dict(keys[a], game_uuid=game_uuid)
+    status, game, response = post(game_views.GameStateView, query)
+    assert status == 200 and game['current_player'] == str(a.id)
+    etag = response['ETag']
+    status, data, response = post(game_views.GameStateView, query, HTTP_IF_NONE_MATCH=etag)
+    assert status == 304 and response['ETag'] == etag
+    status, data, response = post(game_views.GameStateView, dict(query, known_version=game['version']))
+    assert status == 304
+
+    # Not even the version of a game is told to anyone but its players
+    other = dict(keys[c], game_uuid=game_uuid)
+    for status, data, response in [post(game_views.GameStateView, other, HTTP_IF_NONE_MATCH='*'),
+                                   post(game_views.GameStateView, dict(other, known_version=game['version']))]:
+        assert status == 403 and 'ETag' not in response
+
+    status, result, response = post(game_views.GameActionView, dict(query, kept_set=''))
+    assert status == 200 and result['result'] == 'rolled' and result['dice_roll'] == [1, 1, 1, 5, 2, 3]
+    status, data, response = post(game_views.GameActionView, dict(query, kept_set='2,2'))
+    assert status == 400 and "error" in data
+    status, game, response = post(game_views.GameStateView, query, HTTP_IF_NONE_MATCH=etag)
+    assert status == 200 and response['ETag'] != etag
+
+    status, data, response = post(game_views.GameActionsView, {"actions": [
+        dict(query, kept_set='1,1,1', action='bank'),
+        dict(keys[b], player_secret_key=a.secret_key, game_uuid=game_uuid, kept_set=''),
+        dict(keys[b], game_uuid=game_uuid, kept_set=''),
+    ]})
+    assert status == 200
+    assert [result.get('result') for result in data["results"]] == ['banked', None, 'rolled']
+    assert data["results"][1] == NOT_VALID
+
+    # Keys are never taken from a URL
+    assert call(game_views.GameStateView.as_view(), factory.get('/', query))[0] == 405
+
+    # A wrong secret, for reads and actions
+    wrong = dict(keys[b], player_secret_key=a.secret_key, game_uuid=game_uuid)
+    assert post(game_views.GameStateView, wrong)[:2] == (400, NOT_VALID)
+    assert post(game_views.GameActionView, dict(wrong, kept_set=''))[:2] == (400, NOT_VALID)
+    assert post(game_views.CreateGameView, dict(keys[a], player_secret_key='wrong'))[:2] == (400, NOT_VALID)
+    assert post(game_views.GameStateView, dict(query, player_secret_key=''))[0] == 400
+
+    # A malformed body, answered as rest_framework answers it
+    for view in (game_views.GameStateView, game_views.GameActionView, game_views.GameActionsView,
+                 game_views.CreateGameView, game_views.GameAddPlayer):
+        request = factory.post('/', '{"game_uuid":', content_type='application/json')
+        status, data, response = call(view.as_view(), request)
+        assert status == 400 and data["detail"].startswith('JSON parse error')
+
+    status, game, response = post(game_views.GameStateView, query)
+    assert game['scores'] == {str(a.id): 300, str(b.id): 0} and game['current_player'] == str(b.id)
+    assert a.player_key not in json.dumps(game) and b.player_key not in json.dumps(game)
+
+
+def test_leaderboards(monkeypatch, new_player):
+    """ Test that leaderboards name players by id and username, never by their keys, and
+    that only an authenticated player is told their rank.
+    """
+    backend = backends.MemoryBackend()
+    monkeypatch.setattr(backends, 'BACKEND', backend)
+    a, b = new_player('a'), new_player('b')
+    with backend.lock:
+        backend._record_win(account_utils.game_player(a))
+        backend._record_win(account_utils.game_player(a))
+        backend._record_win(account_utils.game_player(b))
+    factory = APIRequestFactory()
+
+    response = views.LeaderboardView.as_view()(factory.get('/v1/leaderboard/'))
+    assert response.status_code == 200
+    assert response.data["leaders"] == [{"rank": 1, "player": str(a.id), "wins": 2, "username": "a"},
+                                        {"rank": 2, "player": str(b.id), "wins": 1, "username": "b"}]
+    assert a.player_key not in str(response.data)
+
+    keys = {'player_api_key': b.player_key, 'player_secret_key': b.secret_key}
+    response = views.LeaderboardPlayerView.as_view()(factory.post('/v1/leaderboard/rank/', keys, format='json'))
+    assert response.data == {"rank": 2, "player": str(b.id), "wins": 1, "username": "b", "board": "alltime"}
+    response = views.LeaderboardPlayerView.as_view(around=True)(
+        factory.post('/v1/leaderboard/around/', keys, format='json'))
+    assert [entry["username"] for entry in response.data["players"]] == ["a", "b"]
+
+    keys['player_secret_key'] = a.secret_key
+    response = views.LeaderboardPlayerView.as_view()(factory.post('/v1/leaderboard/rank/', keys, format='json'))
+    assert response.status_code == 400
+    keys['player_secret_key'] = b.secret_key
+    assert views.LeaderboardPlayerView.as_view()(factory.get('/v1/leaderboard/rank/', keys)).status_code == 405
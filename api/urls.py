@@ -1,12 +1,25 @@
+from django.conf import settings
 from django.urls import path
 
 from api import views as api_views
 
 app_name = 'api'
 
+# The game end-points, served by their async views under ASGI (see asgi.py)
+if getattr(settings, 'PARKLE_ASYNC_VIEWS', False):
+    from api import async_views as game_views
+else:
+    game_views = api_views
+
 urlpatterns = [
-    path('game-state/', api_views.GameStateView.as_view(), name='game_state_view'),
+    path('game-state/', game_views.GameStateView.as_view(), name='game_state_view'),
+    path('game-states/', api_views.GameStatesView.as_view(), name='game_states_view'),
     path('request-player/', api_views.RequestPlayerKeyView.as_view(), name='request_player_view'),
-    path('create-game/', api_views.CreateGameView.as_view(), name='create_game'),
-    path('game-action/', api_views.GameActionView.as_view(), name='game_action'),
+    path('create-game/', game_views.CreateGameView.as_view(), name='create_game'),
+    path('join-game/', game_views.GameAddPlayer.as_view(), name='join_game'),
+    path('game-action/', game_views.GameActionView.as_view(), name='game_action'),
+    path('game-actions/', game_views.GameActionsView.as_view(), name='game_actions'),
+    path('leaderboard/', api_views.LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/rank/', api_views.LeaderboardPlayerView.as_view(), name='leaderboard_rank'),
+    path('leaderboard/around/', api_views.LeaderboardPlayerView.as_view(around=True), name='leaderboard_around'),
 ]
@@ -1,13 +1,12 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import JSONParser
 from rest_framework import status
 
 from api import serializers
 from accounts.models import ParklePlayer
 from accounts import utils as account_utils
 
-from parkle import state_utils
+from parkle import backends
 from parkle import utils
 
 import logging
@@ -19,94 +18,259 @@ def validation_error_response():
     return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
 
+def game_etag(game_uuid, version):
+    return f'"{game_uuid}-{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    """ Whether an If-None-Match header value lists the etag. """
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def state_not_modified(game_uuid, version, known_version, if_none_match):
+    """ Whether a client with the known_version, or If-None-Match etags, already has the game's version. """
+    return version is not None and (version == known_version or
+                                    bool(if_none_match and etag_matches(if_none_match, game_etag(game_uuid, version))))
+
+
+def authenticated_player(request, player_key):
+    """ :return: the player of player_key as games name them (see `accounts.utils.game_player`),
+    or None unless the request authenticated as them
+    """
+    if request.auth is None or request.auth != player_key:
+        return None
+    return account_utils.game_player(request.user)
+
+
+def with_usernames(entries):
+    """ :return: leaderboard entries, each with the "username" of its player, read in one query """
+    ids = [int(entry["player"]) for entry in entries if entry["player"].isdigit()]
+    usernames = {str(player_id): username for player_id, username in
+                 ParklePlayer.objects.filter(id__in=ids).values_list('id', 'username')}
+    return [dict(entry, username=usernames.get(entry["player"])) for entry in entries]
+
+
+def game_state_status(game_state, player):
+    """ :return: (response data, status) of a game state read by a player """
+    if "error" in game_state:
+        return game_state, status.HTTP_404_NOT_FOUND
+    if player not in game_state["players"]:
+        return {"error": "It appears you are not a player in the requested game."}, status.HTTP_403_FORBIDDEN
+    return game_state, status.HTTP_200_OK
+
+
+def game_actions_args(actions, players):
+    """ :param players: `list` of the player each action authenticated as, or False
+    :return: (results, with the errors of invalid actions, `list` of the (index, action args) to perform)
+    """
+    results, calls = [None] * len(actions), []
+    for i, (action, player) in enumerate(zip(actions, players)):
+        if not player:
+            results[i] = {"error": "Sorry, the requested action was not valid."}
+            continue
+        try:
+            kept_set = utils.pack_dice_string(action['kept_set'])
+        except (ValueError, AssertionError):
+            results[i] = {"error": "Dice list provided was not valid in form or scoring."}
+            continue
+        calls.append((i, (action['game_uuid'], account_utils.game_player(player), kept_set, action['action'])))
+    return results, calls
+
+
+def bot_opponent_error(bot_username):
+    """ :return: error `dict` if a computer bot opponent was asked for, else None.  Registered
+    bots (see `parkle.bots.register_strategy`) are not seated in API games yet.
+    """
+    if bot_username:
+        return {"error": "Sorry, computer bot opponents are not supported yet."}
+    return None
+
+
 class GameStateView(APIView):
-    """ API end-point for requesting a specific Parkle game state. """
+    """ API end-point for requesting a specific Parkle game state, by one of its players.
+    Supports conditional requests:  with an If-None-Match of the state's ETag, or the
+    known_version of the state, an unchanged game is a 304 after reading only its version
+    and players.
+    """
 
     def post(self, request,):
-        # Grab and parse request
-        request_data = JSONParser().parse(request)
-        serializer = serializers.GameStateSerializer(data=request_data)
+        serializer = serializers.GameStateSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         data = serializer.validated_data
         game_uuid = data.pop('game_uuid')
+        player = authenticated_player(request, data.pop('player_api_key'))
+        if player is None:
+            return validation_error_response()
+        known_version = data.pop('known_version', None)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        backend = backends.get_backend()
 
-        # Would be nice to do something to validate the API player's key is part of the game
+        if known_version is not None or if_none_match:
+            version = backend.get_game_version(game_uuid, player)  # None for a non-player, who is read a 403
+            if state_not_modified(game_uuid, version, known_version, if_none_match):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': game_etag(game_uuid, version)})
 
+        game_state = backend.get_game_state(game_uuid)
+        result, result_status = game_state_status(game_state, player)
+        if result_status != status.HTTP_200_OK:
+            return Response(result, status=result_status)
+        return Response(game_state, status=status.HTTP_200_OK,
+                        headers={'ETag': game_etag(game_uuid, game_state["version"])})
 
-        # So now we actually have to look up the game state from redis
 
+class GameStatesView(APIView):
+    """ API end-point for the states of many games at once, read together in one round trip.
+    Each game is keyed by its uuid, with the same errors as game-state/ inline.
+    """
 
-        # Choose how to represent this state in a response from the API
-        response = {"game_uuidxxxx": "TOKEN-GAMESTATE"}
-        return Response(response, status=status.HTTP_200_OK)
+    def post(self, request):
+        serializer = serializers.GameStatesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        player = authenticated_player(request, data.pop('player_api_key'))
+        if player is None:
+            return validation_error_response()
+        games = backends.get_backend().get_game_states(data.pop('game_uuids'))
+        games = {game_uuid: game_state_status(game_state, player)[0] for game_uuid, game_state in games.items()}
+        return Response({"games": games}, status=status.HTTP_200_OK)
 
 
 class GameActionView(APIView):
     """ API end-point for performing an action on a specific Parkle Game. """
 
     def post(self, request, ):
-        request_data = JSONParser().parse(request)
-        serializer = serializers.GameActionSerializer(data=request_data)
+        serializer = serializers.GameActionSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         data = serializer.validated_data
         game_uuid = data.pop('game_uuid')
-        player_key = data.pop('player_api_key')
+        player = authenticated_player(request, data.pop('player_api_key'))
+        if player is None:
+            return validation_error_response()
         # Actions:  1.) Keep a set and roll or 2.) Keep a set and score out
-        is_current = state_utils.current_player_check(game_uuid, player_key)
-        if not is_current:
-            e = {"error": "It appears you are not the current player."}
-            return Response(e, status=status.HTTP_400_BAD_REQUEST)
-
-        dice_string = data.pop('dice_string')
-        dice_list = map(int, dice_string.split(','))
-        valid, points = utils.validate_kept_set(dice_list)
-        if not valid:
+        try:
+            kept_set = utils.pack_dice_string(data.pop('kept_set'))
+        except (ValueError, AssertionError):
             e = {"error": "Dice list provided was not valid in form or scoring."}
             return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
+        # Current player check, kept set and turn update happen atomically in the state backend
+        result = backends.get_backend().perform_game_action(game_uuid, player, kept_set, data.pop('action'))
+        if "error" in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
 
 
+class GameActionsView(APIView):
+    """ API end-point for performing many actions, on one or more games, in one request.
+    Each action carries the keys of its player, and the actions are performed in order,
+    each with its result or error inline, and sent to redis together in one round trip.
+    """
+
+    def post(self, request):
+        serializer = serializers.GameActionsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        actions = serializer.validated_data['actions']
+        players = [account_utils.authenticate_player(action['player_api_key'], action['player_secret_key'])
+                   for action in actions]
+        results, calls = game_actions_args(actions, players)
+        performed = backends.get_backend().perform_game_actions([args for i, args in calls])
+        for (i, args), result in zip(calls, performed):
+            results[i] = result
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 
 class CreateGameView(APIView):
     """ API end-point for performing an action on a specific Parkle Game. """
 
     def post(self, request):
-        request_data = JSONParser().parse(request)
-        serializer = serializers.InitiateGameSerializer(data=request_data)
+        serializer = serializers.InitiateGameSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         data = serializer.validated_data
-        #player = None
-        player_key = data.pop('player_api_key')
-        player = account_utils.validate_player_key(player_key, data)
-        if not player:
+        player = authenticated_player(request, data.pop('player_api_key'))
+        if player is None:
             return validation_error_response()
 
-        new_game_uuid = state_utils.initiate_game(player_key)
-        if not new_game_uuid:
-            game_uuid = state_utils.check_player_for_existing_game(player_key)
-            e = {"error": f"Sorry, it appears you have an existing game with uuid: {game_uuid}"}
+        e = bot_opponent_error(data.pop('computer_bot_username', None))
+        if e:
             return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
-        r = {"game_uuid": new_game_uuid}
-        return Response(r, status=status.HTTP_201_CREATED)
+        game_state = backends.get_backend().initiate_game(player)
+        if "error" in game_state:
+            return Response(game_state, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(game_state, status=status.HTTP_201_CREATED)
 
 
 class GameAddPlayer(APIView):
     """ API end-point for validating and adding a player to an initialized game. """
 
     def post(self, request, ):
-        pass
+        serializer = serializers.JoinGameSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        game_uuid = data.pop('game_uuid')
+        player = authenticated_player(request, data.pop('player_api_key'))
+        if player is None:
+            return validation_error_response()
+
+        game_state = backends.get_backend().initiate_game(player, game_uuid)
+        if "error" in game_state:
+            return Response(game_state, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(game_state, status=status.HTTP_200_OK)
+
+
+class LeaderboardView(APIView):
+    """ API end-point for the leaders of a leaderboard (daily, weekly or alltime wins). """
+
+    def get(self, request):
+        serializer = serializers.LeaderboardSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        leaders = with_usernames(backends.get_backend().leaderboard_top(data['board'], data['count']))
+        return Response({"board": data['board'], "leaders": leaders}, status=status.HTTP_200_OK)
+
+
+class LeaderboardPlayerView(APIView):
+    """ API end-point for an authenticated player's rank on a leaderboard, with the players
+    ranked around them when around is set.  A POST, so the player's keys are never in a URL.
+    """
+    around = False
+
+    def post(self, request):
+        serializer = serializers.LeaderboardPlayerSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        board, player = data['board'], authenticated_player(request, data['player_api_key'])
+        if player is None:
+            return validation_error_response()
+        backend = backends.get_backend()
+        if self.around:
+            entries = backend.leaderboard_around(player, board, data['count'])
+            result = {"board": board, "players": with_usernames(entries)} if entries else None
+        else:
+            entry = backend.leaderboard_rank(player, board)
+            result = dict(with_usernames([entry])[0], board=board) if entry else None
+        if result is None:
+            e = {"error": "The player has no wins on this leaderboard."}
+            return Response(e, status=status.HTTP_404_NOT_FOUND)
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class RequestPlayerKeyView(APIView):
     """ API end-point for registering a player with a username and getting a player key uuid. """
 
     def post(self, request):
-        request_data = JSONParser().parse(request)
-        serializer = serializers.RequestPlayerSerializer(data=request_data)
+        serializer = serializers.RequestPlayerSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         data = serializer.validated_data
@@ -120,6 +284,7 @@ class RequestPlayerKeyView(APIView):
         r = {
             "username": player.username,
             "email": player.email,
+            "player_id": account_utils.game_player(player),  # How games name the player
             "player_key": player.player_key,
             "secret_key": player.secret_key,
             "note": "Save this data off, you will not be able to retrieve it at this time!"
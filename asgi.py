@@ -0,0 +1,19 @@
+"""
+ASGI entry point, serving the API and its server-sent game event streams, such as:
+
+    uvicorn asgi:application
+
+The game end-points are served by their async views (api.async_views), awaiting redis
+and the database rather than holding a thread through each request.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+os.environ.setdefault("PARKLE_ASYNC_VIEWS", "1")
+django_application = get_asgi_application()
+
+from api import push  # noqa: E402, imports models once django is set up
+
+application = push.GameEventsApplication(django_application)
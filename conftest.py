@@ -0,0 +1,56 @@
+
+# Test configuration:  django with a sqlite test database and the in-memory state backend,
+# unless DJANGO_SETTINGS_MODULE names other settings to test with
+
+import os
+
+import django
+import pytest
+from django.conf import settings
+
+
+def pytest_configure():
+    if 'DJANGO_SETTINGS_MODULE' not in os.environ and not settings.configured:
+        import settings as project_settings
+        settings.configure(
+            INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'rest_framework',
+                            'accounts', 'api', 'parkle'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            ROOT_URLCONF='urls',
+            REST_FRAMEWORK=project_settings.REST_FRAMEWORK,
+            SECRET_KEY=project_settings.SECRET_KEY,
+            PARKLE_STATE_BACKEND='parkle.backends.MemoryBackend',
+            PARKLE_PLAYER_CACHE={'REDIS': False},
+        )
+    django.setup()
+
+
+@pytest.fixture(scope='session')
+def test_database():
+    """ The test database, created once for the session. """
+    from django.db import connection
+    name = connection.creation.create_test_db(verbosity=0)
+    yield
+    connection.creation.destroy_test_db(name, verbosity=0)
+
+
+@pytest.fixture
+def new_player(test_database, monkeypatch):
+    """ Register players, with an empty player cache kept in process:  new_player(username)
+    returns the :py:class:`accounts.models.ParklePlayer`, deleted after the test.
+    """
+    from accounts import cache
+    from accounts import utils as account_utils
+    from accounts.models import ParklePlayer
+    monkeypatch.setattr(cache, 'PLAYER_CACHE_SETTINGS', dict(cache.DEFAULT_PLAYER_CACHE_SETTINGS, REDIS=False))
+    monkeypatch.setattr(cache, 'LOCAL_CACHE', None)
+    players = []
+
+    def register(username):
+        player = account_utils.finalize_new_player(ParklePlayer(username=username), f'{username}@parkle.test')
+        players.append(player)
+        return player
+
+    yield register
+    for player in players:
+        player.delete()
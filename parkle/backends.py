@@ -0,0 +1,505 @@
+import asyncio
+import datetime
+import heapq
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from parkle import state_utils
+from parkle import utils
+
+"""
+Game state backends, where games in progress are kept.
+
+The API talks to the backend named by settings.PARKLE_STATE_BACKEND (a dotted path
+to a `StateBackend` subclass), rather than to redis directly:
+
+    RedisBackend:   `parkle.state_utils`, shared by every process, the default.
+    MemoryBackend:  dicts in this process behind a lock, for single process
+                    deployments, local and bot games, and tests.
+
+Every backend has the same semantics, and the same result and error dicts as
+`parkle.state_utils`.  Backends name players by opaque strings (the player_key
+arguments), which the API gives as the player's id (see `accounts.utils.game_player`),
+so no player's keys are ever in a game state, event or leaderboard.
+"""
+
+DEFAULT_STATE_BACKEND = 'parkle.backends.RedisBackend'
+
+BACKEND = None  # Created from settings on first use, see `get_backend`
+
+
+class StateBackend(object):
+    """ Base class for a game state backend.  Each operation is atomic.
+
+    The asyncio methods default to the blocking ones, which is fine for backends
+    that never wait on I/O.
+    """
+
+    def check_player_for_existing_game(self, player_key):
+        """ :return: False or the uuid of the game player is engaged in """
+        raise NotImplementedError
+
+    def initiate_game(self, player_key, game_uuid=None):
+        """ Create a new game, or join game_uuid.
+        :return: the game state `dict`, or a dict with an "error" message
+        """
+        raise NotImplementedError
+
+    def current_player_check(self, game_uuid, player_key):
+        """ :return: `boolean` if player is the current player of the game """
+        raise NotImplementedError
+
+    def perform_game_action(self, game_uuid, player_key, kept_set, action='roll'):
+        """ Keep the kept set from the dice roll, then roll or bank.
+        :return: `dict` of the action result, or a dict with an "error" message
+        """
+        raise NotImplementedError
+
+    def perform_game_actions(self, actions):
+        """ Perform many actions in order, see `state_utils.perform_game_actions`.
+        :param actions: `list` of (game uuid, player key, kept set, action)
+        :return: :py:class:`list` of each action's result `dict`
+        """
+        return [self.perform_game_action(*action) for action in actions]
+
+    def get_game_state(self, game_uuid):
+        """ :return: the game state `dict`, or a dict with an "error" message """
+        raise NotImplementedError
+
+    def get_game_states(self, game_uuids):
+        """ :return: `dict` of each game uuid to its game state `dict`, or a dict with an "error" message """
+        return {game_uuid: self.get_game_state(game_uuid) for game_uuid in game_uuids}
+
+    def get_game_version(self, game_uuid, player_key=None):
+        """ :return: `int` version of the game, incremented by every change to it, or None,
+            also when a player_key is given that is not one of the game's players
+        """
+        raise NotImplementedError
+
+    def read_game_events(self, game_uuid, after='0-0', count=None, block=None):
+        """ Read a game's events after an event id, see `state_utils.read_game_events`.
+        :return: :py:class:`list` of event `dict`, each with its "id"
+        """
+        raise NotImplementedError
+
+    def sweep_expired_games(self, limit=100, now=None):
+        """ Reclaim up to limit games idle past their deadline, freeing their players.
+        :return: `int` number of games reclaimed
+        """
+        raise NotImplementedError
+
+    def leaderboard_top(self, board='alltime', count=10):
+        """ :return: :py:class:`list` of the leaders' entries, see `state_utils.leaderboard_top` """
+        raise NotImplementedError
+
+    def leaderboard_around(self, player_key, board='alltime', count=5):
+        """ :return: :py:class:`list` of the entries of player and count on each side, or None """
+        raise NotImplementedError
+
+    def leaderboard_rank(self, player_key, board='alltime'):
+        """ :return: the player's leaderboard entry `dict`, or None if they have no wins """
+        entries = self.leaderboard_around(player_key, board, 0)
+        return entries[0] if entries else None
+
+    async def acheck_player_for_existing_game(self, player_key):
+        return self.check_player_for_existing_game(player_key)
+
+    async def ainitiate_game(self, player_key, game_uuid=None):
+        return self.initiate_game(player_key, game_uuid)
+
+    async def acurrent_player_check(self, game_uuid, player_key):
+        return self.current_player_check(game_uuid, player_key)
+
+    async def aperform_game_action(self, game_uuid, player_key, kept_set, action='roll'):
+        return self.perform_game_action(game_uuid, player_key, kept_set, action)
+
+    async def aperform_game_actions(self, actions):
+        return self.perform_game_actions(actions)
+
+    async def aget_game_state(self, game_uuid):
+        return self.get_game_state(game_uuid)
+
+    async def aget_game_states(self, game_uuids):
+        return self.get_game_states(game_uuids)
+
+    async def aget_game_version(self, game_uuid, player_key=None):
+        return self.get_game_version(game_uuid, player_key)
+
+    async def aread_game_events(self, game_uuid, after='0-0', count=None, block=None):
+        return self.read_game_events(game_uuid, after, count, block)
+
+    async def asweep_expired_games(self, limit=100, now=None):
+        return self.sweep_expired_games(limit, now)
+
+    async def aleaderboard_top(self, board='alltime', count=10):
+        return self.leaderboard_top(board, count)
+
+    async def aleaderboard_around(self, player_key, board='alltime', count=5):
+        return self.leaderboard_around(player_key, board, count)
+
+    async def aleaderboard_rank(self, player_key, board='alltime'):
+        return self.leaderboard_rank(player_key, board)
+
+    async def asubscribe_game(self, game_uuid):
+        """ Listen for a game's events as they are logged.
+        :return: :py:class:`asyncio.Queue` receiving the `list` of events of each update
+        """
+        raise NotImplementedError
+
+    async def aunsubscribe_game(self, game_uuid, queue):
+        """ Stop listening for a game's events. """
+        raise NotImplementedError
+
+
+class RedisBackend(StateBackend):
+    """ Games in redis, see `parkle.state_utils`. """
+
+    def check_player_for_existing_game(self, player_key):
+        return state_utils.check_player_for_existing_game(player_key)
+
+    def initiate_game(self, player_key, game_uuid=None):
+        return state_utils.initiate_game(player_key, game_uuid)
+
+    def current_player_check(self, game_uuid, player_key):
+        return state_utils.current_player_check(game_uuid, player_key)
+
+    def perform_game_action(self, game_uuid, player_key, kept_set, action='roll'):
+        return state_utils.perform_game_action(game_uuid, player_key, kept_set, action)
+
+    def perform_game_actions(self, actions):
+        return state_utils.perform_game_actions(actions)
+
+    def get_game_state(self, game_uuid):
+        return state_utils.get_game_state(game_uuid)
+
+    def get_game_states(self, game_uuids):
+        return state_utils.get_game_states(game_uuids)
+
+    def get_game_version(self, game_uuid, player_key=None):
+        return state_utils.get_game_version(game_uuid, player_key)
+
+    def read_game_events(self, game_uuid, after='0-0', count=None, block=None):
+        return state_utils.read_game_events(game_uuid, after, count, block)
+
+    def sweep_expired_games(self, limit=100, now=None):
+        return state_utils.sweep_expired_games(limit, now)
+
+    def leaderboard_top(self, board='alltime', count=10):
+        return state_utils.leaderboard_top(board, count)
+
+    def leaderboard_around(self, player_key, board='alltime', count=5):
+        return state_utils.leaderboard_around(player_key, board, count)
+
+    def leaderboard_rank(self, player_key, board='alltime'):
+        return state_utils.leaderboard_rank(player_key, board)
+
+    async def acheck_player_for_existing_game(self, player_key):
+        return await state_utils.acheck_player_for_existing_game(player_key)
+
+    async def ainitiate_game(self, player_key, game_uuid=None):
+        return await state_utils.ainitiate_game(player_key, game_uuid)
+
+    async def acurrent_player_check(self, game_uuid, player_key):
+        return await state_utils.acurrent_player_check(game_uuid, player_key)
+
+    async def aperform_game_action(self, game_uuid, player_key, kept_set, action='roll'):
+        return await state_utils.aperform_game_action(game_uuid, player_key, kept_set, action)
+
+    async def aperform_game_actions(self, actions):
+        return await state_utils.aperform_game_actions(actions)
+
+    async def aget_game_state(self, game_uuid):
+        return await state_utils.aget_game_state(game_uuid)
+
+    async def aget_game_states(self, game_uuids):
+        return await state_utils.aget_game_states(game_uuids)
+
+    async def aget_game_version(self, game_uuid, player_key=None):
+        return await state_utils.aget_game_version(game_uuid, player_key)
+
+    async def aread_game_events(self, game_uuid, after='0-0', count=None, block=None):
+        return await state_utils.aread_game_events(game_uuid, after, count, block)
+
+    async def asweep_expired_games(self, limit=100, now=None):
+        return await state_utils.asweep_expired_games(limit, now)
+
+    async def aleaderboard_top(self, board='alltime', count=10):
+        return await state_utils.aleaderboard_top(board, count)
+
+    async def aleaderboard_around(self, player_key, board='alltime', count=5):
+        return await state_utils.aleaderboard_around(player_key, board, count)
+
+    async def aleaderboard_rank(self, player_key, board='alltime'):
+        return await state_utils.aleaderboard_rank(player_key, board)
+
+    async def asubscribe_game(self, game_uuid):
+        return await state_utils.asubscribe_game(game_uuid)
+
+    async def aunsubscribe_game(self, game_uuid, queue):
+        await state_utils.aunsubscribe_game(game_uuid, queue)
+
+
+class MemoryBackend(StateBackend):
+    """ Games in this process, following the same rules as the redis scripts.
+    A single lock makes each operation atomic across threads, and its condition
+    wakes readers waiting on new events.  Event ids count up from "1-0" in each game.
+    """
+
+    def __init__(self, idle_ttl=state_utils.DEFAULT_GAME_IDLE_TTL):
+        self.lock = threading.Condition()
+        self.idle_ttl = idle_ttl
+        self.games = {}  # game uuid: state dict, as in `state_utils.build_game_state`
+        self.player_table = {}  # player key: game uuid
+        self.events = {}  # game uuid: list of event dicts
+        self.subscribers = {}  # game uuid: set of (event loop, asyncio.Queue)
+        self.deadlines = {}  # game uuid: idle deadline
+        self.expiry = []  # heap of (deadline, game uuid), entries refreshed since are skipped
+        self.leaderboards = {}  # leaderboard key: {player key: wins}, of the current windows
+
+    def check_player_for_existing_game(self, player_key):
+        with self.lock:
+            return self.player_table.get(player_key, False)
+
+    def initiate_game(self, player_key, game_uuid=None):
+        with self.lock:
+            if game_uuid is not None:
+                game = self.games.get(game_uuid)
+                if game is None:
+                    return {"error": state_utils.INITIATE_GAME_ERRORS['no_game']}
+                if game["winner"] is not None:
+                    return {"error": state_utils.INITIATE_GAME_ERRORS['game_over']}
+            existing_uuid = self.player_table.get(player_key)
+            if existing_uuid is not None:
+                return {"error": state_utils.INITIATE_GAME_ERRORS['existing_game'].format(existing_uuid),
+                        "game_uuid": existing_uuid}
+
+            new_game = game_uuid is None
+            if new_game:  # Completely new game
+                game_uuid = uuid.uuid4().hex
+                game = self.games[game_uuid] = {
+                    "game_uuid": game_uuid,
+                    "start_time": datetime.datetime.now().isoformat(),
+                    "players": [],
+                    "current_player": player_key,
+                    "dice_roll": [],
+                    "running_points": 0,
+                    "scores": {},
+                    "winner": None,
+                    "version": 0,
+                }
+            self.player_table[player_key] = game_uuid
+            game["players"].append(player_key)
+            game["scores"][player_key] = 0
+            game["version"] += 1
+            self._touch(game_uuid)
+            if new_game:
+                self._log(game_uuid, 'create', player_key, start_time=game["start_time"])
+            else:
+                self._log(game_uuid, 'join', player_key)
+            return self._copy(game)
+
+    def current_player_check(self, game_uuid, player_key):
+        with self.lock:
+            game = self.games.get(game_uuid)
+            return bool(game and game["current_player"] == player_key)
+
+    def perform_game_action(self, game_uuid, player_key, kept_set, action='roll'):
+        errors = state_utils.GAME_ACTION_ERRORS
+        signature = utils.dice_signature(kept_set)
+        if signature is None:
+            return {"error": errors['invalid_kept_set']}
+        kept = utils.PackedDice(signature)
+        points = 0
+        if kept:
+            valid, points = utils.validate_kept_set(kept)
+            if not valid:
+                return {"error": errors['invalid_kept_set']}
+
+        with self.lock:
+            game = self.games.get(game_uuid)
+            if game is None:
+                return {"error": errors['no_game']}
+            if game["current_player"] != player_key:
+                return {"error": errors['not_current_player']}
+            if game["winner"] is not None:
+                return {"error": errors['game_over']}
+
+            roll = utils.dice_counts(utils.pack_dice(game["dice_roll"]))
+            kept_counts = utils.dice_counts(kept)
+            if any(k > r for k, r in zip(kept_counts, roll)):
+                return {"error": errors['not_in_roll']}
+
+            running = game["running_points"]
+            dice_left = 6
+            if not game["dice_roll"]:  # Start of a turn, roll all six dice
+                if kept or action != 'roll':
+                    return {"error": errors['must_roll']}
+            else:
+                if not kept:
+                    return {"error": errors['must_keep']}
+                running += points
+                dice_left = (len(game["dice_roll"]) - sum(kept_counts)) or 6  # Hot dice
+                self._log(game_uuid, 'keep', player_key, kept=utils.unpack_dice(kept), points=points,
+                          running_points=running)
+            game["version"] += 1
+            self._touch(game_uuid)
+
+            scores = game["scores"]
+            if action == 'bank':
+                scores[player_key] += running
+                game["running_points"], game["dice_roll"] = 0, []
+                if scores[player_key] >= utils.WINNING_SCORE:
+                    game["winner"] = player_key
+                    for player in game["players"]:
+                        self.player_table.pop(player, None)
+                    self._record_win(player_key)
+                    self._log(game_uuid, 'bank', player_key, score=scores[player_key], next_player=player_key)
+                    self._log(game_uuid, 'won', player_key, score=scores[player_key])
+                    return self._action_result('won', [], 0, player_key, scores[player_key])
+                game["current_player"] = self._next_player(game)
+                self._log(game_uuid, 'bank', player_key, score=scores[player_key], next_player=game["current_player"])
+                return self._action_result('banked', [], 0, game["current_player"], scores[player_key])
+
+            dice_roll = utils.dice_roll(dice_left)
+            if not utils.keep_options(dice_roll):  # Farkle, turn passes
+                game["running_points"], game["dice_roll"] = 0, []
+                game["current_player"] = self._next_player(game)
+                self._log(game_uuid, 'farkle', player_key, dice_roll=list(dice_roll),
+                          next_player=game["current_player"])
+                return self._action_result('farkle', dice_roll, 0, game["current_player"], scores[player_key])
+            game["running_points"], game["dice_roll"] = running, dice_roll
+            self._log(game_uuid, 'roll', player_key, dice_roll=list(dice_roll))
+            return self._action_result('rolled', dice_roll, running, player_key, scores[player_key])
+
+    def get_game_state(self, game_uuid):
+        with self.lock:
+            game = self.games.get(game_uuid)
+            if game is None:
+                return {"error": state_utils.GAME_STATE_ERRORS['no_game']}
+            return self._copy(game)
+
+    def get_game_states(self, game_uuids):
+        with self.lock:
+            return {game_uuid: self.get_game_state(game_uuid) for game_uuid in game_uuids}
+
+    def get_game_version(self, game_uuid, player_key=None):
+        with self.lock:
+            game = self.games.get(game_uuid)
+            if game is None or (player_key is not None and player_key not in game["players"]):
+                return None
+            return game["version"]
+
+    def read_game_events(self, game_uuid, after='0-0', count=None, block=None):
+        with self.lock:
+            events = self.events.get(game_uuid, [])
+            start = len(events) if after == '$' else int(after.split('-')[0])
+            if block is not None and start >= len(events):  # Wait for the next event, forever for 0
+                self.lock.wait_for(lambda: len(self.events.get(game_uuid, [])) > start,
+                                   timeout=block / 1000.0 if block else None)
+                events = self.events.get(game_uuid, [])
+            return [dict(event) for event in events[start:start + count if count else None]]
+
+    async def asubscribe_game(self, game_uuid):
+        queue = asyncio.Queue()
+        with self.lock:
+            self.subscribers.setdefault(game_uuid, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    async def aunsubscribe_game(self, game_uuid, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(game_uuid, set())
+            subscribers.discard((asyncio.get_running_loop(), queue))
+            if not subscribers:
+                self.subscribers.pop(game_uuid, None)
+
+    def sweep_expired_games(self, limit=100, now=None):
+        now = time.time() if now is None else now
+        swept = 0
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now and swept < limit:
+                deadline, game_uuid = heapq.heappop(self.expiry)
+                if self.deadlines.get(game_uuid) != deadline:
+                    continue
+                for player in self.games.pop(game_uuid)["players"]:
+                    if self.player_table.get(player) == game_uuid:
+                        del self.player_table[player]
+                del self.deadlines[game_uuid]
+                self.events.pop(game_uuid, None)
+                swept += 1
+        return swept
+
+    def leaderboard_top(self, board='alltime', count=10):
+        return self._ranked(board)[:count]
+
+    def leaderboard_around(self, player_key, board='alltime', count=5):
+        """ Ranks by sorting the whole leaderboard, fine for the players of one process. """
+        ranked = self._ranked(board)
+        for i, entry in enumerate(ranked):
+            if entry["player"] == player_key:
+                return ranked[max(i - count, 0):i + count + 1]
+        return None
+
+    def _ranked(self, board):
+        """ Entries of a leaderboard in rank order, as redis orders them (ties by player key, descending). """
+        key = state_utils.leaderboard_key(board)
+        with self.lock:
+            wins = sorted(self.leaderboards.get(key, {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return [{"rank": i + 1, "player": player, "wins": count} for i, (player, count) in enumerate(wins)]
+
+    def _record_win(self, player_key):
+        """ Count a win on the leaderboards, dropping closed windows, called holding the lock. """
+        keys = [state_utils.leaderboard_key(board) for board in state_utils.LEADERBOARDS]
+        self.leaderboards = {key: self.leaderboards.get(key, {}) for key in keys}
+        for key in keys:
+            self.leaderboards[key][player_key] = self.leaderboards[key].get(player_key, 0) + 1
+
+    def _log(self, game_uuid, event, player, **fields):
+        """ Append an event to a game's log and wake its readers, called holding the lock. """
+        events = self.events.setdefault(game_uuid, [])
+        events.append(dict(id=f"{len(events) + 1}-0", event=event, player=player, **fields))
+        self.lock.notify_all()
+        for loop, queue in self.subscribers.get(game_uuid, ()):
+            loop.call_soon_threadsafe(queue.put_nowait, [dict(events[-1])])
+
+    def _touch(self, game_uuid):
+        """ Refresh a game's idle deadline, called holding the lock. """
+        deadline = self.deadlines[game_uuid] = time.time() + self.idle_ttl
+        heapq.heappush(self.expiry, (deadline, game_uuid))
+
+    @staticmethod
+    def _next_player(game):
+        players = game["players"]
+        return players[(players.index(game["current_player"]) + 1) % len(players)]
+
+    @staticmethod
+    def _action_result(result, dice_roll, running_points, current_player, score):
+        return {
+            "result": result,
+            "dice_roll": list(dice_roll),
+            "running_points": running_points,
+            "current_player": current_player,
+            "score": score,
+        }
+
+    @staticmethod
+    def _copy(game):
+        """ Copy of a game's state, safe to hand out of the lock. """
+        return dict(game, players=list(game["players"]), dice_roll=list(game["dice_roll"]),
+                    scores=dict(game["scores"]))
+
+
+def get_backend():
+    """ The process wide :py:class:`StateBackend`, created from settings.PARKLE_STATE_BACKEND on first use. """
+    global BACKEND
+    if BACKEND is None:
+        try:
+            path = getattr(settings, 'PARKLE_STATE_BACKEND', DEFAULT_STATE_BACKEND)
+        except ImproperlyConfigured:  # Used outside of django, such as from a script
+            path = DEFAULT_STATE_BACKEND
+        BACKEND = import_string(path)()
+    return BACKEND
@@ -0,0 +1,162 @@
+import collections
+
+import numpy
+
+from parkle import policy
+from parkle import utils
+
+"""
+Bot strategies, the AI sub-system users write their own Parkle players with.
+
+Subclass `Strategy` and implement `decide`, which is shown an immutable `GameView` of
+the dice just rolled and returns a `Decision` of which scoring dice to keep and whether
+to bank.  Strategies that can share work between games, such as vectorized or table
+driven bots, may also override `decide_batch`, which the server uses to ask for the
+decisions of many bot seats at once.
+"""
+
+GameView = collections.namedtuple('GameView', ['scores', 'player', 'turn_points', 'dice_rolled', 'options'])
+GameView.__doc__ = """ Immutable view of a game, from the seat of the player to decide.
+
+    scores:  `tuple` banked score of each player
+    player:  `int` index of the deciding player in scores
+    turn_points:  `int` points kept so far this turn
+    dice_rolled:  `tuple` flat dice just rolled
+    options:  `tuple` of `utils.KeepOption`, every legal keep from dice_rolled
+"""
+
+Decision = collections.namedtuple('Decision', ['keep', 'bank'])
+Decision.__doc__ = """ A bot's decision:  the `utils.KeepOption` to keep, and `boolean` bank. """
+
+
+def game_view(scores, player, turn_points, dice_rolled):
+    """ Build the view of a roll that is not a farkle for a deciding player.
+    """
+    dice_rolled = tuple(dice_rolled)
+    return GameView(tuple(scores), player, turn_points, dice_rolled, utils.keep_options(dice_rolled))
+
+
+class Strategy(object):
+    """ Base class for a Parkle bot.  Strategies must be picklable, so that the
+    simulator can send them to worker processes.
+    """
+
+    def decide(self, view):
+        """ Decide what to keep from a roll, and whether to bank.
+
+        :param view: :py:class:`GameView`
+        :return: :py:class:`Decision`
+        """
+        raise NotImplementedError
+
+    def decide_batch(self, views):
+        """ Decide for many games at once, override to amortize work between them.
+
+        :param views: :py:class:`list` of :py:class:`GameView`
+        :return: :py:class:`list` of :py:class:`Decision`, in the same order
+        """
+        return [self.decide(view) for view in views]
+
+
+class BankThreshold(Strategy):
+    """ Keep the most points from each roll, and bank once the turn is worth at
+    least the threshold, or fewer than min_dice dice are left to roll.
+    """
+
+    def __init__(self, threshold=300, min_dice=3):
+        self.threshold = threshold
+        self.min_dice = min_dice
+
+    def decide(self, view):
+        keep = view.options[0]
+        dice_left = len(keep.remaining) or 6
+        return Decision(keep, view.turn_points + keep.points >= self.threshold or dice_left < self.min_dice)
+
+    def __repr__(self):
+        return "BankThreshold({0}, {1})".format(self.threshold, self.min_dice)
+
+
+class OptimalPolicy(Strategy):
+    """ Play the solved two player policy from a `parkle.policy` file.  Against more
+    than one opponent the leading opponent's score is used, and alone a score of 0.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._table = None
+
+    def __getstate__(self):
+        return {'path': self.path, '_table': None}  # Each process maps the file itself
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = policy.PolicyTable.load(self.path)
+        return self._table
+
+    def decide(self, view):
+        return self.decide_batch([view])[0]
+
+    def decide_batch(self, views):
+        """ Look up every keep option of every view in the policy table at once.
+        """
+        table = self.table
+        own, opponent, turn, dice, owner = [], [], [], [], []
+        for v, view in enumerate(views):
+            opponents = view.scores[:view.player] + view.scores[view.player + 1:]
+            for option in view.options:
+                own.append(view.scores[view.player])
+                opponent.append(max(opponents, default=0))
+                turn.append(view.turn_points + option.points)
+                dice.append(len(option.remaining) or 6)
+                owner.append(v)
+        own, opponent, turn, dice = (numpy.array(a) for a in (own, opponent, turn, dice))
+
+        won = own + turn >= table.target
+        entries = table.table[own // table.unit, opponent // table.unit,
+                              numpy.minimum(turn, table.target - table.unit) // table.unit, dice - 1]
+        values = numpy.where(won, policy.VALUE_SCALE, entries & policy.VALUE_SCALE)
+        roll = ~won & (entries & policy.ROLL_FLAG).astype(bool)
+
+        decisions = []
+        starts = numpy.searchsorted(owner, numpy.arange(len(views)))
+        for v, view in enumerate(views):
+            best = starts[v] + int(numpy.argmax(values[starts[v]:starts[v] + len(view.options)]))
+            decisions.append(Decision(view.options[best - starts[v]], not roll[best]))
+        return decisions
+
+
+def decide_all(seats):
+    """ Decide for many bot seats, batching the views of each strategy into a single
+    `Strategy.decide_batch` call.
+
+    :param seats: :py:class:`list` of (:py:class:`Strategy`, :py:class:`GameView`)
+    :return: :py:class:`list` of :py:class:`Decision`, in the same order as seats
+    """
+    batches = collections.OrderedDict()
+    for index, (strategy, view) in enumerate(seats):
+        batches.setdefault(id(strategy), (strategy, []))[1].append((index, view))
+    decisions = [None] * len(seats)
+    for strategy, batch in batches.values():
+        for (index, view), decision in zip(batch, strategy.decide_batch([view for index, view in batch])):
+            decisions[index] = decision
+    return decisions
+
+
+STRATEGIES = {
+    'cautious-bot': BankThreshold(300, 3),
+    'steady-bot': BankThreshold(500, 2),
+    'bold-bot': BankThreshold(1000, 2),
+}
+
+
+def register_strategy(username, strategy):
+    """ Register a strategy instance to play as a computer bot username.
+    """
+    STRATEGIES[username] = strategy
+
+
+def get_strategy(username):
+    """ :return: the :py:class:`Strategy` playing as bot username, or None
+    """
+    return STRATEGIES.get(username)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from parkle import backends
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """ Background sweeper, reclaiming games idle past their deadline in bounded batches. """
+    help = "Reclaim games idle past their deadline, freeing their players for new games."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=100, help="most games to reclaim per batch")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="seconds to wait when there are no more expired games")
+        parser.add_argument('--once', action='store_true', help="sweep until no expired games are left, then exit")
+
+    def handle(self, *args, **options):
+        backend = backends.get_backend()
+        while True:
+            swept = backend.sweep_expired_games(options['batch'])
+            if swept:
+                log.info(u"Reclaimed {0} expired games".format(swept))
+            if swept < options['batch']:  # Caught up with the expired games
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,250 @@
+import argparse
+import itertools
+import math
+import mmap
+import struct
+
+import numpy
+
+from parkle import utils
+
+"""
+Optimal bank-or-roll policy for a two player game, solved by value iteration.
+
+A state is (own score, opponent score, turn points, dice to roll), and its value is
+the probability that the player to move wins the game when both players play optimally.
+All scores are kept in units of 50 points, the smallest scoring dice value.
+
+Scores only ever increase, so states are solved one anti-diagonal of
+(own score + opponent score) at a time, from the target score downwards.  Banking
+lands on a higher diagonal which is already solved; the only cycle is a farkle,
+which hands the same two scores to the opponent, and is resolved by iterating the
+start-of-turn values on the diagonal to a fixed point.
+
+The solved table is written to a compact binary file:
+
+    header:  magic, format version, target score, score unit, size  (32 bytes)
+    body:    uint16 [own][opponent][turn points][dice - 1], little endian
+             bits 0-14 are the win probability scaled to 32767, bit 15 is set to roll.
+
+`PolicyTable.load` maps the file read only with `mmap`, so every API worker process
+shares the one copy of the table in the page cache, and none pays the solve cost.
+"""
+
+SCORE_UNIT = 50
+
+POLICY_MAGIC = b'PRKLPOL\x00'
+POLICY_VERSION = 1
+POLICY_HEADER = struct.Struct('<8sIIII8x')
+ROLL_FLAG = 1 << 15
+VALUE_SCALE = ROLL_FLAG - 1
+
+
+def build_roll_classes(unit=SCORE_UNIT):
+    """ Group every distinct roll of 1-6 dice by the keep choices it offers.
+
+    Only the best points for each number of dice left to roll matter to an optimal
+    player, so rolls offering the same choices are merged and their odds summed.
+
+    :param unit: `int` points per score unit
+    :return: (choice points, choice dice index, choice counts, class weights, farkle odds)
+        choice points and choice dice index are (classes, 6) arrays of each class's
+        choices, classes sorted by most choices first; choice counts holds the number
+        of classes with more than k choices for each column k.  Class weights is a
+        (6, classes) array of the odds of rolling each class with (dice index + 1) dice.
+    """
+    classes = {}
+    for n in range(1, 7):
+        for roll in itertools.combinations_with_replacement(range(1, 7), n):
+            best = {}
+            for option in utils.keep_options(list(roll)):
+                dice_left = len(option.remaining) or 6  # Hot dice, roll all 6 again
+                assert option.points % unit == 0, "Points {0} are not a multiple of {1}!".format(option.points, unit)
+                best[dice_left] = max(best.get(dice_left, 0), option.points // unit)
+            if not best:  # Farkle, covered by the farkle odds
+                continue
+            ways = math.factorial(n)
+            for count in utils.dice_counts(utils.pack_dice(list(roll))):
+                ways //= math.factorial(count)
+            key = (n, tuple(sorted(best.items())))
+            classes[key] = classes.get(key, 0) + ways / 6 ** n
+
+    ordered = sorted(classes.items(), key=lambda item: (-len(item[0][1]), item[0]))
+    choice_points = numpy.zeros((len(ordered), 6), dtype=int)
+    choice_dice = numpy.zeros((len(ordered), 6), dtype=int)
+    weights = numpy.zeros((6, len(ordered)))
+    for c, ((n, choices), odds) in enumerate(ordered):
+        for k, (dice_left, points) in enumerate(choices):
+            choice_points[c, k] = points
+            choice_dice[c, k] = dice_left - 1
+        weights[n - 1, c] = odds
+    choice_counts = [sum(1 for (n, choices), odds in ordered if len(choices) > k) for k in range(0, 6)]
+    farkle = numpy.array([utils.farkle_probability(n) for n in range(1, 7)])
+    return choice_points, choice_dice, choice_counts, weights, farkle
+
+
+def _solve_turns(own, opponent, size, start_values, farkle_values, roll_classes, max_points):
+    """ Solve every turn state for the score pairs of one diagonal.
+
+    :param own: (P,) own score units of each pair
+    :param opponent: (P,) opponent score units of each pair
+    :param size: `int` target score units
+    :param start_values: (size, size) start-of-turn values, solved for higher diagonals
+    :param farkle_values: (P,) value of farkling for each pair
+    :return: (values, roll) arrays shaped (turn points, 6, P)
+    """
+    choice_points, choice_dice, choice_counts, weights, farkle = roll_classes
+    pairs = len(own)
+    values = numpy.ones((size + max_points + 1, 6, pairs))
+    roll = numpy.ones((size, 6, pairs), dtype=bool)
+    farkle_term = farkle[:, None] * farkle_values[None, :]
+    for t in range(size - 1, -1, -1):
+        playing = own + t < size  # Otherwise banking has already won the game
+        if not playing.any():
+            continue
+        # Best choice for each class of roll, one column of choices at a time
+        best = values[t + choice_points[:, 0], choice_dice[:, 0]]
+        for k in range(1, 6):
+            count = choice_counts[k]
+            if not count:
+                break
+            numpy.maximum(best[:count], values[t + choice_points[:count, k], choice_dice[:count, k]],
+                          out=best[:count])
+        roll_value = weights @ best + farkle_term
+        if t == 0:  # Nothing to bank at the start of a turn
+            bank_value = numpy.zeros(pairs)
+        else:
+            banked = numpy.minimum(own + t, size - 1)
+            bank_value = numpy.where(playing, 1.0 - start_values[opponent, banked], 1.0)
+        roll[t] = roll_value > bank_value
+        values[t] = numpy.where(playing, numpy.maximum(roll_value, bank_value), 1.0)
+    return values[:size], roll
+
+
+def _solve_two_turns(start, own, opponent, size, start_values, roll_classes, max_points):
+    """ Solve two turns on one diagonal from guessed start-of-turn values.
+
+    Farkling hands the same scores to the opponent, the reversed pair on the diagonal,
+    so two turns map each pair's start value back onto itself.
+
+    :return: (new start values, (values, roll) of the second turn)
+    """
+    middle = _solve_turns(own, opponent, size, start_values, 1.0 - start[::-1], roll_classes, max_points)
+    turns = _solve_turns(own, opponent, size, start_values, 1.0 - middle[0][0, 5][::-1], roll_classes, max_points)
+    return turns[0][0, 5], turns
+
+
+def solve_policy(target=utils.WINNING_SCORE, unit=SCORE_UNIT, tolerance=1e-9):
+    """ Solve the optimal bank-or-roll policy for a two player game.
+
+    :param target: `int` score that wins the game
+    :param unit: `int` points per score unit, every scoring set is a multiple of it
+    :param tolerance: `float` convergence of the start-of-turn values on each diagonal
+    :return: (values, roll) arrays shaped (own, opponent, turn points, 6) indexed in
+        score units, the win probability and whether to roll at each state.
+    """
+    assert target % unit == 0, "Target {0} must be a multiple of the score unit {1}!".format(target, unit)
+    size = target // unit
+    roll_classes = build_roll_classes(unit)
+    max_points = int(roll_classes[0].max())
+    start_values = numpy.zeros((size, size))
+    values = numpy.zeros((size, size, size, 6), dtype=numpy.float32)
+    roll = numpy.zeros((size, size, size, 6), dtype=bool)
+
+    for diagonal in range(2 * size - 2, -1, -1):
+        own = numpy.arange(max(0, diagonal - size + 1), min(diagonal, size - 1) + 1)
+        opponent = diagonal - own
+        turns_args = (own, opponent, size, start_values, roll_classes, max_points)
+
+        # Secant steps on each pair's start value, the fixed point is piecewise linear
+        previous = numpy.full(len(own), 0.5)
+        previous_next = _solve_two_turns(previous, *turns_args)[0]
+        start = previous_next
+        start_next, turns = _solve_two_turns(start, *turns_args)
+        while numpy.abs(start_next - start).max() >= tolerance:
+            change = start - previous
+            slope = numpy.divide(start_next - previous_next, change, out=numpy.zeros_like(change),
+                                 where=change != 0)
+            secant = start + (start_next - start) / (1 - numpy.clip(slope, 0.0, 0.9))
+            previous, previous_next = start, start_next
+            start = numpy.clip(secant, 0.0, 1.0)
+            start_next, turns = _solve_two_turns(start, *turns_args)
+        start = start_next
+        turn_values, turn_roll = turns
+        start_values[own, opponent] = start
+        values[own, opponent] = turn_values.transpose(2, 0, 1)
+        roll[own, opponent] = turn_roll.transpose(2, 0, 1)
+    return values, roll
+
+
+def write_policy(path, values, roll, target=utils.WINNING_SCORE, unit=SCORE_UNIT):
+    """ Write a solved policy to the compact binary policy file format.
+    """
+    encoded = numpy.rint(numpy.clip(values, 0.0, 1.0) * VALUE_SCALE).astype('<u2')
+    encoded |= numpy.where(roll, ROLL_FLAG, 0).astype('<u2')
+    with open(path, 'wb') as f:
+        f.write(POLICY_HEADER.pack(POLICY_MAGIC, POLICY_VERSION, target, unit, values.shape[0]))
+        f.write(encoded.tobytes())
+
+
+class PolicyTable(object):
+    """ Read only view of a solved policy file, memory mapped and shared between processes.
+
+    Scores and points are in game points, not score units.
+    """
+
+    def __init__(self, table, target, unit):
+        self.table = table
+        self.target = target
+        self.unit = unit
+
+    @classmethod
+    def load(cls, path):
+        """ Memory map a policy file written by `write_policy`.
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, target, unit, size = POLICY_HEADER.unpack_from(mapped)
+        assert magic == POLICY_MAGIC and version == POLICY_VERSION, "{0} is not a policy file!".format(path)
+        table = numpy.frombuffer(mapped, dtype='<u2', offset=POLICY_HEADER.size)
+        return cls(table.reshape(size, size, size, 6), target, unit)
+
+    def _entry(self, own_score, opponent_score, turn_points, dice):
+        return int(self.table[own_score // self.unit, opponent_score // self.unit,
+                              turn_points // self.unit, dice - 1])
+
+    def win_probability(self, own_score, opponent_score, turn_points=0, dice=6):
+        """ Probability of winning from this state with optimal play.
+        """
+        if own_score + turn_points >= self.target:
+            return 1.0
+        return (self._entry(own_score, opponent_score, turn_points, dice) & VALUE_SCALE) / VALUE_SCALE
+
+    def should_roll(self, own_score, opponent_score, turn_points, dice):
+        """ Whether to roll the dice left (True) or bank the turn points (False).
+        """
+        if own_score + turn_points >= self.target:
+            return False
+        return bool(self._entry(own_score, opponent_score, turn_points, dice) & ROLL_FLAG)
+
+    def choose_keep(self, own_score, opponent_score, turn_points, dice_rolled):
+        """ Choose which scoring dice to keep from a roll.
+
+        :param dice_rolled: :py:class:`list` flat list of dice rolled
+        :return: the best `utils.KeepOption`, or None when the roll is a farkle
+        """
+        best, best_value = None, -1.0
+        for option in utils.keep_options(dice_rolled):
+            dice_left = len(option.remaining) or 6
+            value = self.win_probability(own_score, opponent_score, turn_points + option.points, dice_left)
+            if value > best_value:
+                best, best_value = option, value
+        return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve the optimal Parkle policy and write the policy file.")
+    parser.add_argument('path', help="policy file to write")
+    parser.add_argument('--target', type=int, default=utils.WINNING_SCORE, help="score that wins the game")
+    args = parser.parse_args()
+    write_policy(args.path, *solve_policy(args.target), target=args.target)
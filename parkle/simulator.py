@@ -0,0 +1,176 @@
+import argparse
+import collections
+import concurrent.futures
+import time
+
+import numpy
+
+from parkle import bots
+from parkle import utils
+
+"""
+Headless Monte Carlo simulation of complete Parkle games.
+
+Games are played in chunks, each chunk with its own random stream spawned from one
+master seed, so results are reproducible regardless of how many worker processes
+play them.  Workers only send back merged aggregates for their chunk, never the
+individual games.
+"""
+
+DICE_BUFFER_SIZE = 1 << 16
+SCORE_BUCKET = 500
+MAX_TURNS = 1000  # Turns per player before a game is called a draw
+
+
+class DiceStream(object):
+    """ Buffered dice from a NumPy generator, drawn in bulk and handed out as lists.
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.buffer = []
+        self.position = 0
+
+    def roll(self, n):
+        if self.position + n > len(self.buffer):
+            self.buffer = utils.dice_roll_batch(DICE_BUFFER_SIZE, 1, self.generator).ravel().tolist()
+            self.position = 0
+        dice = self.buffer[self.position:self.position + n]
+        self.position += n
+        return dice
+
+
+def play_turn(strategy, scores, player, dice):
+    """ Play one turn for player.
+
+    :param dice: :py:class:`DiceStream` to roll from
+    :return: `int` points banked, 0 for a farkle
+    """
+    turn_points = 0
+    dice_left = 6
+    while True:
+        dice_rolled = dice.roll(dice_left)
+        options = utils.keep_options(dice_rolled)
+        if not options:  # Farkle
+            return 0
+        view = bots.GameView(tuple(scores), player, turn_points, tuple(dice_rolled), options)
+        keep, bank = strategy.decide(view)
+        turn_points += keep.points
+        if bank or scores[player] + turn_points >= utils.WINNING_SCORE:
+            return turn_points
+        dice_left = len(keep.remaining) or 6  # Hot dice, roll all 6 again
+
+
+def play_game(strategies, dice, first_player=0):
+    """ Play a complete game, the first player to bank `utils.WINNING_SCORE` wins.
+
+    :param strategies: :py:class:`list` one `bots.Strategy` per player
+    :param dice: :py:class:`DiceStream` to roll from
+    :return: (winner index or None for a draw, final scores, turns played)
+    """
+    players = len(strategies)
+    scores = [0] * players
+    for turn in range(0, MAX_TURNS * players):
+        player = (first_player + turn) % players
+        scores[player] += play_turn(strategies[player], scores, player, dice)
+        if scores[player] >= utils.WINNING_SCORE:
+            return player, scores, turn + 1
+    return None, scores, MAX_TURNS * players
+
+
+class SimulationStats(object):
+    """ Aggregate results of many games, merged across chunks and workers.
+    """
+
+    def __init__(self, players):
+        self.players = players
+        self.games = 0
+        self.draws = 0
+        self.elapsed = 0.0
+        self.wins = [0] * players
+        self.scores = [collections.Counter() for p in range(0, players)]  # Final score bucket counts
+        self.turns = collections.Counter()  # Turns per game counts
+
+    def record(self, winner, scores, turns):
+        self.games += 1
+        if winner is None:
+            self.draws += 1
+        else:
+            self.wins[winner] += 1
+        for player, score in enumerate(scores):
+            self.scores[player][score // SCORE_BUCKET * SCORE_BUCKET] += 1
+        self.turns[turns] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.draws += other.draws
+        for player in range(0, self.players):
+            self.wins[player] += other.wins[player]
+            self.scores[player].update(other.scores[player])
+        self.turns.update(other.turns)
+        return self
+
+    @property
+    def win_rates(self):
+        return [wins / self.games if self.games else 0.0 for wins in self.wins]
+
+    @property
+    def mean_turns(self):
+        return sum(turns * count for turns, count in self.turns.items()) / self.games if self.games else 0.0
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+
+def simulate_chunk(strategies, games, seed, first_game=0):
+    """ Play games with one random stream, the unit of work sent to a worker.
+    The first player rotates from game to game.
+
+    :param seed: :py:class:`numpy.random.SeedSequence` for this chunk
+    :return: :py:class:`SimulationStats`
+    """
+    dice = DiceStream(numpy.random.default_rng(seed))
+    stats = SimulationStats(len(strategies))
+    for game in range(first_game, first_game + games):
+        stats.record(*play_game(strategies, dice, game % len(strategies)))
+    return stats
+
+
+def simulate(strategies, games, workers=None, seed=None, chunk_size=2000):
+    """ Play games across a pool of worker processes.
+
+    :param strategies: :py:class:`list` one `bots.Strategy` per player seat
+    :param games: `int` number of games to play
+    :param workers: `int` worker processes, defaults to the number of CPUs
+    :param seed: `int` master seed, each chunk of games gets an independent stream
+    :param chunk_size: `int` games per unit of work
+    :return: :py:class:`SimulationStats`
+    """
+    started = time.perf_counter()
+    chunks = range(0, games, chunk_size)
+    seeds = numpy.random.SeedSequence(seed).spawn(len(chunks))
+    stats = SimulationStats(len(strategies))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(simulate_chunk, strategies, min(chunk_size, games - first_game),
+                                   chunk_seed, first_game)
+                   for first_game, chunk_seed in zip(chunks, seeds)]
+        for future in concurrent.futures.as_completed(futures):
+            stats.merge(future.result())
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate Parkle games between bank threshold strategies.")
+    parser.add_argument('thresholds', type=int, nargs='+', help="bank threshold of each player")
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    result = simulate([bots.BankThreshold(t) for t in args.thresholds], args.games, args.workers, args.seed)
+    for threshold, win_rate in zip(args.thresholds, result.win_rates):
+        print("Bank at {0}: {1:.2%} wins".format(threshold, win_rate))
+    print("{0} games, {1} draws, {2:.1f} turns per game, {3:.0f} games/sec".format(
+        result.games, result.draws, result.mean_turns, result.games_per_second))
@@ -1,25 +1,41 @@
+import asyncio
+import hashlib
 import redis
+import redis.asyncio
+import struct
+import time
 import uuid
 import datetime
+import json
+import weakref
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 from parkle import utils
 
 """
 Game State in redis -- minimal information required to model a game
 
-Ideally most keys in are based on game uuid, such as follows:
+Ideally most keys in are based on game uuid.  Every key carries a hash tag of its
+shard, "{ce}" for a game uuid starting "ce" (see `game_key`), so all keys a script
+uses are in one Redis Cluster slot, or on one node of `ShardRouter`, as follows:
 
-"<game_uuid>_state":  {
+"{<tag>}<game_uuid>_state":  {
     "start_time": timestamp,
     "current_player":  "player_key",
-    "current_dice_roll": "",
+    "dice_roll": "[1, 5, 2]",
     # "kept_set": "1, 1, 1, 5, 5",  # Probably not needed to store in redis, it is a parameter for computation.
     "running_points: "",
+    "players": "player_key_A,player_key_B",  # Turn order, the order players joined
+    "winner": "player_key",  # Only once the game is over
+    "version": 1,  # Incremented by every change to the game, see `get_game_version`
     ...
 }
 
 # Player list can be derived from scores using HKEYS key to get all the fields
-"<game_uuid>_scores":  {
+"{<tag>}<game_uuid>_scores":  {
     "player_key_A":  "score of A",
     "player_key_B":  "score of B",
     "player_key_C":  "score of C",
@@ -29,14 +45,316 @@ Ideally most keys in are based on game uuid, such as follows:
 
 # Will need to be able to identify if a player already has an active game
 # Absence from table implies that the the player is not in an active game.
-"player_table": {
+# Sharded by a hash of the player key (see `player_tag`), so no one key is hit by every join.
+"{<player tag>}player_table": {
     "player_key_A":  "game_uuid",
 }
 
+# Append only log of every event in a game, see `read_game_events`.  Each entry has
+# an "event" (create, join, keep, roll, farkle, bank, won) and the "player" acting.
+# The events are also published on the channel of the same name, see `asubscribe_game`.
+"{<tag>}<game_uuid>_events":  stream
+
+# Idle deadline of each game of the shard, refreshed by every create, join and action.  Games
+# past their deadline are reclaimed by `sweep_expired_games`, which frees their players.
+"{<tag>}game_deadlines":  sorted set of game_uuid by deadline (epoch seconds)
+
+# Wins of each player, all time and in the current day and (ISO) week, see `leaderboard_top`.
+# Players are named as in games, by their id, so the public leaderboards show no keys.
+"{leaderboard}alltime":  sorted set of player_key by wins
+"{leaderboard}daily:2026-10-18":  sorted set of player_key by wins, expires the next day
+"{leaderboard}weekly:2026-W42":  sorted set of player_key by wins, expires the next week
+
+# Or with settings.PARKLE_REDIS['COMPACT'], the state and scores of a game are one
+# binary record (see `pack_game_record`), read with a single GET
+"{<tag>}<game_uuid>_game":  b"..."
+
 """
 
-# TODO Pull connection settings from settings
-POOL = redis.ConnectionPool(host='127.0.0.1', port=6379, db=0)
+DEFAULT_GAME_IDLE_TTL = 24 * 60 * 60  # Seconds without an action before a game may be reclaimed
+
+# Connection settings, overridden by settings.PARKLE_REDIS.  The URL may also be a
+# unix socket, such as "unix:///var/run/redis/redis.sock?db=0"
+DEFAULT_REDIS_SETTINGS = {
+    'URL': 'redis://127.0.0.1:6379/0',
+    'MAX_CONNECTIONS': 50,
+    'SOCKET_TIMEOUT': 5.0,
+    'SOCKET_CONNECT_TIMEOUT': 5.0,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'COMPACT': False,  # Keep each game as one binary record
+    'GAME_IDLE_TTL': DEFAULT_GAME_IDLE_TTL,
+    'ROUTING': 'single',  # 'single' node at URL, a 'cluster' reached from URL, or independent 'nodes'
+    'NODES': [],  # URLs of the independent nodes, shards are spread across them
+}
+
+# Shard of every game and player table key, a game's shard is the start of its uuid
+SHARD_TAGS = ['%02x' % shard for shard in range(0, 256)]
+
+# Wins of each player, in a window of time, see `leaderboard_key`.  All leaderboards are
+# in one shard of their own, as each is a single sorted set.
+LEADERBOARDS = ('daily', 'weekly', 'alltime')
+LEADERBOARD_TAG = 'leaderboard'
+
+POOL = None  # Created from settings on first use, see `get_pool`
+CLIENT = None
+ROUTER = None  # `ShardRouter` of the 'cluster' and 'nodes' routing
+ASYNC_CLIENTS = weakref.WeakKeyDictionary()  # An asyncio client and pool per event loop
+ASYNC_ROUTERS = weakref.WeakKeyDictionary()
+REDIS_SETTINGS = None
+
+
+def redis_settings():
+    """ The redis settings, defaults updated by settings.PARKLE_REDIS, read on first use """
+    global REDIS_SETTINGS
+    if REDIS_SETTINGS is None:
+        try:
+            overrides = getattr(settings, 'PARKLE_REDIS', {})
+        except ImproperlyConfigured:  # Used outside of django, such as from a script
+            overrides = {}
+        REDIS_SETTINGS = dict(DEFAULT_REDIS_SETTINGS, **overrides)
+    return REDIS_SETTINGS
+
+
+def _pool_options(config):
+    return {
+        'max_connections': config['MAX_CONNECTIONS'],
+        'socket_timeout': config['SOCKET_TIMEOUT'],
+        'socket_connect_timeout': config['SOCKET_CONNECT_TIMEOUT'],
+        'health_check_interval': config['HEALTH_CHECK_INTERVAL'],
+    }
+
+
+def get_pool():
+    """ The process wide redis connection pool, created from settings on first use. """
+    global POOL
+    if POOL is None:
+        config = redis_settings()
+        POOL = redis.ConnectionPool.from_url(config['URL'], **_pool_options(config))
+    return POOL
+
+
+def get_connection(tag=None):
+    """ The process wide redis client for the keys of a shard, sharing the connection pool.
+    :param tag: shard tag of the keys used, see `game_tag` and `player_tag`
+    """
+    global CLIENT, ROUTER
+    config = redis_settings()
+    if config['ROUTING'] != 'single':
+        if ROUTER is None:
+            ROUTER = ShardRouter(config)
+        return ROUTER.client(tag)
+    if CLIENT is None or CLIENT.connection_pool is not get_pool():
+        CLIENT = redis.Redis(connection_pool=get_pool())
+    return CLIENT
+
+
+def compact_layout():
+    """ Whether games are kept as one binary record. """
+    return redis_settings()['COMPACT']
+
+
+def idle_deadline():
+    """ Deadline for a game acted on now, after which the sweeper may reclaim it. """
+    return time.time() + redis_settings()['GAME_IDLE_TTL']
+
+
+def single_node():
+    """ Whether every shard is on one node, so the scripts of a game may also use the player
+    table and leaderboards.  Otherwise those are updated before or after the script.
+    """
+    return redis_settings()['ROUTING'] == 'single'
+
+
+def game_tag(game_uuid):
+    """ Shard tag of a game, the start of its (random) uuid. """
+    return game_uuid[:2]
+
+
+def player_tag(player_key):
+    """ Shard tag of a player's entry in the player table. """
+    return SHARD_TAGS[zlib.crc32(player_key.encode('utf-8')) % len(SHARD_TAGS)]
+
+
+def game_key(game_uuid, name):
+    """ Key of a game, such as "{ce}ce1167b6..._state" for name "state". """
+    return f"{{{game_tag(game_uuid)}}}{game_uuid}_{name}"
+
+
+def player_table_key(tag):
+    return f"{{{tag}}}player_table"
+
+
+def deadlines_key(tag):
+    return f"{{{tag}}}game_deadlines"
+
+
+def leaderboard_key(board, now=None):
+    """ Key of the current window of a leaderboard, such as "{leaderboard}daily:2026-10-18".
+    :param board: one of `LEADERBOARDS`
+    """
+    return _leaderboard_window(board, now)[0]
+
+
+def _leaderboard_window(board, now=None):
+    """ :return: (key, epoch seconds it may expire, None for all time) of a leaderboard's
+        current window, kept for one more window after it closes
+    """
+    day = datetime.datetime.fromtimestamp(time.time() if now is None else now, datetime.timezone.utc).date()
+    if board == 'alltime':
+        return f"{{{LEADERBOARD_TAG}}}alltime", None
+    if board == 'daily':
+        name, start, days = day.isoformat(), day, 1
+    elif board == 'weekly':
+        year, week, weekday = day.isocalendar()
+        name, start, days = f"{year}-W{week:02d}", day - datetime.timedelta(days=weekday - 1), 7
+    else:
+        raise ValueError(f"There is no {board} leaderboard.")
+    expire_at = datetime.datetime.combine(start + datetime.timedelta(days=2 * days), datetime.time.min,
+                                          tzinfo=datetime.timezone.utc)
+    return f"{{{LEADERBOARD_TAG}}}{board}:{name}", int(expire_at.timestamp())
+
+
+def _record_win_args(now=None):
+    """ :return: (keys, args) of the all time, daily and weekly leaderboards for `record_win` """
+    keys, args = [], []
+    for board in ('alltime', 'daily', 'weekly'):
+        key, expire_at = _leaderboard_window(board, now)
+        keys.append(key)
+        if expire_at is not None:
+            args.append(expire_at)
+    return keys, args
+
+
+def jump_hash(key, buckets):
+    """ Jump consistent hash (Lamping and Veach) of an `int` key to one of buckets.
+    Adding a bucket moves only the keys the new bucket takes over.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) % (1 << 64)
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardRouter(object):
+    """ Routes each shard tag to the client holding its keys, for the 'cluster' and
+    'nodes' routing.  A cluster client routes each command by the hash slot of its keys
+    itself; independent nodes each hold whole shards, picked by `jump_hash`.
+    Pub/sub goes through a plain client, a cluster forwards what is published to every node.
+    """
+
+    def __init__(self, config, asynchronous=False):
+        client_module = redis.asyncio if asynchronous else redis
+        if config['ROUTING'] == 'cluster':
+            options = _pool_options(config)
+            self.clients = [client_module.RedisCluster.from_url(config['URL'], **options)]
+            del options['max_connections']
+            self.pubsub_clients = [client_module.Redis.from_url(config['URL'], **options)]
+        elif config['ROUTING'] == 'nodes' and config['NODES']:
+            self.clients = self.pubsub_clients = [
+                client_module.Redis(connection_pool=client_module.ConnectionPool.from_url(url, **_pool_options(config)))
+                for url in config['NODES']]
+        else:
+            raise ImproperlyConfigured("PARKLE_REDIS ROUTING must be 'single', 'cluster' or 'nodes' with NODES.")
+
+    def node(self, tag):
+        """ Index of the node holding the shard. """
+        if tag is None or len(self.clients) == 1:
+            return 0
+        return jump_hash(zlib.crc32(tag.encode('utf-8')), len(self.clients))
+
+    def client(self, tag=None):
+        return self.clients[self.node(tag)]
+
+    def pubsub_client(self, tag=None):
+        return self.pubsub_clients[self.node(tag)]
+
+
+def get_async_router():
+    """ The asyncio `ShardRouter` for the running event loop, for the 'cluster' and 'nodes' routing. """
+    loop = asyncio.get_running_loop()
+    router = ASYNC_ROUTERS.get(loop)
+    if router is None:
+        router = ASYNC_ROUTERS[loop] = ShardRouter(redis_settings(), asynchronous=True)
+    return router
+
+
+def get_async_connection(tag=None):
+    """ The asyncio redis client for the running event loop, created from settings on first use.
+    asyncio connections belong to the loop they were made on, so each loop has its own pool.
+    :param tag: shard tag of the keys used, as `get_connection`
+    """
+    if redis_settings()['ROUTING'] != 'single':
+        return get_async_router().client(tag)
+    loop = asyncio.get_running_loop()
+    client = ASYNC_CLIENTS.get(loop)
+    if client is None:
+        config = redis_settings()
+        pool = redis.asyncio.ConnectionPool.from_url(config['URL'], **_pool_options(config))
+        client = ASYNC_CLIENTS[loop] = redis.asyncio.Redis(connection_pool=pool)
+    return client
+
+
+class LuaScript(object):
+    """ A Lua script run by EVALSHA, loading it with EVAL if the server does not have it yet.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def __call__(self, conn, keys, args):
+        try:
+            return conn.evalsha(self.sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            return conn.eval(self.source, len(keys), *keys, *args)
+
+    async def acall(self, conn, keys, args):
+        try:
+            return await conn.evalsha(self.sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            return await conn.eval(self.source, len(keys), *keys, *args)
+
+    def pipelined(self, conn, calls):
+        """ Run many calls of the script in one pipeline, loading it if the server does not have it.
+        :param calls: `list` of (keys, args)
+        :return: `list` of the reply to each call
+        """
+        replies = self._queue(conn, calls).execute(raise_on_error=False)
+        missing = self._missing(replies)
+        if missing:  # Then no call ran, the script is loaded for them all
+            conn.script_load(self.source)
+            for i, reply in zip(missing, self._queue(conn, [calls[i] for i in missing]).execute()):
+                replies[i] = reply
+        return self._raise_errors(replies)
+
+    async def apipelined(self, conn, calls):
+        """ asyncio version of `pipelined`. """
+        replies = await self._queue(conn, calls).execute(raise_on_error=False)
+        missing = self._missing(replies)
+        if missing:
+            await conn.script_load(self.source)
+            for i, reply in zip(missing, await self._queue(conn, [calls[i] for i in missing]).execute()):
+                replies[i] = reply
+        return self._raise_errors(replies)
+
+    def _queue(self, conn, calls):
+        pipe = conn.pipeline(transaction=False)
+        for keys, args in calls:
+            pipe.evalsha(self.sha, len(keys), *keys, *args)
+        return pipe
+
+    @staticmethod
+    def _missing(replies):
+        return [i for i, reply in enumerate(replies) if isinstance(reply, redis.exceptions.NoScriptError)]
+
+    @staticmethod
+    def _raise_errors(replies):
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
 
 
 def perform_dice_roll(n):
@@ -48,6 +366,7 @@ def perform_dice_roll(n):
     :rtype: `string`
     """
     dice = utils.dice_roll(n)
+    return ','.join(str(die) for die in dice)
 
 
 def check_player_for_existing_game(player_key):
@@ -59,38 +378,624 @@ def check_player_for_existing_game(player_key):
     :return: False or the matching game uuid string
     :rtype: False or `string`
     """
-    my_conn = redis.Redis(connection_pool=POOL)
-    current_game = my_conn.hget("player_table", player_key).decode('utf-8')
+    tag = player_tag(player_key)
+    return _existing_game(get_connection(tag).hget(player_table_key(tag), player_key))
+
+
+async def acheck_player_for_existing_game(player_key):
+    """ asyncio version of `check_player_for_existing_game`. """
+    tag = player_tag(player_key)
+    return _existing_game(await get_async_connection(tag).hget(player_table_key(tag), player_key))
+
+
+def _existing_game(current_game):
     if current_game:
-        return current_game
+        return current_game.decode('utf-8')
     return False
 
 
+# Claims a player for a game in the player table, when it is not local to the game's
+# scripts (see `single_node`), before the game script is run.
+#   KEYS: player table
+#   ARGV: player key, game uuid
+# Returns: the uuid of the player's existing game, or nil once claimed
+CLAIM_PLAYER_LUA = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return redis.call('HGET', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+# Frees players of a game from the player table, unless they have since joined another.
+#   KEYS: player table
+#   ARGV: game uuid, then the player keys
+# Returns: number of players freed
+RELEASE_PLAYERS_LUA = """
+local released = 0
+for i = 2, #ARGV do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        released = released + 1
+    end
+end
+return released
+"""
+
+claim_player_script = LuaScript(CLAIM_PLAYER_LUA)
+release_players_script = LuaScript(RELEASE_PLAYERS_LUA)
+
+
+def release_players(game_uuid, player_keys):
+    """ Free the players of a game from their shards of the player table, after the game
+    refused them, was won or was reclaimed.
+    """
+    for tag, players in _players_by_tag(player_keys).items():
+        release_players_script(get_connection(tag), [player_table_key(tag)], [game_uuid] + players)
+
+
+async def arelease_players(game_uuid, player_keys):
+    """ asyncio version of `release_players`. """
+    for tag, players in _players_by_tag(player_keys).items():
+        await release_players_script.acall(get_async_connection(tag), [player_table_key(tag)], [game_uuid] + players)
+
+
+def _players_by_tag(player_keys):
+    by_tag = {}
+    for player_key in player_keys:
+        by_tag.setdefault(player_tag(player_key), []).append(player_key)
+    return by_tag
+
+
+# Lua functions logging game events, shared by the scripts.  Each script call
+# publishes the events it logged, as a JSON list, on the channel named as the stream.
+GAME_EVENT_LUA = """
+local logged = {}
+local function log_event(stream, ...)
+    local fields = {...}
+    local event = {id = redis.call('XADD', stream, '*', unpack(fields))}
+    for i = 1, #fields, 2 do
+        event[fields[i]] = tostring(fields[i + 1])
+    end
+    table.insert(logged, event)
+end
+local function publish_events(stream)
+    redis.call('PUBLISH', stream, cjson.encode(logged))
+end
+local function log_keep(stream, player, running)
+    local kept = {}
+    for face = 1, 6 do
+        for i = 1, tonumber(string.sub(ARGV[2], face, face)) do
+            table.insert(kept, face)
+        end
+    end
+    if #kept > 0 then
+        log_event(stream, 'event', 'keep', 'player', player, 'kept', '[' .. table.concat(kept, ', ') .. ']',
+                  'points', ARGV[3], 'running_points', running)
+    end
+end
+local function log_turn(stream, result, player, dice_roll, score, following)
+    if result == 'rolled' then
+        log_event(stream, 'event', 'roll', 'player', player, 'dice_roll', dice_roll)
+    elseif result == 'farkle' then
+        log_event(stream, 'event', 'farkle', 'player', player, 'dice_roll', dice_roll, 'next_player', following)
+    else
+        log_event(stream, 'event', 'bank', 'player', player, 'score', score, 'next_player', following)
+        if result == 'won' then
+            log_event(stream, 'event', 'won', 'player', player, 'score', score)
+        end
+    end
+    publish_events(stream)
+end
+"""
+
+
+# Lua function counting a win on the leaderboards, shared by the scripts.  KEYS from
+# first are the all time, daily and weekly leaderboards, ARGV from expire_at the times
+# the daily and weekly windows expire (see `_record_win_args`).
+LEADERBOARD_LUA = """
+local function record_win(first, player, expire_at)
+    for i = first, first + 2 do
+        redis.call('ZINCRBY', KEYS[i], 1, player)
+    end
+    redis.call('EXPIREAT', KEYS[first + 1], ARGV[expire_at])
+    redis.call('EXPIREAT', KEYS[first + 2], ARGV[expire_at + 1])
+end
+"""
+
+# Counts a win on the leaderboards, after a game script on another node (see `single_node`).
+#   KEYS: all time, daily and weekly leaderboards
+#   ARGV: player key, daily and weekly expiry
+RECORD_WIN_LUA = LEADERBOARD_LUA + """
+record_win(1, ARGV[1], 2)
+"""
+
+record_win_script = LuaScript(RECORD_WIN_LUA)
+
+
+# Creates a new game, or joins an existing one, atomically in a single round trip.
+#   KEYS: state key, scores key, game deadlines, events stream, and the player table if local
+#   ARGV: player key, game uuid, start time (empty to join an existing game), idle deadline
+# Returns: {result, game uuid, state fields (HGETALL), scores (HGETALL)}
+INITIATE_GAME_LUA = GAME_EVENT_LUA + """
+local new_game = ARGV[3] ~= ''
+local player_table = KEYS[5]  -- Otherwise the player was claimed beforehand
+if not new_game then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {'no_game'}
+    end
+    if redis.call('HEXISTS', KEYS[1], 'winner') == 1 then
+        return {'game_over'}
+    end
+end
+if player_table and redis.call('HSETNX', player_table, ARGV[1], ARGV[2]) == 0 then
+    return {'existing_game', redis.call('HGET', player_table, ARGV[1])}
+end
+redis.call('HSET', KEYS[2], ARGV[1], 0)
+if new_game then
+    redis.call('HSET', KEYS[1], 'start_time', ARGV[3], 'current_player', ARGV[1],
+               'dice_roll', '[]', 'running_points', 0, 'players', ARGV[1], 'version', 1)
+else
+    redis.call('HSET', KEYS[1], 'players', redis.call('HGET', KEYS[1], 'players') .. ',' .. ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'version', 1)
+end
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[2])
+if new_game then
+    log_event(KEYS[4], 'event', 'create', 'player', ARGV[1], 'start_time', ARGV[3])
+else
+    log_event(KEYS[4], 'event', 'join', 'player', ARGV[1])
+end
+publish_events(KEYS[4])
+return {'joined', ARGV[2], redis.call('HGETALL', KEYS[1]), redis.call('HGETALL', KEYS[2])}
+"""
+
+INITIATE_GAME_ERRORS = {
+    'no_game': "The requested game does not exist.",
+    'game_over': "The requested game is already over.",
+    'existing_game': "Sorry, it appears you have an existing game with uuid: {0}",
+    'game_full': "The requested game has no more seats.",
+}
+
+initiate_game_script = LuaScript(INITIATE_GAME_LUA)
+
+
+def _decode_hash(flat):
+    """ Decode a flat [field, value, ...] reply, as scripts return from HGETALL. """
+    return {flat[i].decode('utf-8'): flat[i + 1].decode('utf-8') for i in range(0, len(flat), 2)}
+
+
+def _decode_mapping(mapping):
+    """ Decode a HGETALL reply dict of bytes. """
+    return {field.decode('utf-8'): value.decode('utf-8') for field, value in mapping.items()}
+
+
+def build_game_state(game_uuid, state, scores):
+    """ Represent a game's state from its decoded redis hashes.
+    :param game_uuid: game uuid of the state
+    :param state: `dict` of the "<game_uuid>_state" hash
+    :param scores: `dict` of the "<game_uuid>_scores" hash
+    :return: `dict` game state, players listed in turn order
+    """
+    return {
+        "game_uuid": game_uuid,
+        "start_time": state.get("start_time"),
+        "players": state["players"].split(','),
+        "current_player": state["current_player"],
+        "dice_roll": json.loads(state["dice_roll"]),
+        "running_points": int(state.get("running_points", 0)),
+        "scores": {player: int(score) for player, score in scores.items()},
+        "winner": state.get("winner"),
+        "version": int(state.get("version", 0)),
+    }
+
+
+# Compact game record, big-endian:
+#   format, current player index, winner index (255 for none), player count,
+#   dice roll (6 nibbles, 0 for no die), running points, version, start time (epoch seconds)
+# then for each player in turn order:  packed player key (see `pack_player_key`), score
+GAME_RECORD_FORMAT = 1
+GAME_RECORD_HEADER = struct.Struct('>BBBB3sIII')
+GAME_RECORD_SCORE = struct.Struct('>I')
+GAME_RECORD_VERSION = slice(11, 15)  # Byte range of the version in a record
+NO_WINNER = 255
+
+
+def pack_player_key(player_key):
+    """ Pack a player key after a length byte, uuid hex keys as their 16 bytes (with the length's high bit set). """
+    if len(player_key) == 32:
+        try:
+            raw = bytes.fromhex(player_key)
+        except ValueError:
+            raw = None
+        if raw is not None and raw.hex() == player_key:
+            return bytes([0x80 | len(raw)]) + raw
+    raw = player_key.encode('utf-8')
+    assert len(raw) < 0x80, u"Player key {0} is too long to pack.".format(player_key)
+    return bytes([len(raw)]) + raw
+
+
+def unpack_player_key(record, offset=0):
+    """ :return: (player key, offset after it) """
+    length = record[offset] & 0x7f
+    raw = record[offset + 1:offset + 1 + length]
+    key = raw.hex() if record[offset] & 0x80 else raw.decode('utf-8')
+    return key, offset + 1 + length
+
+
+def pack_game_record(game):
+    """ Pack a game state `dict` (see `build_game_state`) as a compact record.
+    :return: `bytes`
+    """
+    players = game["players"]
+    dice = list(game["dice_roll"]) + [0] * (6 - len(game["dice_roll"]))
+    winner = players.index(game["winner"]) if game.get("winner") else NO_WINNER
+    start_time = int(datetime.datetime.fromisoformat(game["start_time"]).timestamp())
+    parts = [GAME_RECORD_HEADER.pack(
+        GAME_RECORD_FORMAT, players.index(game["current_player"]), winner, len(players),
+        bytes(dice[i] << 4 | dice[i + 1] for i in range(0, 6, 2)), game["running_points"], game.get("version", 0),
+        start_time)]
+    for player in players:
+        parts.append(pack_player_key(player))
+        parts.append(GAME_RECORD_SCORE.pack(game["scores"][player]))
+    return b''.join(parts)
+
+
+def unpack_game_record(game_uuid, record):
+    """ Unpack a compact game record.
+    :return: game state `dict`, as from `build_game_state`
+    """
+    record_format, current, winner, count, dice, running, version, start_time = \
+        GAME_RECORD_HEADER.unpack_from(record)
+    assert record_format == GAME_RECORD_FORMAT, u"Unknown game record format {0}".format(record_format)
+    players, scores = [], {}
+    offset = GAME_RECORD_HEADER.size
+    for i in range(0, count):
+        player, offset = unpack_player_key(record, offset)
+        players.append(player)
+        scores[player] = GAME_RECORD_SCORE.unpack_from(record, offset)[0]
+        offset += GAME_RECORD_SCORE.size
+    game = {
+        "game_uuid": game_uuid,
+        "start_time": datetime.datetime.fromtimestamp(start_time).isoformat(),
+        "players": players,
+        "current_player": players[current],
+        "dice_roll": [die for byte in dice for die in (byte >> 4, byte & 0xf) if die],
+        "running_points": running,
+        "scores": scores,
+        "winner": players[winner] if winner != NO_WINNER else None,
+        "version": version,
+    }
+    return game
+
+
+# Lua functions for the compact game record, shared by the compact scripts.  Players
+# are kept packed, `player_key` unpacks one to return or use in the player table.
+GAME_RECORD_LUA = """
+local function read_u32(s, i)
+    local a, b, c, d = string.byte(s, i, i + 3)
+    return ((a * 256 + b) * 256 + c) * 256 + d
+end
+local function u32(n)
+    return string.char(math.floor(n / 16777216) % 256, math.floor(n / 65536) % 256,
+                       math.floor(n / 256) % 256, n % 256)
+end
+local function player_key(packed)
+    if string.byte(packed, 1) >= 128 then
+        return (string.gsub(string.sub(packed, 2), '.', function(c) return string.format('%02x', string.byte(c)) end))
+    end
+    return string.sub(packed, 2)
+end
+local function decode_game(s)
+    local game = {current = string.byte(s, 2) + 1, winner = string.byte(s, 3), dice = {},
+                  running = read_u32(s, 8), version = read_u32(s, 12), start = string.sub(s, 16, 19),
+                  players = {}, scores = {}}
+    for i = 5, 7 do
+        local byte = string.byte(s, i)
+        for _, die in ipairs({math.floor(byte / 16), byte % 16}) do
+            if die > 0 then
+                table.insert(game.dice, die)
+            end
+        end
+    end
+    local offset = 20
+    for p = 1, string.byte(s, 4) do
+        local length = string.byte(s, offset) % 128
+        table.insert(game.players, string.sub(s, offset, offset + length))
+        table.insert(game.scores, read_u32(s, offset + length + 1))
+        offset = offset + length + 5
+    end
+    return game
+end
+local function encode_game(game)
+    local d = {}
+    for i = 1, 6 do
+        d[i] = tonumber(game.dice[i] or 0)
+    end
+    local parts = {string.char(1, game.current - 1, game.winner, #game.players,
+                               d[1] * 16 + d[2], d[3] * 16 + d[4], d[5] * 16 + d[6]),
+                   u32(game.running), u32(game.version), game.start}
+    for i, player in ipairs(game.players) do
+        table.insert(parts, player)
+        table.insert(parts, u32(game.scores[i]))
+    end
+    return table.concat(parts)
+end
+"""
+
+# Creates or joins a game kept as a compact record, as `INITIATE_GAME_LUA`.
+#   KEYS: game record key, game deadlines, events stream, and the player table if local
+#   ARGV: packed player key, player key, game uuid, start time (epoch seconds, empty to join), idle deadline
+# Returns: {result, game uuid, game record}
+COMPACT_INITIATE_GAME_LUA = GAME_RECORD_LUA + GAME_EVENT_LUA + """
+local record = redis.call('GET', KEYS[1])
+local new_game = ARGV[4] ~= ''
+local player_table = KEYS[4]
+if not new_game then
+    if not record then
+        return {'no_game'}
+    end
+    if string.byte(record, 3) ~= 255 then
+        return {'game_over'}
+    end
+    if string.byte(record, 4) == 255 then
+        return {'game_full'}
+    end
+end
+if player_table and redis.call('HSETNX', player_table, ARGV[2], ARGV[3]) == 0 then
+    return {'existing_game', redis.call('HGET', player_table, ARGV[2])}
+end
+local game
+if new_game then
+    game = {current = 1, winner = 255, dice = {}, running = 0, version = 0, start = u32(tonumber(ARGV[4])),
+            players = {}, scores = {}}
+else
+    game = decode_game(record)
+end
+table.insert(game.players, ARGV[1])
+table.insert(game.scores, 0)
+game.version = game.version + 1
+record = encode_game(game)
+redis.call('SET', KEYS[1], record)
+redis.call('ZADD', KEYS[2], ARGV[5], ARGV[3])
+if new_game then
+    log_event(KEYS[3], 'event', 'create', 'player', ARGV[2], 'start_time', ARGV[4])
+else
+    log_event(KEYS[3], 'event', 'join', 'player', ARGV[2])
+end
+publish_events(KEYS[3])
+return {'joined', ARGV[3], record}
+"""
+
+compact_initiate_game_script = LuaScript(COMPACT_INITIATE_GAME_LUA)
+
+
 def initiate_game(player_key, game_uuid=None):
     """ Atomic function for initializing a game for human player.
     Verification player is not a part of existing game is part of call.
     Player will join game specified in parameter, or will spawn a new game.
+    Either way every key of the game is written by one script call, in a single round trip;
+    unless `single_node`, the player is claimed in its shard of the player table first,
+    and freed again if the game refused them, or the script failed.  (A script whose reply
+    was lost may have seated them; the game goes on, and is won or swept, without its claim.)
     :param player_key: player api key being initiated into game
     :param game_uuid: (optional) game uuid to join.
-    :return: game_uuid `string` or False (player already in existing game)
+    :return: the complete game state `dict` (see `build_game_state`), or a dict with
+        an "error" message, and "game_uuid" if player is already in an existing game.
     """
-    new_game = False
-    if game_uuid is None:  # Completely new game
+    game_uuid, script, keys, args = _initiate_game_args(player_key, game_uuid)
+    if not single_node():
+        tag = player_tag(player_key)
+        existing_uuid = claim_player_script(get_connection(tag), [player_table_key(tag)], [player_key, game_uuid])
+        if existing_uuid is not None:
+            return _initiate_game_result(game_uuid, [b'existing_game', existing_uuid])
+    try:
+        result = script(get_connection(game_tag(game_uuid)), keys, args)
+    except Exception:
+        if not single_node():  # Else the claim points at a game that may never have been written
+            release_players(game_uuid, [player_key])
+        raise
+    if not single_node() and result[0] != b'joined':
+        release_players(game_uuid, [player_key])
+    return _initiate_game_result(game_uuid, result)
+
+
+async def ainitiate_game(player_key, game_uuid=None):
+    """ asyncio version of `initiate_game`. """
+    game_uuid, script, keys, args = _initiate_game_args(player_key, game_uuid)
+    if not single_node():
+        tag = player_tag(player_key)
+        existing_uuid = await claim_player_script.acall(
+            get_async_connection(tag), [player_table_key(tag)], [player_key, game_uuid])
+        if existing_uuid is not None:
+            return _initiate_game_result(game_uuid, [b'existing_game', existing_uuid])
+    try:
+        result = await script.acall(get_async_connection(game_tag(game_uuid)), keys, args)
+    except (Exception, asyncio.CancelledError):
+        if not single_node():
+            await arelease_players(game_uuid, [player_key])
+        raise
+    if not single_node() and result[0] != b'joined':
+        await arelease_players(game_uuid, [player_key])
+    return _initiate_game_result(game_uuid, result)
+
+
+def _initiate_game_args(player_key, game_uuid):
+    """ :return: (game uuid, script, keys, args) """
+    new_game = game_uuid is None
+    if new_game:  # Completely new game
         game_uuid = uuid.uuid4().hex
-        new_game = True
-    my_conn = redis.Redis(connection_pool=POOL)
-    r = my_conn.hsetnx("player_table", player_key, game_uuid)
-    if r:  # If player is now added to game (success)
-        scores_key = f"{game_uuid}_scores"
-        my_conn.hset(scores_key, player_key, 0)
-        if new_game:  # Initialize new game
-            state_key = f"{game_uuid}_state"
-            #my_conn.hset(state_key, "start_time", datetime.datetime.now())
-            my_conn.hset(state_key, "current_player", player_key)
-            my_conn.hset(state_key, "dice_roll", '[]')
-
-        return game_uuid
-    return False
+    player_table = [player_table_key(player_tag(player_key))] if single_node() else []
+    if compact_layout():
+        start_time = str(int(time.time())) if new_game else ''
+        keys = [game_key(game_uuid, 'game'), deadlines_key(game_tag(game_uuid)), game_key(game_uuid, 'events')]
+        return (game_uuid, compact_initiate_game_script, keys + player_table,
+                [pack_player_key(player_key), player_key, game_uuid, start_time, idle_deadline()])
+    start_time = datetime.datetime.now().isoformat() if new_game else ''
+    keys = [game_key(game_uuid, 'state'), game_key(game_uuid, 'scores'), deadlines_key(game_tag(game_uuid)),
+            game_key(game_uuid, 'events')]
+    return game_uuid, initiate_game_script, keys + player_table, [player_key, game_uuid, start_time, idle_deadline()]
+
+
+def _initiate_game_result(game_uuid, result):
+    status = result[0].decode('utf-8')
+    if status == 'existing_game':
+        existing_uuid = result[1].decode('utf-8')
+        return {"error": INITIATE_GAME_ERRORS[status].format(existing_uuid), "game_uuid": existing_uuid}
+    if status in INITIATE_GAME_ERRORS:
+        return {"error": INITIATE_GAME_ERRORS[status]}
+    if len(result) == 3:  # Compact record
+        return unpack_game_record(game_uuid, result[2])
+    return build_game_state(game_uuid, _decode_hash(result[2]), _decode_hash(result[3]))
+
+
+GAME_STATE_ERRORS = {
+    'no_game': "The requested game does not exist.",
+}
+
+
+def get_game_state(game_uuid):
+    """ Reads the complete state of a game, both hashes in one round trip.
+    :param game_uuid: game uuid to read
+    :return: the game state `dict` (see `build_game_state`), or a dict with an "error" message
+    """
+    conn = get_connection(game_tag(game_uuid))
+    if compact_layout():
+        return _game_record_result(game_uuid, conn.get(game_key(game_uuid, 'game')))
+    pipe = conn.pipeline(transaction=False)
+    pipe.hgetall(game_key(game_uuid, 'state'))
+    pipe.hgetall(game_key(game_uuid, 'scores'))
+    return _game_state_result(game_uuid, *pipe.execute())
+
+
+async def aget_game_state(game_uuid):
+    """ asyncio version of `get_game_state`. """
+    conn = get_async_connection(game_tag(game_uuid))
+    if compact_layout():
+        return _game_record_result(game_uuid, await conn.get(game_key(game_uuid, 'game')))
+    pipe = conn.pipeline(transaction=False)
+    pipe.hgetall(game_key(game_uuid, 'state'))
+    pipe.hgetall(game_key(game_uuid, 'scores'))
+    return _game_state_result(game_uuid, *await pipe.execute())
+
+
+def get_game_states(game_uuids):
+    """ Reads the complete state of many games, in one pipelined round trip to each node.
+    :param game_uuids: game uuids to read
+    :return: `dict` of each game uuid to its game state `dict`, or a dict with an "error" message
+    """
+    states = {}
+    for conn, uuids in _by_client(game_uuids, get_connection):
+        pipe = conn.pipeline(transaction=False)
+        _read_game_states(pipe, uuids)
+        states.update(_game_states_result(uuids, pipe.execute()))
+    return states
+
+
+async def aget_game_states(game_uuids):
+    """ asyncio version of `get_game_states`, reading from every node at once. """
+    async def read(conn, uuids):
+        pipe = conn.pipeline(transaction=False)
+        _read_game_states(pipe, uuids)
+        return _game_states_result(uuids, await pipe.execute())
+
+    states = {}
+    for node_states in await asyncio.gather(*(read(conn, uuids) for conn, uuids in
+                                              _by_client(game_uuids, get_async_connection))):
+        states.update(node_states)
+    return states
+
+
+def _by_client(game_uuids, get_client):
+    """ :return: (client, `list` of game uuids) for each client holding some of the games """
+    groups = {}
+    for game_uuid in dict.fromkeys(game_uuids):
+        client = get_client(game_tag(game_uuid))
+        groups.setdefault(id(client), (client, []))[1].append(game_uuid)
+    return list(groups.values())
+
+
+def _read_game_states(pipe, game_uuids):
+    for game_uuid in game_uuids:
+        if compact_layout():
+            pipe.get(game_key(game_uuid, 'game'))
+        else:
+            pipe.hgetall(game_key(game_uuid, 'state'))
+            pipe.hgetall(game_key(game_uuid, 'scores'))
+
+
+def _game_states_result(game_uuids, replies):
+    if compact_layout():
+        return {game_uuid: _game_record_result(game_uuid, record) for game_uuid, record in zip(game_uuids, replies)}
+    return {game_uuid: _game_state_result(game_uuid, replies[2 * i], replies[2 * i + 1])
+            for i, game_uuid in enumerate(game_uuids)}
+
+
+def get_game_version(game_uuid, player_key=None):
+    """ Reads just the version of a game, for checking whether it changed.
+    :param player_key: (optional) player the version is read for, also reading the players
+    :return: `int` version, or None if there is no such game, or player_key is not one of its players
+    """
+    conn = get_connection(game_tag(game_uuid))
+    if player_key is not None:
+        if compact_layout():
+            return _record_player_version(conn.get(game_key(game_uuid, 'game')), player_key)
+        return _hash_player_version(conn.hmget(game_key(game_uuid, 'state'), 'version', 'players'), player_key)
+    if compact_layout():
+        return _record_version(conn.getrange(
+            game_key(game_uuid, 'game'), GAME_RECORD_VERSION.start, GAME_RECORD_VERSION.stop - 1))
+    return _hash_version(conn.hget(game_key(game_uuid, 'state'), 'version'))
+
+
+async def aget_game_version(game_uuid, player_key=None):
+    """ asyncio version of `get_game_version`. """
+    conn = get_async_connection(game_tag(game_uuid))
+    if player_key is not None:
+        if compact_layout():
+            return _record_player_version(await conn.get(game_key(game_uuid, 'game')), player_key)
+        return _hash_player_version(await conn.hmget(game_key(game_uuid, 'state'), 'version', 'players'), player_key)
+    if compact_layout():
+        return _record_version(await conn.getrange(
+            game_key(game_uuid, 'game'), GAME_RECORD_VERSION.start, GAME_RECORD_VERSION.stop - 1))
+    return _hash_version(await conn.hget(game_key(game_uuid, 'state'), 'version'))
+
+
+def _record_version(version):
+    return int.from_bytes(version, 'big') if len(version) == 4 else None
+
+
+def _hash_version(version):
+    return int(version) if version is not None else None
+
+
+def _hash_player_version(fields, player_key):
+    version, players = fields
+    if players is None or player_key not in players.decode('utf-8').split(','):
+        return None
+    return _hash_version(version)
+
+
+def _record_player_version(record, player_key):
+    """ Version of a compact record, read from its header, if player_key is one of its players. """
+    if not record:
+        return None
+    offset = GAME_RECORD_HEADER.size
+    for i in range(0, record[3]):  # The record's number of players
+        player, offset = unpack_player_key(record, offset)
+        if player == player_key:
+            return _record_version(record[GAME_RECORD_VERSION])
+        offset += GAME_RECORD_SCORE.size
+    return None
+
+
+def _game_state_result(game_uuid, state, scores):
+    if not state:
+        return {"error": GAME_STATE_ERRORS['no_game']}
+    return build_game_state(game_uuid, _decode_mapping(state), _decode_mapping(scores))
+
+
+def _game_record_result(game_uuid, record):
+    if not record:
+        return {"error": GAME_STATE_ERRORS['no_game']}
+    return unpack_game_record(game_uuid, record)
 
 
 def current_player_check(game_uuid, player_key):
@@ -103,13 +1008,722 @@ def current_player_check(game_uuid, player_key):
     :return:
     :rtype:
     """
-    my_conn = redis.Redis(connection_pool=POOL)
-    game_state = f"{game_uuid}_state"
-    actual_current = my_conn.hget(game_state, 'current_player')
-    if actual_current and actual_current.decode('utf-8') == player_key:
-        return True
-    return False
+    conn = get_connection(game_tag(game_uuid))
+    if compact_layout():
+        return _record_current_player(game_uuid, conn.get(game_key(game_uuid, 'game'))) == player_key
+    actual_current = conn.hget(game_key(game_uuid, 'state'), 'current_player')
+    return bool(actual_current and actual_current.decode('utf-8') == player_key)
+
+
+async def acurrent_player_check(game_uuid, player_key):
+    """ asyncio version of `current_player_check`. """
+    conn = get_async_connection(game_tag(game_uuid))
+    if compact_layout():
+        return _record_current_player(game_uuid, await conn.get(game_key(game_uuid, 'game'))) == player_key
+    actual_current = await conn.hget(game_key(game_uuid, 'state'), 'current_player')
+    return bool(actual_current and actual_current.decode('utf-8') == player_key)
+
+
+def _record_current_player(game_uuid, record):
+    return record and unpack_game_record(game_uuid, record)["current_player"]
+
+
+# Applies one turn action atomically, in a single round trip (EVALSHA).
+# Dice are rolled and scored in python, where the kept set's points come from the
+# scoring table; the script checks the player and that the kept dice are in the roll.
+#   KEYS: state key, scores key, game deadlines, events stream, and the leaderboards on a single node
+#   ARGV: player key, kept face counts ("100020"), kept points, action ("roll" | "bank"),
+#         next roll of 6 dice ("3,1,4,..."), farkle flag of each next roll prefix ("000101"),
+#         winning score, game uuid, idle deadline, and the leaderboard expiry on a single node
+# Returns: {result, dice roll, running points, current player, player's score}, then on a win
+#          the players, for the caller to free from their shards of the player table
+GAME_ACTION_LUA = GAME_EVENT_LUA + LEADERBOARD_LUA + """
+local current = redis.call('HGET', KEYS[1], 'current_player')
+if not current then
+    return {'no_game'}
+end
+if current ~= ARGV[1] then
+    return {'not_current_player'}
+end
+if redis.call('HEXISTS', KEYS[1], 'winner') == 1 then
+    return {'game_over'}
+end
+
+local roll = {0, 0, 0, 0, 0, 0}
+local roll_count = 0
+for die in string.gmatch(redis.call('HGET', KEYS[1], 'dice_roll') or '', '%d') do
+    roll[tonumber(die)] = roll[tonumber(die)] + 1
+    roll_count = roll_count + 1
+end
+local kept_count = 0
+for face = 1, 6 do
+    local kept = tonumber(string.sub(ARGV[2], face, face))
+    if kept > roll[face] then
+        return {'not_in_roll'}
+    end
+    kept_count = kept_count + kept
+end
+
+local running = tonumber(redis.call('HGET', KEYS[1], 'running_points') or '0')
+local dice_left = 6
+if roll_count == 0 then  -- Start of a turn, roll all six dice
+    if kept_count > 0 or ARGV[4] ~= 'roll' then
+        return {'must_roll'}
+    end
+else
+    if kept_count == 0 then
+        return {'must_keep'}
+    end
+    running = running + tonumber(ARGV[3])
+    dice_left = roll_count - kept_count
+    if dice_left == 0 then  -- Hot dice
+        dice_left = 6
+    end
+end
+redis.call('ZADD', KEYS[3], ARGV[9], ARGV[8])
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+log_keep(KEYS[4], ARGV[1], running)
+
+local players = {}
+for player in string.gmatch(redis.call('HGET', KEYS[1], 'players'), '[^,]+') do
+    table.insert(players, player)
+end
+local function next_player()
+    for i, player in ipairs(players) do
+        if player == ARGV[1] then
+            return players[(i % #players) + 1]
+        end
+    end
+end
+
+if ARGV[4] == 'bank' then
+    local score = redis.call('HINCRBY', KEYS[2], ARGV[1], running)
+    if score >= tonumber(ARGV[7]) then
+        redis.call('HSET', KEYS[1], 'winner', ARGV[1], 'running_points', 0, 'dice_roll', '[]')
+        if KEYS[5] then
+            record_win(5, ARGV[1], 10)
+        end
+        log_turn(KEYS[4], 'won', ARGV[1], '[]', score, ARGV[1])
+        return {'won', '[]', 0, ARGV[1], score, unpack(players)}
+    end
+    local following = next_player()
+    redis.call('HSET', KEYS[1], 'current_player', following, 'running_points', 0, 'dice_roll', '[]')
+    log_turn(KEYS[4], 'banked', ARGV[1], '[]', score, following)
+    return {'banked', '[]', 0, following, score}
+end
+
+local dice = {}
+for die in string.gmatch(ARGV[5], '%d') do
+    if #dice < dice_left then
+        table.insert(dice, die)
+    end
+end
+local dice_roll = '[' .. table.concat(dice, ', ') .. ']'
+local score = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if string.sub(ARGV[6], dice_left, dice_left) == '1' then  -- Farkle, turn passes
+    local following = next_player()
+    redis.call('HSET', KEYS[1], 'current_player', following, 'running_points', 0, 'dice_roll', '[]')
+    log_turn(KEYS[4], 'farkle', ARGV[1], dice_roll, score, following)
+    return {'farkle', dice_roll, 0, following, score}
+end
+redis.call('HSET', KEYS[1], 'running_points', running, 'dice_roll', dice_roll)
+log_turn(KEYS[4], 'rolled', ARGV[1], dice_roll, score, ARGV[1])
+return {'rolled', dice_roll, running, ARGV[1], score}
+"""
+
+GAME_ACTION_ERRORS = {
+    'no_game': "The requested game does not exist.",
+    'not_current_player': "It appears you are not the current player.",
+    'game_over': "The requested game is already over.",
+    'not_in_roll': "Kept dice were not in the current dice roll.",
+    'must_roll': "A turn starts by rolling all six dice, without keeping any.",
+    'must_keep': "At least one scoring die must be kept from the dice roll.",
+    'invalid_kept_set': "Dice list provided was not valid in form or scoring.",
+}
+
+game_action_script = LuaScript(GAME_ACTION_LUA)
+
+# Applies one turn action to a game kept as a compact record, as `GAME_ACTION_LUA`.
+#   KEYS: game record key, game deadlines, events stream, and the leaderboards on a single node
+#   ARGV: as `GAME_ACTION_LUA`, with the packed player key
+COMPACT_GAME_ACTION_LUA = GAME_RECORD_LUA + GAME_EVENT_LUA + LEADERBOARD_LUA + """
+local record = redis.call('GET', KEYS[1])
+if not record then
+    return {'no_game'}
+end
+local game = decode_game(record)
+if game.players[game.current] ~= ARGV[1] then
+    return {'not_current_player'}
+end
+if game.winner ~= 255 then
+    return {'game_over'}
+end
+
+local roll = {0, 0, 0, 0, 0, 0}
+for _, die in ipairs(game.dice) do
+    roll[die] = roll[die] + 1
+end
+local kept_count = 0
+for face = 1, 6 do
+    local kept = tonumber(string.sub(ARGV[2], face, face))
+    if kept > roll[face] then
+        return {'not_in_roll'}
+    end
+    kept_count = kept_count + kept
+end
+
+local running = game.running
+local dice_left = 6
+if #game.dice == 0 then  -- Start of a turn, roll all six dice
+    if kept_count > 0 or ARGV[4] ~= 'roll' then
+        return {'must_roll'}
+    end
+else
+    if kept_count == 0 then
+        return {'must_keep'}
+    end
+    running = running + tonumber(ARGV[3])
+    dice_left = #game.dice - kept_count
+    if dice_left == 0 then  -- Hot dice
+        dice_left = 6
+    end
+end
+redis.call('ZADD', KEYS[2], ARGV[9], ARGV[8])
+log_keep(KEYS[3], player_key(ARGV[1]), running)
+
+local player = game.current
+local function save(result, dice)
+    game.version = game.version + 1
+    redis.call('SET', KEYS[1], encode_game(game))
+    local dice_roll = '[' .. table.concat(dice, ', ') .. ']'
+    local following = player_key(game.players[game.current])
+    log_turn(KEYS[3], result, player_key(ARGV[1]), dice_roll, game.scores[player], following)
+    return {result, dice_roll, game.running, following, game.scores[player]}
+end
+local function pass_turn()
+    game.current = (game.current % #game.players) + 1
+    game.running = 0
+    game.dice = {}
+end
+
+if ARGV[4] == 'bank' then
+    game.scores[player] = game.scores[player] + running
+    if game.scores[player] >= tonumber(ARGV[7]) then
+        game.winner = player - 1
+        game.running = 0
+        game.dice = {}
+        if KEYS[4] then
+            record_win(4, player_key(ARGV[1]), 10)
+        end
+        local result = save('won', {})
+        for _, packed in ipairs(game.players) do
+            table.insert(result, player_key(packed))
+        end
+        return result
+    end
+    pass_turn()
+    return save('banked', {})
+end
+
+local dice = {}
+for die in string.gmatch(ARGV[5], '%d') do
+    if #dice < dice_left then
+        table.insert(dice, tonumber(die))
+    end
+end
+if string.sub(ARGV[6], dice_left, dice_left) == '1' then  -- Farkle, turn passes
+    pass_turn()
+    return save('farkle', dice)
+end
+game.running = running
+game.dice = dice
+return save('rolled', dice)
+"""
+
+compact_game_action_script = LuaScript(COMPACT_GAME_ACTION_LUA)
+
+
+def perform_game_action(game_uuid, player_key, kept_set, action='roll'):
+    """ Atomic function for performing a player's turn action, in one round trip
+    (and one more per shard of the player table freeing the players of a won game).
+    A win is counted on the leaderboards, by the same script on a single node.
+    Checks the player is current, keeps the kept set from the current dice roll,
+    then either rolls the remaining dice or banks the running points, passing the
+    turn on a farkle or bank.  Turns pass in the order players joined the game.
+    :param game_uuid: game uuid the action is for
+    :param player_key: player api key performing the action
+    :param kept_set: flat list of the dice kept, empty to start a turn
+    :param action: "roll" or "bank"
+    :return: dict of the result ("rolled", "farkle", "banked" or "won"), the dice roll,
+        running points, current player and the acting player's score,
+        or a dict with an "error" message if the action was not allowed.
+    :rtype: `dict`
+    """
+    action_args = _game_action_args(game_uuid, player_key, kept_set, action)
+    if "error" in action_args:
+        return action_args
+    script = action_args.pop("script")
+    result = script(get_connection(game_tag(game_uuid)), **action_args)
+    return _finish_game_action(game_uuid, player_key, result)
+
+
+async def aperform_game_action(game_uuid, player_key, kept_set, action='roll'):
+    """ asyncio version of `perform_game_action`. """
+    action_args = _game_action_args(game_uuid, player_key, kept_set, action)
+    if "error" in action_args:
+        return action_args
+    script = action_args.pop("script")
+    result = await script.acall(get_async_connection(game_tag(game_uuid)), **action_args)
+    return await _afinish_game_action(game_uuid, player_key, result)
+
+
+def perform_game_actions(actions):
+    """ Perform many turn actions, of one or more games, in one pipelined round trip to
+    each node.  Each action is applied atomically and in order, exactly as by its own
+    `perform_game_action`, so an action sees the effect of those before it.
+    :param actions: `list` of (game uuid, player key, kept set, action)
+    :return: :py:class:`list` of each action's result `dict`, as `perform_game_action`
+    """
+    results, calls = _game_actions_calls(actions)
+    for conn, group in _by_client_calls(actions, calls, get_connection):
+        replies = group[0][1]["script"].pipelined(conn, [(call["keys"], call["args"]) for i, call in group])
+        for (i, call), reply in zip(group, replies):
+            results[i] = _finish_game_action(actions[i][0], actions[i][1], reply)
+    return results
+
+
+async def aperform_game_actions(actions):
+    """ asyncio version of `perform_game_actions`. """
+    results, calls = _game_actions_calls(actions)
+    for conn, group in _by_client_calls(actions, calls, get_async_connection):
+        replies = await group[0][1]["script"].apipelined(conn, [(call["keys"], call["args"]) for i, call in group])
+        for (i, call), reply in zip(group, replies):
+            results[i] = await _afinish_game_action(actions[i][0], actions[i][1], reply)
+    return results
+
+
+def _game_actions_calls(actions):
+    """ :return: (results, with the errors of actions not valid to call, `list` of (index, script call)) """
+    results, calls = [None] * len(actions), []
+    for i, (game_uuid, player_key, kept_set, action) in enumerate(actions):
+        action_args = _game_action_args(game_uuid, player_key, kept_set, action)
+        if "error" in action_args:
+            results[i] = action_args
+        else:
+            calls.append((i, action_args))
+    return results, calls
+
+
+def _by_client_calls(actions, calls, get_client):
+    """ :return: (client, `list` of the calls to it, in order) for each client of the games called """
+    groups = {}
+    for i, call in calls:
+        client = get_client(game_tag(actions[i][0]))
+        groups.setdefault(id(client), (client, []))[1].append((i, call))
+    return list(groups.values())
+
+
+def _finish_game_action(game_uuid, player_key, result):
+    """ Free the players of a won game and count the win, unless the script did. """
+    release_players(game_uuid, [player.decode('utf-8') for player in result[5:]])
+    if result[0] == b'won' and not single_node():
+        keys, args = _record_win_args()
+        record_win_script(get_connection(LEADERBOARD_TAG), keys, [player_key] + args)
+    return _game_action_result(result)
+
+
+async def _afinish_game_action(game_uuid, player_key, result):
+    await arelease_players(game_uuid, [player.decode('utf-8') for player in result[5:]])
+    if result[0] == b'won' and not single_node():
+        keys, args = _record_win_args()
+        await record_win_script.acall(get_async_connection(LEADERBOARD_TAG), keys, [player_key] + args)
+    return _game_action_result(result)
+
+
+def _game_action_args(game_uuid, player_key, kept_set, action):
+    """ Score the kept set and roll the next dice for the game action script.
+    :return: `dict` of the script, its keys and args, or an "error" message
+    """
+    signature = utils.dice_signature(kept_set)
+    if signature is None:
+        return {"error": GAME_ACTION_ERRORS['invalid_kept_set']}
+    packed = utils.PackedDice(signature)
+    points = 0
+    if packed:
+        valid, points = utils.validate_kept_set(packed)
+        if not valid:
+            return {"error": GAME_ACTION_ERRORS['invalid_kept_set']}
+
+    next_roll = utils.dice_roll(6)
+    farkle_flags = ''.join('0' if utils.keep_options(next_roll[:n]) else '1' for n in range(1, 7))
+    args = [''.join(str(count) for count in utils.dice_counts(packed)), points, action,
+            ','.join(str(die) for die in next_roll), farkle_flags, utils.WINNING_SCORE, game_uuid, idle_deadline()]
+    keys = [deadlines_key(game_tag(game_uuid)), game_key(game_uuid, 'events')]
+    if single_node():  # A win is counted on the leaderboards by the script
+        leaderboards, expire_at = _record_win_args()
+        keys += leaderboards
+        args += expire_at
+    if compact_layout():
+        return {
+            "script": compact_game_action_script,
+            "keys": [game_key(game_uuid, 'game')] + keys,
+            "args": [pack_player_key(player_key)] + args,
+        }
+    return {
+        "script": game_action_script,
+        "keys": [game_key(game_uuid, 'state'), game_key(game_uuid, 'scores')] + keys,
+        "args": [player_key] + args,
+    }
+
+
+def _game_action_result(result):
+    status = result[0].decode('utf-8')
+    if status in GAME_ACTION_ERRORS:
+        return {"error": GAME_ACTION_ERRORS[status]}
+    return {
+        "result": status,
+        "dice_roll": json.loads(result[1]),
+        "running_points": int(result[2]),
+        "current_player": result[3].decode('utf-8'),
+        "score": int(result[4]),
+    }
+
+
+# A player's entry on a leaderboard, and those ranked around it, in one round trip.
+#   KEYS: leaderboard
+#   ARGV: player key, number of players on each side
+# Returns: {rank of the first entry, {player, wins, ...}}, or nil if the player has no wins
+LEADERBOARD_AROUND_LUA = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    return false
+end
+local first = math.max(rank - tonumber(ARGV[2]), 0)
+return {first, redis.call('ZREVRANGE', KEYS[1], first, rank + tonumber(ARGV[2]), 'WITHSCORES')}
+"""
+
+leaderboard_around_script = LuaScript(LEADERBOARD_AROUND_LUA)
+
+
+def leaderboard_top(board='alltime', count=10):
+    """ The leaders of a leaderboard, in O(log N + count).
+    :param board: one of `LEADERBOARDS`
+    :param count: `int` number of leaders
+    :return: :py:class:`list` of `dict` of each leader's "rank" (from 1), "player" and "wins"
+    """
+    key = leaderboard_key(board)
+    return _leaderboard_entries(0, get_connection(LEADERBOARD_TAG).zrevrange(key, 0, count - 1, withscores=True))
+
+
+async def aleaderboard_top(board='alltime', count=10):
+    """ asyncio version of `leaderboard_top`. """
+    key = leaderboard_key(board)
+    return _leaderboard_entries(
+        0, await get_async_connection(LEADERBOARD_TAG).zrevrange(key, 0, count - 1, withscores=True))
+
+
+def leaderboard_around(player_key, board='alltime', count=5):
+    """ A player's entry on a leaderboard with the players ranked around it, in O(log N + count).
+    :param count: `int` number of players on each side of the player
+    :return: :py:class:`list` of entries, as `leaderboard_top`, or None if the player has no wins
+    """
+    result = leaderboard_around_script(
+        get_connection(LEADERBOARD_TAG), [leaderboard_key(board)], [player_key, count])
+    return _leaderboard_around_result(result)
+
+
+async def aleaderboard_around(player_key, board='alltime', count=5):
+    """ asyncio version of `leaderboard_around`. """
+    result = await leaderboard_around_script.acall(
+        get_async_connection(LEADERBOARD_TAG), [leaderboard_key(board)], [player_key, count])
+    return _leaderboard_around_result(result)
+
+
+def leaderboard_rank(player_key, board='alltime'):
+    """ A player's entry on a leaderboard, in O(log N).
+    :return: entry `dict`, as `leaderboard_top`, or None if the player has no wins
+    """
+    entries = leaderboard_around(player_key, board, 0)
+    return entries[0] if entries else None
+
+
+async def aleaderboard_rank(player_key, board='alltime'):
+    """ asyncio version of `leaderboard_rank`. """
+    entries = await aleaderboard_around(player_key, board, 0)
+    return entries[0] if entries else None
+
+
+def _leaderboard_around_result(result):
+    if result is None:
+        return None
+    first, flat = result
+    return _leaderboard_entries(first, [(flat[i], flat[i + 1]) for i in range(0, len(flat), 2)])
+
+
+def _leaderboard_entries(first, ranked):
+    """ :param ranked: `list` of (player, wins) from the leaderboard rank first """
+    return [{"rank": first + i + 1, "player": player.decode('utf-8'), "wins": int(float(wins))}
+            for i, (player, wins) in enumerate(ranked)]
+
+
+EVENT_INT_FIELDS = ('points', 'running_points', 'score')
+EVENT_LIST_FIELDS = ('kept', 'dice_roll')
+
+
+def read_game_events(game_uuid, after='0-0', count=None, block=None):
+    """ Read a game's events after a stream id, in order.  Pass the "id" of the last
+    event read to continue from it, or "$" with block to wait for only new events.
+    :param game_uuid: game uuid to read the events of
+    :param after: stream id to read after, "0-0" from the start of the game
+    :param count: `int` most events to read, defaults to all of them
+    :param block: `int` milliseconds to wait for an event when there are none, defaults to not waiting
+    :return: :py:class:`list` of event `dict`, each with its stream "id"
+    """
+    return _decode_events(get_connection(game_tag(game_uuid)).xread(
+        {game_key(game_uuid, 'events'): after}, count=count, block=block))
+
+
+async def aread_game_events(game_uuid, after='0-0', count=None, block=None):
+    """ asyncio version of `read_game_events`. """
+    return _decode_events(await get_async_connection(game_tag(game_uuid)).xread(
+        {game_key(game_uuid, 'events'): after}, count=count, block=block))
+
+
+def _decode_events(reply):
+    events = []
+    for stream, entries in reply or []:
+        for event_id, fields in entries:
+            events.append(decode_event(dict(_decode_mapping(fields), id=event_id.decode('utf-8'))))
+    return events
+
+
+def decode_event(fields):
+    """ Convert the text fields of a logged or published event to their types. """
+    event = {}
+    for field, value in fields.items():
+        if field in EVENT_INT_FIELDS:
+            value = int(value)
+        elif field in EVENT_LIST_FIELDS:
+            value = json.loads(value)
+        event[field] = value
+    return event
+
+
+def replay_game(game_uuid, events):
+    """ Reconstruct a game's state by replaying its events, from the start of the game
+    up to any point in it.
+    :param events: `list` of event `dict`, as from `read_game_events`
+    :return: the game state `dict` (see `build_game_state`), or None if the game was not created
+    """
+    game = None
+    for event in events:
+        kind, player = event["event"], event["player"]
+        if kind == 'create':
+            start_time = event["start_time"]
+            if start_time.isdigit():  # Compact layout, epoch seconds
+                start_time = datetime.datetime.fromtimestamp(int(start_time)).isoformat()
+            game = {"game_uuid": game_uuid, "start_time": start_time, "players": [], "current_player": player,
+                    "dice_roll": [], "running_points": 0, "scores": {}, "winner": None, "version": 0}
+        if kind in ('create', 'join', 'roll', 'farkle', 'bank'):  # One of these for every change
+            game["version"] += 1
+        if kind in ('create', 'join'):
+            game["players"].append(player)
+            game["scores"][player] = 0
+        elif kind == 'keep':
+            game["running_points"] = event["running_points"]
+        elif kind == 'roll':
+            game["dice_roll"] = event["dice_roll"]
+        elif kind in ('farkle', 'bank'):
+            if kind == 'bank':
+                game["scores"][player] = event["score"]
+            game.update(current_player=event["next_player"], dice_roll=[], running_points=0)
+        elif kind == 'won':
+            game["winner"] = player
+    return game
+
+
+class GameUpdates(object):
+    """ Fans the events published for each game out to every listener in this event
+    loop, over one pub/sub connection subscribed to just the games listened to.
+    """
+
+    def __init__(self, client):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.listeners = {}  # game uuid: set of asyncio.Queue
+        self.reader = None
+
+    async def subscribe(self, game_uuid):
+        """ :return: :py:class:`asyncio.Queue` receiving the `list` of events of each update """
+        queue = asyncio.Queue()
+        listeners = self.listeners.setdefault(game_uuid, set())
+        listeners.add(queue)
+        if len(listeners) == 1:
+            await self.pubsub.subscribe(game_key(game_uuid, 'events'))
+        if self.reader is None or self.reader.done():
+            self.reader = asyncio.ensure_future(self._read())
+        return queue
+
+    async def unsubscribe(self, game_uuid, queue):
+        listeners = self.listeners.get(game_uuid)
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            del self.listeners[game_uuid]
+            await self.pubsub.unsubscribe(game_key(game_uuid, 'events'))
+
+    async def _read(self):
+        while self.listeners:
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None or message['type'] != 'message':
+                continue
+            game_uuid = message['channel'].decode('utf-8').split('}', 1)[1][:-len('_events')]
+            events = [decode_event(event) for event in json.loads(message['data'])]
+            for queue in self.listeners.get(game_uuid, ()):
+                queue.put_nowait(events)
+
+
+GAME_UPDATES = weakref.WeakKeyDictionary()  # The `GameUpdates` of each node, for each event loop
+
+
+def _game_updates(game_uuid):
+    """ The `GameUpdates` of the node publishing a game's events, in the running event loop. """
+    node_updates = GAME_UPDATES.setdefault(asyncio.get_running_loop(), {})
+    if single_node():
+        node, client = 0, get_async_connection()
+    else:
+        router, tag = get_async_router(), game_tag(game_uuid)
+        node, client = router.node(tag), router.pubsub_client(tag)
+    updates = node_updates.get(node)
+    if updates is None:
+        updates = node_updates[node] = GameUpdates(client)
+    return updates
+
+
+async def asubscribe_game(game_uuid):
+    """ Listen for a game's events as they are logged, sharing this event loop's one
+    pub/sub connection (to each node) with every other listener.
+    :return: :py:class:`asyncio.Queue` receiving the `list` of events of each update,
+        pass it to `aunsubscribe_game` when done
+    """
+    return await _game_updates(game_uuid).subscribe(game_uuid)
+
+
+async def aunsubscribe_game(game_uuid, queue):
+    """ Stop listening for a game's events. """
+    await _game_updates(game_uuid).unsubscribe(game_uuid, queue)
+
+
+# Reclaims a batch of a shard's games past their idle deadline.  Each deadline is
+# checked again, as a game may have been acted on since it was listed.
+#   KEYS: game deadlines, then the state, scores and events keys of each game
+#   ARGV: now (epoch seconds), then the uuid of each game
+# Returns: {number of games reclaimed, then the game uuid and player key of each player to free}
+SWEEP_GAMES_LUA = """
+local swept = {0}
+for i = 2, #ARGV do
+    local deadline = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if deadline and tonumber(deadline) <= tonumber(ARGV[1]) then
+        local state = KEYS[3 * i - 4]
+        for player in string.gmatch(redis.call('HGET', state, 'players') or '', '[^,]+') do
+            table.insert(swept, ARGV[i])
+            table.insert(swept, player)
+        end
+        redis.call('DEL', state, KEYS[3 * i - 3], KEYS[3 * i - 2])
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        swept[1] = swept[1] + 1
+    end
+end
+return swept
+"""
+
+sweep_games_script = LuaScript(SWEEP_GAMES_LUA)
+
+# As `SWEEP_GAMES_LUA`, for games kept as compact records.
+#   KEYS: game deadlines, then the record and events keys of each game
+COMPACT_SWEEP_GAMES_LUA = GAME_RECORD_LUA + """
+local swept = {0}
+for i = 2, #ARGV do
+    local deadline = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if deadline and tonumber(deadline) <= tonumber(ARGV[1]) then
+        local record = redis.call('GET', KEYS[2 * i - 2])
+        if record then
+            for _, packed in ipairs(decode_game(record).players) do
+                table.insert(swept, ARGV[i])
+                table.insert(swept, player_key(packed))
+            end
+        end
+        redis.call('DEL', KEYS[2 * i - 2], KEYS[2 * i - 1])
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        swept[1] = swept[1] + 1
+    end
+end
+return swept
+"""
+
+compact_sweep_games_script = LuaScript(COMPACT_SWEEP_GAMES_LUA)
+
+
+def sweep_expired_games(limit=100, now=None):
+    """ Reclaim up to limit games idle past their deadline, deleting their keys and
+    freeing their players from the player table.  Only the expired end of each shard's
+    deadlines sorted set is read, never the whole keyspace.
+    :param limit: `int` most games to reclaim in this batch
+    :param now: epoch seconds to expire against, defaults to the current time
+    :return: `int` number of games reclaimed
+    """
+    now = time.time() if now is None else now
+    swept = 0
+    for tag in SHARD_TAGS:
+        if swept >= limit:
+            break
+        conn = get_connection(tag)
+        expired = conn.zrangebyscore(deadlines_key(tag), '-inf', now, start=0, num=limit - swept)
+        if expired:
+            script, keys, args = _sweep_args(tag, expired, now)
+            result = script(conn, keys, args)
+            for game_uuid, players in _swept_players(result).items():
+                release_players(game_uuid, players)
+            swept += result[0]
+    return swept
+
+
+async def asweep_expired_games(limit=100, now=None):
+    """ asyncio version of `sweep_expired_games`. """
+    now = time.time() if now is None else now
+    swept = 0
+    for tag in SHARD_TAGS:
+        if swept >= limit:
+            break
+        conn = get_async_connection(tag)
+        expired = await conn.zrangebyscore(deadlines_key(tag), '-inf', now, start=0, num=limit - swept)
+        if expired:
+            script, keys, args = _sweep_args(tag, expired, now)
+            result = await script.acall(conn, keys, args)
+            for game_uuid, players in _swept_players(result).items():
+                await arelease_players(game_uuid, players)
+            swept += result[0]
+    return swept
+
+
+def _sweep_args(tag, expired, now):
+    """ :return: (script, keys, args) reclaiming the expired game uuids of the shard """
+    game_uuids = [game_uuid.decode('utf-8') for game_uuid in expired]
+    keys = [deadlines_key(tag)]
+    if compact_layout():
+        script = compact_sweep_games_script
+        for game_uuid in game_uuids:
+            keys.extend((game_key(game_uuid, 'game'), game_key(game_uuid, 'events')))
+    else:
+        script = sweep_games_script
+        for game_uuid in game_uuids:
+            keys.extend((game_key(game_uuid, 'state'), game_key(game_uuid, 'scores'), game_key(game_uuid, 'events')))
+    return script, keys, [now] + game_uuids
 
 
-def perform_game_action(game_uuid, player_key):
-    pass
+def _swept_players(result):
+    """ :return: `dict` of game uuid: `list` of the player keys to free """
+    players = {}
+    for i in range(1, len(result), 2):
+        players.setdefault(result[i].decode('utf-8'), []).append(result[i + 1].decode('utf-8'))
+    return players
@@ -0,0 +1,364 @@
+
+# Test cases for the parkle game state backends
+
+import asyncio
+import threading
+import weakref
+
+import pytest
+import redis
+
+from parkle import backends
+from parkle import state_utils
+from parkle import utils as parkle_utils
+
+IDLE_TTL = 60
+
+# The in-memory backend, and the redis backend in both layouts of a game, with every
+# shard on one node and with the shards routed across nodes
+BACKENDS = ['memory', 'redis-hash-single', 'redis-compact-single', 'redis-hash-nodes', 'redis-compact-nodes']
+
+
+class LoopClients(weakref.WeakKeyDictionary):
+    """ asyncio clients of each event loop, made on first use, in place of those state_utils makes from settings. """
+
+    def __init__(self, make):
+        super().__init__()
+        self.make = make
+
+    def get(self, loop, default=None):
+        if loop not in self:
+            self[loop] = self.make()
+        return self[loop]
+
+
+def fake_router(clients):
+    router = object.__new__(state_utils.ShardRouter)
+    router.clients = router.pubsub_clients = clients
+    return router
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """ Each state backend, the redis one on fakeredis, which runs its Lua scripts.
+    Every test starts with empty servers, so each script is first loaded by the test.
+    """
+    if request.param == 'memory':
+        return backends.MemoryBackend(idle_ttl=IDLE_TTL)
+    fakeredis = pytest.importorskip('fakeredis')
+    layout, routing = request.param.split('-')[1:]
+    servers = [fakeredis.FakeServer() for i in range(1 if routing == 'single' else 3)]
+    config = dict(state_utils.DEFAULT_REDIS_SETTINGS, COMPACT=layout == 'compact', ROUTING=routing,
+                  NODES=[f'redis://node-{i}' for i in range(len(servers))], GAME_IDLE_TTL=IDLE_TTL)
+    monkeypatch.setattr(state_utils, 'REDIS_SETTINGS', config)
+    monkeypatch.setattr(state_utils, 'POOL', redis.ConnectionPool(connection_class=fakeredis.FakeConnection,
+                                                                  server=servers[0]))
+    monkeypatch.setattr(state_utils, 'CLIENT', None)
+    monkeypatch.setattr(state_utils, 'ROUTER', fake_router([fakeredis.FakeRedis(server=s) for s in servers]))
+    monkeypatch.setattr(state_utils, 'ASYNC_CLIENTS', LoopClients(
+        lambda: fakeredis.FakeAsyncRedis(server=servers[0])))
+    monkeypatch.setattr(state_utils, 'ASYNC_ROUTERS', LoopClients(
+        lambda: fake_router([fakeredis.FakeAsyncRedis(server=s) for s in servers])))
+    monkeypatch.setattr(state_utils, 'GAME_UPDATES', weakref.WeakKeyDictionary())
+    return backends.RedisBackend()
+
+
+def rolls(monkeypatch, backend, *dice_rolls):
+    """ Make the dice of the next actions, six each, come out as given, None for an action
+    that rolls no dice.  The redis backend rolls for every action with a valid kept set
+    (before its script checks the action), the memory backend only for the rolls made.
+    """
+    if isinstance(backend, backends.MemoryBackend):
+        upcoming = [dice for dice in dice_rolls if dice is not None]
+    else:
+        upcoming = [dice or [2, 3, 4, 6, 6, 2] for dice in dice_rolls]
+    monkeypatch.setattr(parkle_utils, 'dice_roll', lambda n: upcoming.pop(0)[:n])
+
+
+def win(monkeypatch, backend, game_uuid, player):
+    """ Have the current player win the game, banking three ones as the first roll of their turn.
+    """
+    monkeypatch.setattr(parkle_utils, 'WINNING_SCORE', 300)
+    rolls(monkeypatch, backend, [1, 1, 1, 2, 3, 4], None)
+    backend.perform_game_action(game_uuid, player, [])
+    return backend.perform_game_action(game_uuid, player, [1, 1, 1], 'bank')
+
+
+def test_create_and_join(backend):
+    """ Test creating and joining a game, and the join errors, which leave the player free.
+    """
+    game = backend.initiate_game('A')
+    game_uuid = game['game_uuid']
+    assert game['players'] == ['A'] and game['current_player'] == 'A' and game['scores'] == {'A': 0}
+
+    game = backend.initiate_game('B', game_uuid)
+    assert game['players'] == ['A', 'B'] and game['scores'] == {'A': 0, 'B': 0}
+    assert backend.check_player_for_existing_game('B') == game_uuid
+    assert backend.check_player_for_existing_game('C') is False
+
+    again = backend.initiate_game('B')
+    assert again['game_uuid'] == game_uuid and again['error'].endswith(game_uuid)
+    assert backend.initiate_game('C', 'missing') == {"error": state_utils.INITIATE_GAME_ERRORS['no_game']}
+    assert backend.check_player_for_existing_game('C') is False
+    assert backend.get_game_state('missing') == {"error": state_utils.GAME_STATE_ERRORS['no_game']}
+
+    # Handed out states are copies
+    backend.get_game_state(game_uuid)['players'].append('X')
+    assert backend.get_game_state(game_uuid)['players'] == ['A', 'B']
+
+
+def test_game_actions(monkeypatch, backend):
+    """ Test a turn of rolling, keeping and banking, then a farkle passing the turn back.
+    """
+    game_uuid = backend.initiate_game('A')['game_uuid']
+    backend.initiate_game('B', game_uuid)
+    errors = state_utils.GAME_ACTION_ERRORS
+
+    rolls(monkeypatch, backend, None, None, [1, 1, 1, 5, 2, 3], None, None, [5, 2, 3, 4, 6, 6], None,
+          [2, 2, 3, 3, 4, 6])
+    assert backend.perform_game_action(game_uuid, 'B', []) == {"error": errors['not_current_player']}
+    assert backend.perform_game_action(game_uuid, 'A', [], 'bank') == {"error": errors['must_roll']}
+
+    result = backend.perform_game_action(game_uuid, 'A', [])
+    assert result == {"result": 'rolled', "dice_roll": [1, 1, 1, 5, 2, 3], "running_points": 0,
+                      "current_player": 'A', "score": 0}
+    assert backend.perform_game_action(game_uuid, 'A', []) == {"error": errors['must_keep']}
+    assert backend.perform_game_action(game_uuid, 'A', [5, 5]) == {"error": errors['not_in_roll']}
+    assert backend.perform_game_action(game_uuid, 'A', [2]) == {"error": errors['invalid_kept_set']}
+
+    result = backend.perform_game_action(game_uuid, 'A', [1, 1, 1, 5])
+    assert result['result'] == 'rolled' and result['dice_roll'] == [5, 2]
+    assert result['running_points'] == 350
+
+    result = backend.perform_game_action(game_uuid, 'A', [5], 'bank')
+    assert result == {"result": 'banked', "dice_roll": [], "running_points": 0, "current_player": 'B', "score": 400}
+    assert backend.current_player_check(game_uuid, 'B')
+
+    result = backend.perform_game_action(game_uuid, 'B', [])
+    assert result['result'] == 'farkle' and result['current_player'] == 'A'
+    assert backend.get_game_state(game_uuid)['scores'] == {'A': 400, 'B': 0}
+    assert backend.get_game_version(game_uuid) == backend.get_game_state(game_uuid)['version'] == 6, \
+        "Expected a version for the create, join and each accepted action."
+    assert backend.get_game_version('missing') is None
+    assert backend.get_game_version(game_uuid, 'B') == 6
+    assert backend.get_game_version(game_uuid, 'C') is None and backend.get_game_version('missing', 'A') is None
+
+
+def test_win_frees_players(monkeypatch, backend):
+    """ Test that banking the winning score ends the game and frees its players.
+    """
+    game_uuid = backend.initiate_game('A')['game_uuid']
+
+    result = win(monkeypatch, backend, game_uuid, 'A')
+    assert result['result'] == 'won' and result['score'] == parkle_utils.WINNING_SCORE
+    assert backend.get_game_state(game_uuid)['winner'] == 'A'
+    assert backend.check_player_for_existing_game('A') is False
+    rolls(monkeypatch, backend, None)
+    assert backend.perform_game_action(game_uuid, 'A', []) == {"error": state_utils.GAME_ACTION_ERRORS['game_over']}
+    assert backend.initiate_game('B', game_uuid) == {"error": state_utils.INITIATE_GAME_ERRORS['game_over']}
+    assert backend.check_player_for_existing_game('B') is False
+
+
+def test_concurrent_joins(backend):
+    """ Test that concurrent joins each land exactly once.
+    """
+    game_uuid = backend.initiate_game('host')['game_uuid']
+    threads = [threading.Thread(target=backend.initiate_game, args=(str(i), game_uuid)) for i in range(0, 50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    game = backend.get_game_state(game_uuid)
+    assert len(game['players']) == 51 and len(set(game['players'])) == 51
+
+
+def test_sweep_expired_games(monkeypatch, backend):
+    """ Test that idle games are reclaimed in bounded batches, freeing their players,
+    and that acting on a game refreshes its deadline.
+    """
+    clock = [1000.0]
+    monkeypatch.setattr(backends.time, 'time', lambda: clock[0])
+    idle = [backend.initiate_game(str(i))['game_uuid'] for i in range(0, 5)]
+    active = backend.initiate_game('active')['game_uuid']
+
+    clock[0] += 30
+    rolls(monkeypatch, backend, [2, 2, 3, 3, 4, 1])
+    backend.perform_game_action(active, 'active', [])
+    assert backend.sweep_expired_games(now=1059) == 0
+
+    assert backend.sweep_expired_games(limit=3, now=1061) == 3
+    assert backend.sweep_expired_games(limit=3, now=1061) == 2
+    assert all(backend.get_game_state(game_uuid).get('error') for game_uuid in idle)
+    assert backend.check_player_for_existing_game('0') is False
+    assert backend.get_game_state(active)['players'] == ['active']
+
+    assert backend.sweep_expired_games(now=1091) == 1
+    assert backend.check_player_for_existing_game('active') is False
+
+
+def test_game_events(monkeypatch, backend):
+    """ Test that the event log replays to the game's state at every point, and can be
+    read incrementally and waited on.
+    """
+    game_uuid = backend.initiate_game('A')['game_uuid']
+    backend.initiate_game('B', game_uuid)
+
+    rolls(monkeypatch, backend, [1, 1, 1, 5, 2, 3], [5, 2, 3, 4, 6, 6], None, [2, 2, 3, 3, 4, 6])
+    for player, kept, action in [('A', [], 'roll'), ('A', [1, 1, 1, 5], 'roll'), ('A', [5], 'bank'),
+                                 ('B', [], 'roll')]:
+        backend.perform_game_action(game_uuid, player, kept, action)
+        events = backend.read_game_events(game_uuid)
+        assert state_utils.replay_game(game_uuid, events) == backend.get_game_state(game_uuid)
+
+    assert [event['event'] for event in events] == ['create', 'join', 'roll', 'keep', 'roll', 'keep', 'bank', 'farkle']
+    assert events[3] == {"id": events[3]['id'], "event": 'keep', "player": 'A', "kept": [1, 1, 1, 5], "points": 350,
+                         "running_points": 350}
+    if isinstance(backend, backends.MemoryBackend):
+        assert [event['id'] for event in events] == [f'{i}-0' for i in range(1, 9)]
+    assert backend.read_game_events(game_uuid, after=events[5]['id'], count=1) == events[6:7]
+    assert backend.read_game_events(game_uuid, after='$', block=1) == []
+
+    timer = threading.Timer(0.05, backend.initiate_game, ('C', game_uuid))
+    timer.start()
+    assert backend.read_game_events(game_uuid, after=events[-1]['id'], block=5000)[0]['player'] == 'C'
+    timer.join()
+
+
+def test_game_updates(monkeypatch, backend):
+    """ Test that listeners of a game are sent each event as it is logged, until they stop listening.
+    """
+    game_uuid = backend.initiate_game('A')['game_uuid']
+
+    async def listen():
+        queue = await backend.asubscribe_game(game_uuid)
+        other = await backend.asubscribe_game(game_uuid)
+        await asyncio.sleep(0.01)
+        backend.initiate_game('B', game_uuid)
+        updates = [await asyncio.wait_for(queue.get(), 5), await asyncio.wait_for(other.get(), 5)]
+        await backend.aunsubscribe_game(game_uuid, queue)
+        await backend.aunsubscribe_game(game_uuid, other)
+        return updates
+
+    updates = asyncio.run(listen())
+    assert updates[0] == updates[1] == backend.read_game_events(game_uuid)[1:]
+
+
+def test_leaderboards(monkeypatch, backend):
+    """ Test that wins are counted on every leaderboard, ranked as redis ranks them.
+    """
+    for player in ['A', 'B', 'B', 'C', 'C']:
+        game_uuid = backend.initiate_game(player)['game_uuid']
+        assert win(monkeypatch, backend, game_uuid, player)['result'] == 'won'
+
+    leaders = [{"rank": 1, "player": 'C', "wins": 2}, {"rank": 2, "player": 'B', "wins": 2},
+               {"rank": 3, "player": 'A', "wins": 1}]
+    assert backend.leaderboard_top() == leaders
+    assert backend.leaderboard_top('daily', 2) == backend.leaderboard_top('weekly', 2) == leaders[:2]
+    assert backend.leaderboard_rank('A') == leaders[2]
+    assert backend.leaderboard_around('B', count=1) == leaders
+    assert backend.leaderboard_around('A', count=1) == leaders[1:]
+    assert backend.leaderboard_rank('D') is None and backend.leaderboard_around('D') is None
+
+
+class FailingScript(object):
+    """ A script whose every call fails, as on a timeout or a lost connection. """
+
+    def __call__(self, conn, keys, args):
+        raise redis.exceptions.ConnectionError("Connection reset by peer")
+
+    async def acall(self, conn, keys, args):
+        raise redis.exceptions.ConnectionError("Connection reset by peer")
+
+
+def test_failed_initiate_frees_player(monkeypatch, backend):
+    """ Test that a player is not left claimed for a game whose script failed.
+    """
+    if isinstance(backend, backends.MemoryBackend):
+        pytest.skip("The memory backend runs no scripts.")
+    game_uuid = backend.initiate_game('A')['game_uuid']
+    with monkeypatch.context() as failing:
+        failing.setattr(state_utils, 'initiate_game_script', FailingScript())
+        failing.setattr(state_utils, 'compact_initiate_game_script', FailingScript())
+        with pytest.raises(redis.exceptions.ConnectionError):
+            backend.initiate_game('B')
+        with pytest.raises(redis.exceptions.ConnectionError):
+            backend.initiate_game('C', game_uuid)
+        with pytest.raises(redis.exceptions.ConnectionError):
+            asyncio.run(backend.ainitiate_game('D'))
+    for player in ('B', 'C', 'D'):
+        assert backend.check_player_for_existing_game(player) is False
+    assert backend.check_player_for_existing_game('A') == game_uuid
+    assert backend.initiate_game('B', game_uuid)['players'] == ['A', 'B']
+
+
+def test_game_states(backend):
+    """ Test reading many games at once, with errors for missing games inline.
+    """
+    game_uuids = [backend.initiate_game(player)['game_uuid'] for player in ('A', 'B', 'C')]
+    states = backend.get_game_states(game_uuids + ['missing'])
+    assert [states[game_uuid]['players'] for game_uuid in game_uuids] == [['A'], ['B'], ['C']]
+    assert states['missing'] == {"error": state_utils.GAME_STATE_ERRORS['no_game']}
+
+
+def test_batched_game_actions(monkeypatch, backend):
+    """ Test that a batch of actions is applied in order, with each action's result or error,
+    the first batch also loading the scripts it runs.
+    """
+    game_uuids = [backend.initiate_game(player)['game_uuid'] for player in ('A', 'B')]
+    backend.initiate_game('C', game_uuids[0])
+
+    rolls(monkeypatch, backend, [1, 1, 1, 5, 2, 3], None, [2, 2, 3, 3, 4, 6], [1, 2, 3, 4, 6, 6])
+    results = backend.perform_game_actions([(game_uuids[0], 'A', [], 'roll'), (game_uuids[0], 'C', [], 'roll'),
+                                            (game_uuids[0], 'A', [1, 1, 1, 5], 'roll'),
+                                            (game_uuids[1], 'B', [], 'roll')])
+    assert [result.get('dice_roll') for result in results] == [[1, 1, 1, 5, 2, 3], None, [2, 2],
+                                                               [1, 2, 3, 4, 6, 6]]
+    assert results[1] == {"error": state_utils.GAME_ACTION_ERRORS['not_current_player']}
+    assert backend.get_game_state(game_uuids[0])['current_player'] == 'C'
+
+    rolls(monkeypatch, backend, [5, 2, 3, 4, 6, 6], [2, 2, 3, 3, 4, 6])
+    results = backend.perform_game_actions([(game_uuids[0], 'C', [], 'roll'), (game_uuids[1], 'B', [1], 'roll')])
+    assert [result.get('result') for result in results] == ['rolled', 'farkle']
+    for game_uuid in game_uuids:
+        assert state_utils.replay_game(game_uuid, backend.read_game_events(game_uuid)) == \
+            backend.get_game_state(game_uuid)
+
+
+def test_asyncio_game(monkeypatch, backend):
+    """ Test that the asyncio operations play a game as the blocking ones do.
+    """
+    async def play():
+        game_uuid = (await backend.ainitiate_game('A'))['game_uuid']
+        await backend.ainitiate_game('B', game_uuid)
+        assert await backend.acheck_player_for_existing_game('B') == game_uuid
+        rolls(monkeypatch, backend, [1, 1, 1, 5, 2, 3], [5, 2, 3, 4, 6, 6], None, None)
+        await backend.aperform_game_action(game_uuid, 'A', [])
+        results = await backend.aperform_game_actions([(game_uuid, 'A', [1, 1, 1, 5], 'roll'),
+                                                       (game_uuid, 'A', [5], 'bank'), (game_uuid, 'A', [], 'roll')])
+        assert [result.get('result', result.get('error')) for result in results] == \
+            ['rolled', 'banked', state_utils.GAME_ACTION_ERRORS['not_current_player']]
+        assert await backend.acurrent_player_check(game_uuid, 'B')
+        state = await backend.aget_game_state(game_uuid)
+        assert state['scores'] == {'A': 400, 'B': 0} and state['version'] == await backend.aget_game_version(game_uuid)
+        assert (await backend.aget_game_states([game_uuid]))[game_uuid] == state
+        assert await backend.aget_game_version(game_uuid, 'A') == state['version']
+        assert await backend.aget_game_version(game_uuid, 'X') is None
+        assert state_utils.replay_game(game_uuid, await backend.aread_game_events(game_uuid)) == state
+
+        monkeypatch.setattr(parkle_utils, 'WINNING_SCORE', 300)
+        rolls(monkeypatch, backend, [1, 1, 1, 2, 3, 4], None)
+        await backend.aperform_game_action(game_uuid, 'B', [])
+        assert (await backend.aperform_game_action(game_uuid, 'B', [1, 1, 1], 'bank'))['result'] == 'won'
+        assert await backend.aleaderboard_top() == [{"rank": 1, "player": 'B', "wins": 1}]
+        assert await backend.aleaderboard_rank('B') == {"rank": 1, "player": 'B', "wins": 1}
+        assert await backend.aleaderboard_around('B') == [{"rank": 1, "player": 'B', "wins": 1}]
+        assert await backend.acheck_player_for_existing_game('A') is False
+
+        idle = (await backend.ainitiate_game('C'))['game_uuid']
+        assert await backend.asweep_expired_games(now=backends.time.time() + IDLE_TTL + 1) == 2, \
+            "Expected the game won and the idle game reclaimed."
+        assert (await backend.aget_game_state(idle)).get('error')
+        assert (await backend.aget_game_state(game_uuid)).get('error')
+        assert await backend.acheck_player_for_existing_game('C') is False
+
+    asyncio.run(play())
@@ -0,0 +1,78 @@
+
+# Test cases for the parkle bot strategies
+
+import pickle
+
+from parkle import bots
+from parkle import policy
+
+
+class AlwaysBank(bots.Strategy):
+    """ Minimal user strategy, keeps the fewest points and banks.
+    """
+
+    def decide(self, view):
+        return bots.Decision(view.options[-1], True)
+
+
+def test_game_view():
+    """ Test that a game view is immutable, and lists the roll's keep options.
+    """
+    view = bots.game_view([100, 250], 1, 50, [1, 5, 2])
+    assert view.scores == (100, 250) and view.dice_rolled == (1, 5, 2)
+    assert view.options[0].points == 150, "Expected keeping the 1 and the 5 to be the best option."
+    try:
+        view.turn_points = 0
+    except AttributeError:
+        pass
+    else:
+        assert False, "Expected the game view to be immutable."
+
+
+def test_bank_threshold():
+    """ Test the bank threshold strategy banks only past its threshold.
+    """
+    strategy = bots.BankThreshold(300, 3)
+    decision = strategy.decide(bots.game_view([0, 0], 0, 0, [1, 5, 2, 3, 4, 6]))
+    assert decision.keep.kept == (1, 2, 3, 4, 5, 6) and decision.bank, "Expected to keep the straight and bank."
+
+    decision = strategy.decide(bots.game_view([0, 0], 0, 0, [5, 2, 3, 4, 6, 6]))
+    assert decision.keep.kept == (5,) and not decision.bank, "Expected to keep the 5 and roll again."
+
+
+def test_decide_all_batches():
+    """ Test that decisions for many seats are batched per strategy and returned in order.
+    """
+    bold = bots.BankThreshold(1000, 1)
+    always = AlwaysBank()
+    views = [bots.game_view([0, 0], 0, 0, [1, 2, 2, 3, 4, 6]) for x in range(0, 4)]
+    decisions = bots.decide_all([(bold, views[0]), (always, views[1]), (bold, views[2]), (always, views[3])])
+    assert [decision.bank for decision in decisions] == [False, True, False, True]
+
+
+def test_optimal_policy_batch(tmp_path):
+    """ Test that the vectorized policy batch agrees with the policy table lookups.
+    """
+    path = str(tmp_path / "policy.bin")
+    policy.write_policy(path, *policy.solve_policy(1000), target=1000)
+    strategy = bots.OptimalPolicy(path)
+    table = policy.PolicyTable.load(path)
+
+    views = [
+        bots.game_view([0, 0], 0, 0, [1, 1, 5, 2, 3, 4]),
+        bots.game_view([0, 950], 0, 900, [1, 2, 3]),
+        bots.game_view([900, 0], 0, 0, [1, 5, 2, 3]),
+        bots.game_view([0, 0], 1, 850, [5, 2]),
+    ]
+    for view, decision in zip(views, strategy.decide_batch(views)):
+        own, opponent = view.scores[view.player], view.scores[1 - view.player]
+        assert decision.keep == table.choose_keep(own, opponent, view.turn_points, list(view.dice_rolled))
+        dice_left = len(decision.keep.remaining) or 6
+        turn_points = view.turn_points + decision.keep.points
+        assert decision.bank == (not table.should_roll(own, opponent, turn_points, dice_left))
+
+    alone = bots.game_view([300], 0, 0, [1, 1, 5, 2, 3, 4])
+    assert strategy.decide(alone) == strategy.decide(bots.game_view([300, 0], 0, 0, [1, 1, 5, 2, 3, 4]))
+
+    copied = pickle.loads(pickle.dumps(strategy))
+    assert copied.decide(views[0]) == strategy.decide(views[0])
@@ -0,0 +1,59 @@
+
+# Test cases for the parkle optimal policy solver
+
+import numpy
+
+from parkle import policy
+from parkle import utils as parkle_utils
+
+TARGET = 1000  # A short game keeps the solve fast
+SOLVED = {}
+
+
+def solved_policy():
+    """ Solve the short game once for all of the tests.
+    """
+    if not SOLVED:
+        SOLVED['values'], SOLVED['roll'] = policy.solve_policy(TARGET)
+    return SOLVED['values'], SOLVED['roll']
+
+
+def test_roll_classes_odds():
+    """ Test that the roll classes and farkle odds for each dice count sum to one.
+    """
+    choice_points, choice_dice, choice_counts, weights, farkle = policy.build_roll_classes()
+    assert numpy.allclose(weights.sum(axis=1) + farkle, 1.0), "Expected the odds of each dice count to sum to 1."
+    assert choice_counts[0] == len(choice_points), "Expected every class to offer a choice."
+
+
+def test_solve_policy_values():
+    """ Test some known properties of the solved values.
+    """
+    values, roll = solved_policy()
+    assert values.shape == (20, 20, 20, 6)
+    assert values.min() >= 0.0 and values.max() <= 1.0, "Expected win probabilities."
+    assert 0.5 < values[0, 0, 0, 5] < 1.0, "Expected an advantage to the first player."
+    assert roll[:, :, 0, 5].all(), "Expected to always roll at the start of a turn."
+
+
+def test_policy_table_round_trip(tmp_path):
+    """ Test that a written policy file memory maps back to the solved policy.
+    """
+    values, roll = solved_policy()
+    path = str(tmp_path / "policy.bin")
+    policy.write_policy(path, values, roll, target=TARGET)
+    table = policy.PolicyTable.load(path)
+
+    assert table.target == TARGET and table.unit == policy.SCORE_UNIT
+    assert abs(table.win_probability(0, 0) - values[0, 0, 0, 5]) <= 1.0 / policy.VALUE_SCALE
+    assert table.should_roll(100, 250, 300, 4) == roll[2, 5, 6, 3]
+    assert table.win_probability(900, 0, 100, 3) == 1.0, "Expected banking to the target to win."
+    assert not table.should_roll(900, 0, 100, 3), "Expected to bank the winning points."
+
+    # Far ahead with one die left, bank; far behind the opponent about to win, roll.
+    assert not table.should_roll(0, 0, 900, 1)
+    assert table.should_roll(0, 950, 900, 1)
+
+    assert table.choose_keep(0, 0, 0, [2, 3, 4, 6, 6, 2]) is None, "Expected no keep from a farkle."
+    keep = table.choose_keep(0, 0, 0, [1, 1, 1, 5, 2, 3])
+    assert keep in parkle_utils.keep_options([1, 1, 1, 5, 2, 3])
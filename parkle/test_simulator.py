@@ -0,0 +1,43 @@
+
+# Test cases for the parkle game simulator
+
+import numpy
+
+from parkle import bots
+from parkle import simulator
+from parkle import utils as parkle_utils
+
+
+def test_play_game():
+    """ Test that a played game ends with a single winner over the winning score.
+    """
+    dice = simulator.DiceStream(numpy.random.default_rng(7))
+    strategies = [bots.BankThreshold(300), bots.BankThreshold(1000)]
+    winner, scores, turns = simulator.play_game(strategies, dice)
+    assert scores[winner] >= parkle_utils.WINNING_SCORE, "Expected the winner to reach the winning score."
+    assert max(scores[:winner] + scores[winner + 1:]) < parkle_utils.WINNING_SCORE
+    assert turns > 0 and all(score % 50 == 0 for score in scores)
+
+
+def test_dice_stream():
+    """ Test that buffered dice are within range, across a buffer refill.
+    """
+    dice = simulator.DiceStream(numpy.random.default_rng(7))
+    for x in range(0, simulator.DICE_BUFFER_SIZE // 6 + 10):
+        roll = dice.roll(6)
+        assert len(roll) == 6 and min(roll) >= 1 and max(roll) <= 6
+
+
+def test_simulate_reproducible():
+    """ Test that the merged aggregates are reproducible from the seed,
+    no matter how the games are split between chunks and workers.
+    """
+    strategies = [bots.BankThreshold(300), bots.BankThreshold(500), bots.BankThreshold(800)]
+    first = simulator.simulate(strategies, 60, workers=2, seed=11, chunk_size=20)
+    second = simulator.simulate(strategies, 60, workers=1, seed=11, chunk_size=20)
+
+    assert first.games == 60 and sum(first.wins) + first.draws == 60
+    assert first.wins == second.wins and first.turns == second.turns
+    assert first.scores == second.scores
+    assert abs(sum(first.win_rates) - 1.0) < 1e-9
+    assert sum(first.turns.values()) == 60 and first.mean_turns > 0
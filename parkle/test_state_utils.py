@@ -0,0 +1,78 @@
+
+# Test cases for the parkle redis state utils
+
+from parkle import state_utils
+
+
+def test_pack_player_key():
+    """ Test that uuid hex player keys pack to their 16 bytes, and other keys as text.
+    """
+    player_key = '49bfd363184247989bf6500b8d7ce648'
+    packed = state_utils.pack_player_key(player_key)
+    assert len(packed) == 17 and packed[0] == 0x90
+    assert state_utils.unpack_player_key(packed) == (player_key, 17)
+
+    for player_key in ('bob', '49BFD363184247989BF6500B8D7CE648', 'x' * 32, ''):
+        packed = state_utils.pack_player_key(player_key)
+        assert packed[0] == len(player_key), "Expected {0} packed as text.".format(player_key)
+        assert state_utils.unpack_player_key(b'..' + packed, 2) == (player_key, len(packed) + 2)
+
+
+def test_game_record_round_trip():
+    """ Test that a game state packs to a compact record and back.
+    """
+    game = {
+        "game_uuid": 'ce1167b660e94ed5a7c085aea3cf1be4',
+        "start_time": '2020-12-24T18:30:00',
+        "players": ['49bfd363184247989bf6500b8d7ce648', 'bob', 'carol'],
+        "current_player": 'bob',
+        "dice_roll": [1, 5, 2, 6, 6],
+        "running_points": 350,
+        "scores": {'49bfd363184247989bf6500b8d7ce648': 10200, 'bob': 0, 'carol': 950},
+        "winner": None,
+        "version": 7,
+    }
+    record = state_utils.pack_game_record(game)
+    assert len(record) == state_utils.GAME_RECORD_HEADER.size + 17 + 4 + 4 + 4 + 6 + 4
+    assert state_utils.unpack_game_record(game["game_uuid"], record) == game
+    assert record[state_utils.GAME_RECORD_VERSION] == (7).to_bytes(4, 'big')
+
+    game.update(current_player='49bfd363184247989bf6500b8d7ce648', dice_roll=[], running_points=0,
+                winner='49bfd363184247989bf6500b8d7ce648', version=0)
+    assert state_utils.unpack_game_record(game["game_uuid"], state_utils.pack_game_record(game)) == game
+
+
+def test_shard_key_layout():
+    """ Test that every key of a game has its shard's hash tag, so one script can use them
+    on a cluster, and that player keys spread over the player table shards.
+    """
+    game_uuid = 'ce1167b660e94ed5a7c085aea3cf1be4'
+    assert state_utils.game_key(game_uuid, 'state') == '{ce}ce1167b660e94ed5a7c085aea3cf1be4_state'
+    assert state_utils.deadlines_key(state_utils.game_tag(game_uuid)) == '{ce}game_deadlines'
+    assert state_utils.game_tag(game_uuid) in state_utils.SHARD_TAGS
+
+    tags = {state_utils.player_tag(str(i)) for i in range(0, 5000)}
+    assert tags == set(state_utils.SHARD_TAGS)
+    assert state_utils.player_table_key('0a') == '{0a}player_table'
+
+
+def test_jump_hash():
+    """ Test the jump consistent hash, where adding a node only moves shards to it.
+    """
+    assert state_utils.jump_hash(256, 1024) == 520
+    for nodes in range(1, 8):
+        for key in range(0, 1000):
+            before, after = state_utils.jump_hash(key, nodes), state_utils.jump_hash(key, nodes + 1)
+            assert after in (before, nodes)
+
+
+def test_leaderboard_key():
+    """ Test that the windowed leaderboards are keyed by their UTC day and ISO week.
+    """
+    now = 1792281600 + 23 * 60 * 60  # 2026-10-18 23:00 UTC, a Sunday
+    assert state_utils.leaderboard_key('alltime', now) == '{leaderboard}alltime'
+    assert state_utils.leaderboard_key('daily', now) == '{leaderboard}daily:2026-10-18'
+    assert state_utils.leaderboard_key('weekly', now) == '{leaderboard}weekly:2026-W42'
+    assert state_utils.leaderboard_key('weekly', now + 60 * 60) == '{leaderboard}weekly:2026-W43'
+    keys, expire_at = state_utils._record_win_args(now)
+    assert expire_at == [now + 25 * 60 * 60, now + 7 * 24 * 60 * 60 + 60 * 60]
@@ -1,6 +1,7 @@
 
 # Test cases for the parkle utils
 
+from itertools import product
 from random import randint
 
 from parkle import utils as parkle_utils
@@ -382,3 +383,214 @@ def test_scoring_ones_and_fives():
     kept_set = [5]
     points = parkle_utils.calculate_point_set(kept_set)
     assert points == 50, "Expected to be awarded 50 points."
+
+
+def test_scoring_table_size():
+    """ Test that every distinct multiset of 1-6 dice is in the scoring table.
+    """
+    assert len(parkle_utils.SCORING_TABLE) == 923, "Expected 923 distinct multisets of 1-6 dice."
+
+
+def test_scoring_table_matches_reference():
+    """ Test that the table lookup agrees with the recursive reference scorer
+    for every ordered roll of 1-6 dice, including the non scoring sets.
+    """
+    for n in range(1, 7):
+        for kept_set in product(range(1, 7), repeat=n):
+            kept_set = list(kept_set)
+            try:
+                expected = parkle_utils.calculate_point_set_recursive(kept_set)
+            except AssertionError:
+                expected = None
+            valid, points = parkle_utils.validate_kept_set(kept_set)
+            if expected is None:
+                assert not valid, "Expected {0} to not be a scoring set.".format(kept_set)
+            else:
+                assert valid, "Expected {0} to be a scoring set.".format(kept_set)
+                assert points == expected, "Expected {0} to score {1}.".format(kept_set, expected)
+                assert parkle_utils.calculate_point_set(kept_set) == expected
+
+
+def test_validate_kept_set_out_of_range():
+    """ Test that kept sets with dice out of range, or of the wrong length, are not valid.
+    """
+    assert parkle_utils.validate_kept_set([1, 7]) == (False, 0)
+    assert parkle_utils.validate_kept_set([0, 5]) == (False, 0)
+    assert parkle_utils.validate_kept_set([]) == (False, 0)
+    assert parkle_utils.validate_kept_set([1, 1, 1, 1, 1, 1, 1]) == (False, 0)
+    assert parkle_utils.validate_kept_set(1) == (True, 100)
+    assert parkle_utils.validate_kept_set(map(int, "1,5".split(','))) == (True, 150)
+
+
+def test_keep_options():
+    """ Test the keep options enumerated for some known rolls.
+    """
+    options = parkle_utils.keep_options([2, 3, 4, 6, 6, 2])
+    assert options == (), "Expected a farkle roll to have no keep options."
+
+    options = parkle_utils.keep_options([5, 1, 2])
+    expected = (
+        ((1, 5), 150, (2,)),
+        ((1,), 100, (2, 5)),
+        ((5,), 50, (1, 2)),
+    )
+    assert options == expected, "Expected three keep options for [5, 1, 2]."
+    assert options[0].kept == (1, 5) and options[0].points == 150 and options[0].remaining == (2,)
+
+    options = parkle_utils.keep_options([1, 1, 1, 1, 1, 1])
+    assert [option.points for option in options] == [3000, 2000, 1000, 300, 200, 100]
+
+
+def test_keep_options_brute_force():
+    """ Test that keep options match brute forcing validate_kept_set over every
+    subset of a number of rolls, without any duplicated kept multiset.
+    """
+    for x in range(0, 25):
+        dice = [randint(1, 6) for y in range(0, randint(1, 6))]
+        expected = {}
+        for mask in range(1, 2 ** len(dice)):
+            kept = tuple(sorted(die for i, die in enumerate(dice) if mask & (1 << i)))
+            valid, points = parkle_utils.validate_kept_set(list(kept))
+            if valid:
+                expected[kept] = points
+
+        options = parkle_utils.keep_options(dice)
+        assert len(options) == len(expected), "Expected no duplicate kept sets."
+        for option in options:
+            assert expected[option.kept] == option.points
+            assert sorted(option.kept + option.remaining) == sorted(dice)
+
+
+def test_score_batch_matches_scorer():
+    """ Test that batch scoring agrees with calculate_point_set for the
+    known kept sets from the scoring tests, as padded dice and as face counts.
+    """
+    kept_sets = [
+        [1, 1, 1, 1, 1, 1], [2, 2, 2, 6, 6, 6], [1, 2, 3, 4, 5, 6], [1, 1, 3, 3, 5, 5],
+        [2, 2, 2, 2, 6, 6], [1, 1, 1, 1, 5, 5], [5, 5, 5, 5, 5], [3, 3, 3, 3, 3, 5],
+        [3, 3, 3, 3, 3, 1], [4, 4, 4, 4], [4, 4, 4, 4, 1], [4, 4, 4, 4, 1, 5],
+        [4, 4, 4, 4, 2], [1, 1, 1], [4, 4, 4], [4, 4, 4, 1], [4, 4, 4, 1, 5],
+        [4, 4, 4, 2, 2], [1, 5, 1, 5], [5, 1, 5], [1, 5], [1], [5],
+    ]
+    padded = [kept_set + [0] * (6 - len(kept_set)) for kept_set in kept_sets]
+    counts = [[kept_set.count(face_value) for face_value in range(1, 7)] for kept_set in kept_sets]
+
+    for points, valid in [parkle_utils.score_batch(padded, padded_dice=True),
+                          parkle_utils.score_batch(counts)]:
+        for i, kept_set in enumerate(kept_sets):
+            expected_valid, expected_points = parkle_utils.validate_kept_set(kept_set)
+            assert bool(valid[i]) == expected_valid, "Validity mismatch for {0}.".format(kept_set)
+            assert int(points[i]) == expected_points, "Points mismatch for {0}.".format(kept_set)
+
+
+def test_score_batch_invalid_rows():
+    """ Test that empty, oversized and out of range rows are not valid.
+    """
+    points, valid = parkle_utils.score_batch([[0, 0, 0, 0, 0, 0], [7, 0, 0, 0, 0, 0],
+                                              [4, 0, 0, 0, 3, 0], [-1, 0, 0, 0, 1, 0]])
+    assert not valid.any(), "Expected no row to be a valid scoring set."
+    assert not points.any(), "Expected no points for invalid rows."
+
+    points, valid = parkle_utils.score_batch([[1, 7, 0, 0, 0, 0], [1, 5, 0, 0, 0, 0]], padded_dice=True)
+    assert valid.tolist() == [False, True]
+    assert points.tolist() == [0, 150]
+
+
+def test_dice_roll_batch():
+    """ Test that bulk rolls have the requested shape and are within [1, 6].
+    """
+    rolls = parkle_utils.dice_roll_batch(1000, 6)
+    assert rolls.shape == (1000, 6), "Expected 1000 rolls of 6 dice."
+    assert rolls.min() >= 1 and rolls.max() <= 6, "Expected dice to be within range D6."
+
+    try:
+        parkle_utils.dice_roll_batch(10, 7)
+    except AssertionError:
+        pass
+    else:
+        assert False, "Expected rolling 7 dice to be out of range."
+
+
+def test_spawn_generators():
+    """ Test that spawned streams are reproducible from the master seed,
+    and that sibling streams are independent of each other.
+    """
+    first = [parkle_utils.dice_roll_batch(100, 6, g) for g in parkle_utils.spawn_generators(42, 3)]
+    second = [parkle_utils.dice_roll_batch(100, 6, g) for g in parkle_utils.spawn_generators(42, 3)]
+    for a, b in zip(first, second):
+        assert (a == b).all(), "Expected the same seed to reproduce the same rolls."
+    assert not (first[0] == first[1]).all(), "Expected sibling streams to differ."
+
+
+def test_packed_dice_codec():
+    """ Test that packed dice round trip through each of the existing dice forms.
+    """
+    dice = [5, 1, 5]
+    packed = parkle_utils.pack_dice(dice)
+    assert packed == 0b000_010_000_000_000_001, "Expected a 1 and two 5s packed 3 bits per face."
+    assert parkle_utils.dice_counts(packed) == (1, 0, 0, 0, 2, 0)
+    assert parkle_utils.unpack_dice(packed) == [1, 5, 5]
+    assert parkle_utils.unpack_nested_dice(packed) == parkle_utils.nested_dice(dice)
+    assert parkle_utils.pack_nested_dice(parkle_utils.nested_dice(dice)) == packed
+    assert parkle_utils.unpack_kept_set(packed) == parkle_utils.nested_kept_set(dice)
+    assert parkle_utils.pack_kept_set(parkle_utils.nested_kept_set(dice)) == packed
+    assert parkle_utils.unpack_dice_string(packed) == "1,5,5"
+    assert parkle_utils.pack_dice_string("5,1,5") == packed
+    assert parkle_utils.pack_dice([]) == 0 and parkle_utils.pack_dice_string("") == 0
+
+    for x in range(0, 10):
+        dice = [randint(1, 6) for y in range(0, randint(0, 6))]
+        assert parkle_utils.unpack_dice(parkle_utils.pack_dice(dice)) == sorted(dice)
+
+    try:
+        parkle_utils.pack_dice([1, 7])
+    except AssertionError:
+        pass
+    else:
+        assert False, "Expected dice out of range to not pack."
+
+
+def test_packed_dice_scoring():
+    """ Test that scoring and validation functions accept packed dice directly,
+    and that a packed set is not mistaken for a single die.
+    """
+    packed = parkle_utils.pack_dice([1, 5, 5])
+    assert parkle_utils.calculate_point_set(packed) == 200
+    assert parkle_utils.validate_kept_set(packed) == (True, 200)
+    assert parkle_utils.keep_options(packed) == parkle_utils.keep_options([5, 1, 5])
+    assert parkle_utils.points_possible(packed)
+
+    farkle = parkle_utils.pack_dice([2, 3, 4, 6])
+    assert parkle_utils.validate_kept_set(farkle) == (False, 0)
+    assert not parkle_utils.points_possible(farkle)
+
+    one_five = parkle_utils.pack_dice([5])  # 4096 as a plain int
+    assert parkle_utils.calculate_point_set(one_five) == 50
+    assert parkle_utils.validate_kept_set(parkle_utils.PackedDice(1)) == (True, 100)
+    assert parkle_utils.validate_kept_set(parkle_utils.PackedDice(2)) == (True, 200)
+    assert parkle_utils.validate_kept_set(2) == (False, 0)
+
+
+def test_roll_odds_single_die():
+    """ Test the exact odds of rolling a single die.
+    """
+    odds = parkle_utils.roll_odds(1)
+    assert odds.farkle == 4 / 6, "Expected 2, 3, 4 or 6 to farkle."
+    assert odds.hot_dice == 2 / 6, "Expected a 1 or a 5 to be hot dice."
+    assert dict(odds.best_score) == {0: 4 / 6, 50: 1 / 6, 100: 1 / 6}
+    assert odds.expected_best_score == 25
+
+
+def test_roll_odds_match_enumeration():
+    """ Test that the roll odds tables match brute force over every ordered roll.
+    """
+    assert abs(parkle_utils.farkle_probability(6) - 0.0231481) < 1e-6
+    for n in range(1, 5):
+        farkle = hot_dice = 0
+        for dice in product(range(1, 7), repeat=n):
+            options = parkle_utils.keep_options(list(dice))
+            farkle += not options
+            hot_dice += any(len(option.kept) == n for option in options)
+        assert parkle_utils.farkle_probability(n) == farkle / 6 ** n
+        assert parkle_utils.hot_dice_probability(n) == hot_dice / 6 ** n
+        assert abs(sum(parkle_utils.roll_odds(n).best_score.values()) - 1) < 1e-9
@@ -1,8 +1,19 @@
 
 from pprint import pprint
+import collections
+import functools
+import itertools
+import math
 import random
+import threading
+import types
+
+import numpy
+
 rand = random.Random()
 
+WINNING_SCORE = 10000  # First player to bank this many points wins the game
+
 
 def nested_dice(flattened_dice):
     """ Nest the long list of dice into a "zipped" list of tuples,
@@ -64,10 +75,13 @@ def dice_roll(n):
 def points_possible(dice):
     """ Determines if there is a scoring option within the supplied dice list.
 
-    :param dice: :py:class:`list` A nested dice list like the one from nested_dice
+    :param dice: :py:class:`list` A nested dice list like the one from nested_dice,
+            or :py:class:`PackedDice`
     :return:
         `boolean` : Returns truth value if points are possible from dice list.
     """
+    if type(dice) is PackedDice:
+        return bool(_keep_options(dice))
     num_pairs = 0
     for i in dice:
         if i[0] == 1 or i[0] == 5:
@@ -99,16 +113,14 @@ def nested_kept_set(kept_set):
 
 def validate_kept_set(dice):
     """ Ensure that all dice kept are scoring dice, otherwise return error.
+    Range checking and scoring are both resolved by the `SCORING_TABLE` lookup,
+    which only holds valid sets of 1-6 dice.
     :return: (`boolean`, `int`) : (True or asserts that dice must be in range D6, score).
     """
-    points = 0
-    try:
-        validate_dice_in_range(dice)
-        points = calculate_point_set(dice)
-    except AssertionError as ae:
-        return False, points
-    else:
-        return True, points
+    points = SCORING_TABLE.get(dice_signature(dice))
+    if points is None:
+        return False, 0
+    return True, points
 
 
 def validate_dice_in_range(dice_set):
@@ -232,10 +244,13 @@ def is_four_of_kind_and_pair(unique_dice_count, dice_counts):
     return False
 
 
-def calculate_point_set(kept_set):
-    """  Utility for calculating a sets point value.
+def calculate_point_set_recursive(kept_set):
+    """  Reference implementation for calculating a sets point value.
     Any kept set should be validated prior to calling this function.
 
+    This reads like the rules of the game, and is used once at import to build
+    the `SCORING_TABLE`; hot paths should call `calculate_point_set` instead.
+
     :param kept_set: :py:class:`list` A flat list of the dice set the
             Calculate number of points from a player's kept set.
 
@@ -272,32 +287,32 @@ def calculate_point_set(kept_set):
             if has_five_of_a_kind(dice_counts):
                 for face_value, count in nested_set.items():
                     if count == 5:
-                        score += calculate_point_set([face_value for n in range(0, 5)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 5)])
                     else:  # Only one remaining die
-                        score += calculate_point_set(face_value)
+                        score += calculate_point_set_recursive(face_value)
                 return score  # Accumulated recursively
             elif has_four_of_a_kind(dice_counts):
                 alt_kept_set = []
                 for face_value, count in nested_set.items():
                     if count == 4:
-                        score += calculate_point_set([face_value for n in range(0, 4)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 4)])
                     else:
                         for n in range(0, count):
                             alt_kept_set.append(face_value)
-                score += calculate_point_set(alt_kept_set)
+                score += calculate_point_set_recursive(alt_kept_set)
                 return score  # Accumulated recursively
             elif has_three_of_a_kind(dice_counts):
                 alt_kept_set = []
                 for face_value, count in nested_set.items():
                     if count == 3:
-                        score += calculate_point_set([face_value for n in range(0, 3)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 3)])
                     else:
                         for n in range(0, count):
                             alt_kept_set.append(face_value)
-                score += calculate_point_set(alt_kept_set)
+                score += calculate_point_set_recursive(alt_kept_set)
                 return score  # Accumulated recursively
             else:  # recursively figure out which dice don't score (3 x 3)
-                return calculate_point_set(kept_set[:3]) + calculate_point_set(kept_set[3:])
+                return calculate_point_set_recursive(kept_set[:3]) + calculate_point_set_recursive(kept_set[3:])
 
     # A kept set of 5 may signify:
     #  * Five of a kind (2000 pts)
@@ -309,23 +324,23 @@ def calculate_point_set(kept_set):
                 score = 0  # result accumulator
                 for face_value, count in nested_set.items():
                     if count == 4:
-                        score += calculate_point_set([face_value for n in range(0, 4)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 4)])
                     else:  # Only one remaining die
-                        score += calculate_point_set(face_value)
+                        score += calculate_point_set_recursive(face_value)
                 return score  # Accumulated recursively
             elif has_three_of_a_kind(dice_counts):
                 score = 0
                 alt_kept_set = []
                 for face_value, count in nested_set.items():
                     if count == 3:
-                        score += calculate_point_set([face_value for n in range(0, 3)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 3)])
                     else:
                         for n in range(0, count):
                             alt_kept_set.append(face_value)
-                score += calculate_point_set(alt_kept_set)
+                score += calculate_point_set_recursive(alt_kept_set)
                 return score  # Accumulated recursively
             else:  # recursively figure out which dice don't score (3 x 2)
-                return calculate_point_set(kept_set[:3]) + calculate_point_set(kept_set[3:])
+                return calculate_point_set_recursive(kept_set[:3]) + calculate_point_set_recursive(kept_set[3:])
 
     # A kept set of 4 may signify:
     #  * Four of a kind (1000 pts)
@@ -337,12 +352,12 @@ def calculate_point_set(kept_set):
                 score = 0  # Accumulate the result
                 for face_value, count in nested_set.items():
                     if count == 3:
-                        score += calculate_point_set([face_value for n in range(0, 3)])
+                        score += calculate_point_set_recursive([face_value for n in range(0, 3)])
                     else:
-                        score += calculate_point_set([face_value])
+                        score += calculate_point_set_recursive([face_value])
                 return score  # Accumulated recursively
             else:  # A set of [1, 1, 5, 5] perhaps
-                return calculate_point_set(kept_set[0:2]) + calculate_point_set(kept_set[2:4])
+                return calculate_point_set_recursive(kept_set[0:2]) + calculate_point_set_recursive(kept_set[2:4])
 
     # A kept set of 3 may signify:
     #  * 3 of a kind (face_value * 100)
@@ -355,14 +370,14 @@ def calculate_point_set(kept_set):
             else:
                 return points
         else:  # Recursively Check for [1, 1, 5] or [5, 5, 1]
-            return (calculate_point_set(kept_set[0]) +
-                    calculate_point_set(kept_set[1]) +
-                    calculate_point_set(kept_set[2]))
+            return (calculate_point_set_recursive(kept_set[0]) +
+                    calculate_point_set_recursive(kept_set[1]) +
+                    calculate_point_set_recursive(kept_set[2]))
 
     # A kept set of 2 may signify:
     #  * [1, 1]; [1, 5]; [5, 5] are scoring pairs
     elif kept_set_length == 2:  # Handle this case recursively
-        return calculate_point_set(kept_set[0]) + calculate_point_set(kept_set[1])
+        return calculate_point_set_recursive(kept_set[0]) + calculate_point_set_recursive(kept_set[1])
 
     # A Kept set of 1 may signify either a 1 or a 5
     #  * 1 (100 pts)
@@ -375,3 +390,356 @@ def calculate_point_set(kept_set):
             return 50
 
     assert False, u"Dice set contained non scoring values {0}!".format(kept_set)
+
+
+class PackedDice(int):
+    """ Canonical packed representation of a multiset of dice:  six 3-bit face
+    counts in a single int (18 bits), with face value 1 in the lowest bits.
+
+    Being an int it is hashable, cheap to store and compare, and is accepted
+    directly by the scoring and validation functions.  The subclass only exists
+    so that a packed set can be told apart from a single die passed as an int.
+        PackedDice(0b000_010_000_000_000_001) represents [1, 5, 5]
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return "PackedDice({0})".format(unpack_dice(self))
+
+
+FACE_SHIFTS = (0, 3, 6, 9, 12, 15)
+
+
+def dice_signature(dice):
+    """ Build the packed face-count signature used to key the `SCORING_TABLE`.
+
+    :param dice: :py:class:`list` flat list of dice, a single die as an `int`,
+            or a :py:class:`PackedDice`.
+    :return:
+        `int` : face counts packed 3 bits per face, or None when the dice contain
+        a value outside of the range D6, or more than 6 dice.
+    """
+    if type(dice) is PackedDice:
+        return int(dice)
+    if type(dice) is int:
+        dice = [dice]
+    elif not isinstance(dice, (list, tuple)):
+        dice = list(dice)
+    if len(dice) > 6:  # Counts above 7 would spill into the next face's bits
+        return None
+    c1, c2, c3 = dice.count(1), dice.count(2), dice.count(3)
+    c4, c5, c6 = dice.count(4), dice.count(5), dice.count(6)
+    if c1 + c2 + c3 + c4 + c5 + c6 != len(dice):  # Some die was not a face value of a D6
+        return None
+    return c1 | c2 << 3 | c3 << 6 | c4 << 9 | c5 << 12 | c6 << 15
+
+
+def dice_counts(packed):
+    """ Unpack the count of each face value from packed dice.
+
+    :param packed: :py:class:`PackedDice` or `int`
+    :return:
+        `tuple` : count of each face value 1-6, such as (1, 0, 0, 0, 2, 0)
+    """
+    return tuple((packed >> shift) & 7 for shift in FACE_SHIFTS)
+
+
+def pack_dice(dice):
+    """ Pack a flat list of dice (as from `dice_roll`).
+
+    :param dice: :py:class:`list` flat list of 0-6 dice
+    :return: :py:class:`PackedDice`
+    """
+    signature = dice_signature(dice)
+    assert signature is not None, u"Dice {0} must be no more than 6 dice in range D6!".format(dice)
+    return PackedDice(signature)
+
+
+def unpack_dice(packed):
+    """ Unpack to a flat, sorted list of dice.
+
+    :param packed: :py:class:`PackedDice` or `int`
+    :return: :py:class:`list` : flat list of dice
+    """
+    dice = []
+    for face_value, shift in enumerate(FACE_SHIFTS, 1):
+        dice.extend([face_value] * ((packed >> shift) & 7))
+    return dice
+
+
+def pack_nested_dice(nested):
+    """ Pack a nested dice list (as from `nested_dice`).
+
+    :param nested: :py:class:`list` list of tuples, such as [(dice face, count), ...]
+    :return: :py:class:`PackedDice`
+    """
+    return pack_dice(flatten_nested_dice(nested))
+
+
+def unpack_nested_dice(packed):
+    """ Unpack to a nested dice list, equal to `nested_dice` of the same dice.
+
+    :param packed: :py:class:`PackedDice` or `int`
+    :return: :py:class:`list` list of tuples, such as [(dice face, count), ...]
+    """
+    nested = []
+    for face_value, shift in enumerate(FACE_SHIFTS, 1):
+        count = (packed >> shift) & 7
+        if count > 0:
+            nested.append((face_value, count))
+    return nested
+
+
+def pack_kept_set(nested_set):
+    """ Pack a kept set dictionary (as from `nested_kept_set`).
+
+    :param nested_set: :py:class:`dict` dice face -> count
+    :return: :py:class:`PackedDice`
+    """
+    return pack_dice([face_value for face_value, count in nested_set.items() for n in range(0, count)])
+
+
+def unpack_kept_set(packed):
+    """ Unpack to a kept set dictionary, equal to `nested_kept_set` of the same dice.
+
+    :param packed: :py:class:`PackedDice` or `int`
+    :return: :py:class:`dict` dice face -> count
+    """
+    return dict(unpack_nested_dice(packed))
+
+
+def pack_dice_string(dice_string):
+    """ Pack a comma separated string of dice, such as "1,5,5".
+
+    :param dice_string: `string`
+    :return: :py:class:`PackedDice`
+    """
+    if not dice_string.strip():
+        return PackedDice(0)
+    return pack_dice([int(die) for die in dice_string.split(',')])
+
+
+def unpack_dice_string(packed):
+    """ Unpack to a comma separated string of sorted dice, such as "1,5,5".
+
+    :param packed: :py:class:`PackedDice` or `int`
+    :return: `string`
+    """
+    return ','.join(str(die) for die in unpack_dice(packed))
+
+
+def build_scoring_table():
+    """ Score every distinct multiset of 1-6 dice with the recursive reference
+    implementation.  There are only 923 such multisets.
+
+    :return:
+        :py:class:`dict` : dice signature -> point value, or None when the
+        multiset is not a scoring set.
+    """
+    table = {}
+    for n in range(1, 7):
+        for kept_set in itertools.combinations_with_replacement(range(1, 7), n):
+            try:
+                points = calculate_point_set_recursive(list(kept_set))
+            except AssertionError:
+                points = None  # Not a scoring set
+            table[dice_signature(kept_set)] = points
+    return table
+
+
+SCORING_TABLE = build_scoring_table()
+
+
+def calculate_point_set(kept_set):
+    """  Utility for calculating a sets point value, as a single table lookup.
+    Any kept set should be validated prior to calling this function.
+
+    :param kept_set: :py:class:`list` A flat list of the dice set the
+            Calculate number of points from a player's kept set,
+            or :py:class:`PackedDice`.
+
+    :return:
+        `int` : a point value for the set
+    """
+    points = SCORING_TABLE.get(dice_signature(kept_set))
+    assert points is not None, u"Dice set contained non scoring values {0}!".format(kept_set)
+    return points
+
+
+KeepOption = collections.namedtuple('KeepOption', ['kept', 'points', 'remaining'])
+
+
+def keep_options(dice):
+    """ Enumerate every legal scoring subset of a roll.
+
+    :param dice: :py:class:`list` flat list of the dice rolled, or :py:class:`PackedDice`
+    :return:
+        `tuple` : of KeepOption(kept, points, remaining), where kept and remaining
+        are sorted tuples of dice.  Options are ordered by most points first,
+        and each distinct kept multiset appears only once.
+    """
+    signature = dice_signature(dice)
+    assert signature is not None, u"Dice roll contained values outside of D6 {0}!".format(dice)
+    return _keep_options(signature)
+
+
+@functools.lru_cache(maxsize=None)
+def _keep_options(signature):
+    """ Memoized enumeration behind `keep_options`, keyed by roll signature.
+    There are only 923 distinct rolls, so each is computed once per process.
+    """
+    options = []
+    counts = dice_counts(signature)
+    for kept_counts in itertools.product(*[range(0, count + 1) for count in counts]):
+        kept_signature = sum(count << shift for count, shift in zip(kept_counts, FACE_SHIFTS))
+        points = SCORING_TABLE.get(kept_signature)
+        if points is None:  # Empty or not a scoring set
+            continue
+        kept = tuple(unpack_dice(kept_signature))
+        remaining = tuple(unpack_dice(signature - kept_signature))
+        options.append(KeepOption(kept, points, remaining))
+    options.sort(key=lambda option: (-option.points, option.kept))
+    return tuple(options)
+
+
+def _build_batch_scoring_table():
+    """ Flatten the `SCORING_TABLE` into a dense array indexed by face counts
+    packed 3 bits per face, for vectorized lookups in `score_batch`.
+
+    :return: (`numpy.ndarray`, `numpy.ndarray`) : (int points, boolean validity)
+    """
+    points = numpy.zeros(1 << 18, dtype=numpy.int32)
+    valid = numpy.zeros(1 << 18, dtype=bool)
+    for signature, score in SCORING_TABLE.items():
+        if score is not None:
+            points[signature] = score
+            valid[signature] = True
+    return points, valid
+
+
+BATCH_POINTS, BATCH_VALID = _build_batch_scoring_table()
+_BATCH_SHIFTS = numpy.array(FACE_SHIFTS, dtype=numpy.int64)
+
+
+def score_batch(counts, padded_dice=False):
+    """ Vectorized scoring of many kept sets at once.
+
+    :param counts: (N, 6) array of face counts, column i counting face value i + 1.
+    :param padded_dice: when True, counts is instead an (N, 6) array of dice,
+            with 0 padding any unused slots.
+    :return: (`numpy.ndarray`, `numpy.ndarray`) : (int points, boolean validity)
+        Points are 0 where the kept set is not a valid scoring set.
+    """
+    array = numpy.asarray(counts, dtype=numpy.int64)
+    assert array.ndim == 2 and array.shape[1] == 6, "Expected an (N, 6) array, got {0}.".format(array.shape)
+    in_range = ((array >= 0) & (array <= 6)).all(axis=1)
+    if padded_dice:  # Each die adds one to its face's count, padding 0s add nothing
+        index = numpy.where(array > 0, 1 << (3 * (numpy.clip(array, 1, 6) - 1)), 0).sum(axis=1)
+    else:
+        index = (numpy.clip(array, 0, 7) << _BATCH_SHIFTS).sum(axis=1)
+    valid = BATCH_VALID[index] & in_range
+    points = numpy.where(valid, BATCH_POINTS[index], 0)
+    return points, valid
+
+
+_thread_local = threading.local()
+
+
+def default_generator():
+    """ The NumPy random `Generator` for the calling thread, so that threads
+    in an API worker never share RNG state.
+
+    :return: :py:class:`numpy.random.Generator`
+    """
+    generator = getattr(_thread_local, 'generator', None)
+    if generator is None:
+        generator = _thread_local.generator = numpy.random.default_rng()
+    return generator
+
+
+def spawn_generators(seed, count):
+    """ Create independent random streams from one master seed, one per game
+    or per worker.  Streams are reproducible for a given seed and count, and
+    statistically independent of each other.
+
+    :param seed: `int` master seed (or a :py:class:`numpy.random.SeedSequence`)
+    :param count: `int` number of streams to create
+    :return: :py:class:`list` of :py:class:`numpy.random.Generator`
+    """
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+    return [numpy.random.default_rng(child) for child in seed.spawn(count)]
+
+
+def dice_roll_batch(size, n, generator=None):
+    """ Perform size rolls of n 6-sided dice in bulk.
+
+    :param size: `int` number of rolls
+    :param n: `int` number of dice in each roll
+    :param generator: (optional) :py:class:`numpy.random.Generator` to draw from,
+            defaults to the calling thread's generator.
+    :return:
+        :py:class:`numpy.ndarray` : (size, n) array of dice face values
+    """
+    assert 1 <= n <= 6, "rolling {0} Dice is not within allowed range: [1,6].".format(n)
+    if generator is None:
+        generator = default_generator()
+    return generator.integers(1, 7, size=(size, n), dtype=numpy.int8)
+
+
+RollOdds = collections.namedtuple('RollOdds', ['farkle', 'hot_dice', 'best_score', 'expected_best_score'])
+
+
+def roll_odds(n):
+    """ Exact odds for a roll of n dice, enumerated once and then a constant-time lookup.
+
+    :param n: `int` number of dice rolled, in range [1, 6]
+    :return:
+        RollOdds(farkle, hot_dice, best_score, expected_best_score) where farkle is
+        the probability of no scoring dice, hot_dice the probability that every die
+        can be kept as scoring dice, best_score a :py:class:`dict` of the best
+        immediate score -> probability (0 being a farkle), and expected_best_score
+        is the mean best immediate score.
+    """
+    assert 1 <= n <= 6, "rolling {0} Dice is not within allowed range: [1,6].".format(n)
+    return _roll_odds_table()[n]
+
+
+def farkle_probability(n):
+    """ Probability that a roll of n dice has no scoring dice. """
+    return roll_odds(n).farkle
+
+
+def hot_dice_probability(n):
+    """ Probability that all n dice rolled can be kept as scoring dice. """
+    return roll_odds(n).hot_dice
+
+
+@functools.lru_cache(maxsize=None)
+def _roll_odds_table():
+    """ Enumerate every distinct roll of 1-6 dice, weighting each by the number
+    of ordered rolls producing it out of 6^n.
+
+    :return: `tuple` : indexed by number of dice, RollOdds (index 0 is unused)
+    """
+    table = [None]
+    for n in range(1, 7):
+        total = 6 ** n
+        farkle = hot_dice = 0
+        best_score = collections.Counter()
+        for roll in itertools.combinations_with_replacement(range(1, 7), n):
+            ways = math.factorial(n)
+            for count in dice_counts(dice_signature(roll)):
+                ways //= math.factorial(count)
+            options = _keep_options(dice_signature(roll))
+            if not options:
+                farkle += ways
+            elif any(not option.remaining for option in options):
+                hot_dice += ways
+            best_score[options[0].points if options else 0] += ways
+
+        distribution = types.MappingProxyType(
+            {points: ways / total for points, ways in sorted(best_score.items())})
+        expected = sum(points * ways for points, ways in best_score.items()) / total
+        table.append(RollOdds(farkle / total, hot_dice / total, distribution, expected))
+    return tuple(table)
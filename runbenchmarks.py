@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+""" Benchmarks for the scoring and validation hot paths in parkle.utils.
+
+    python runbenchmarks.py --output bench.json
+    python runbenchmarks.py --compare bench.json --threshold 0.1
+
+Each benchmark reports ops/sec, timing batches of calls, and the percentiles of each
+call's own latency, timed alone (less the timer's overhead).  With --compare,
+the run fails if any benchmark's ops/sec regressed by more than the threshold.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+
+import numpy
+
+from parkle import bots
+from parkle import simulator
+from parkle import utils
+
+BATCH_SIZE = 100  # Calls timed together for ops/sec, to amortize timer overhead
+PERCENTILES = (50, 90, 99)
+
+
+def exhaustive_rolls():
+    """ Every ordered roll of 1-6 dice. """
+    return [list(roll) for n in range(1, 7) for roll in itertools.product(range(1, 7), repeat=n)]
+
+
+def turn_mix(turns=2000, seed=0):
+    """ Rolls and kept sets seen playing realistic turns, from a seeded bank threshold bot.
+
+    :return: (rolls, kept sets, dice counts rolled)
+    """
+    dice = simulator.DiceStream(numpy.random.default_rng(seed))
+    strategy = bots.BankThreshold(400, 2)
+    rolls, kept_sets, dice_counts = [], [], []
+    for turn in range(0, turns):
+        turn_points, dice_left = 0, 6
+        while True:
+            dice_rolled = dice.roll(dice_left)
+            rolls.append(dice_rolled)
+            dice_counts.append(dice_left)
+            options = utils.keep_options(dice_rolled)
+            if not options:
+                break
+            keep, bank = strategy.decide(bots.GameView((0, 0), 0, turn_points, tuple(dice_rolled), options))
+            kept_sets.append(list(keep.kept))
+            turn_points += keep.points
+            if bank:
+                break
+            dice_left = len(keep.remaining) or 6
+    return rolls, kept_sets, dice_counts
+
+
+def build_benchmarks():
+    """ :return: :py:class:`list` of (name, function, list of argument values) """
+    rolls = exhaustive_rolls()
+    scoring_sets = [roll for roll in rolls if utils.validate_kept_set(roll)[0]]
+    nested_rolls = [utils.nested_dice(roll) for roll in rolls]
+    mix_rolls, mix_kept, mix_counts = turn_mix()
+    mix_nested = [utils.nested_dice(roll) for roll in mix_rolls]
+
+    return [
+        ('single.calculate_point_set', utils.calculate_point_set, [[1, 1, 1, 5, 5]] * 1000),
+        ('single.validate_kept_set', utils.validate_kept_set, [[4, 4, 4, 1]] * 1000),
+        ('single.points_possible', utils.points_possible, [[(2, 2), (3, 1), (4, 2), (6, 1)]] * 1000),
+        ('single.nested_dice', utils.nested_dice, [[3, 5, 5, 6, 6, 6]] * 1000),
+        ('single.dice_roll', utils.dice_roll, [6] * 1000),
+        ('exhaustive.calculate_point_set', utils.calculate_point_set, scoring_sets),
+        ('exhaustive.validate_kept_set', utils.validate_kept_set, rolls),
+        ('exhaustive.points_possible', utils.points_possible, nested_rolls),
+        ('exhaustive.nested_dice', utils.nested_dice, rolls),
+        ('exhaustive.keep_options', utils.keep_options, rolls),
+        ('turns.dice_roll', utils.dice_roll, mix_counts),
+        ('turns.nested_dice', utils.nested_dice, mix_rolls),
+        ('turns.points_possible', utils.points_possible, mix_nested),
+        ('turns.validate_kept_set', utils.validate_kept_set, mix_kept),
+        ('turns.calculate_point_set', utils.calculate_point_set, mix_kept),
+    ]
+
+
+def timer_overhead(samples=10000):
+    """ :return: median ns between two back to back reads of the clock """
+    clock = time.perf_counter_ns
+    durations = []
+    for i in range(0, samples):
+        started = clock()
+        durations.append(clock() - started)
+    return float(numpy.median(durations))
+
+
+def run_benchmark(function, arguments, min_time=0.5):
+    """ Call function over the arguments, repeating until min_time has passed:  half of it
+    in batches for ops/sec, and half timing each call alone for the latency percentiles.
+
+    :return: :py:class:`dict` of calls, ops per second and per-call latency percentiles in ns
+    """
+    calls = 0
+    elapsed = 0.0
+    batches = [arguments[i:i + BATCH_SIZE] for i in range(0, len(arguments), BATCH_SIZE)]
+    clock = time.perf_counter
+    while elapsed < min_time / 2:
+        for batch in batches:
+            started = clock()
+            for argument in batch:
+                function(argument)
+            elapsed += clock() - started
+            calls += len(batch)
+
+    samples = []
+    clock_ns = time.perf_counter_ns
+    deadline = clock() + min_time / 2
+    while clock() < deadline:
+        for argument in arguments:
+            started = clock_ns()
+            function(argument)
+            samples.append(clock_ns() - started)
+
+    latencies = numpy.maximum(numpy.percentile(samples, PERCENTILES) - timer_overhead(), 0)
+    result = {'calls': calls, 'ops_per_sec': calls / elapsed, 'latency_samples': len(samples)}
+    for percentile, latency in zip(PERCENTILES, latencies):
+        result['p{0}_ns'.format(percentile)] = float(latency)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """ :return: :py:class:`list` of regression messages, ops/sec lower than the baseline by more than threshold """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        change = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        if change < -threshold:
+            regressions.append("{0}: {1:.0f} ops/sec is {2:.1%} slower than {3:.0f}".format(
+                name, result['ops_per_sec'], -change, before['ops_per_sec']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parkle scoring and validation hot paths.")
+    parser.add_argument('--output', help="save the results as JSON to this path")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed fractional ops/sec regression against the baseline (default 0.10)")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to run each benchmark")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, function, arguments in build_benchmarks():
+        if args.filter not in name:
+            continue
+        results[name] = result = run_benchmark(function, arguments, args.min_time)
+        print("{0:<34} {1:>12,.0f} ops/sec   p50 {2:>8,.0f} ns   p90 {3:>8,.0f} ns   p99 {4:>8,.0f} ns".format(
+            name, result['ops_per_sec'], result['p50_ns'], result['p90_ns'], result['p99_ns']))
+
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.time(),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,9 @@
 #!/usr/bin/env python
 
-import os
-
 import pytest
 
-
-if 'DJANGO_SETTINGS_MODULE' not in os.environ:
-    os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+# The tests configure django themselves, with a sqlite database and the in-memory state
+# backend (see conftest.py).  Set DJANGO_SETTINGS_MODULE to test with other settings.
 
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 # Django settings for django_parkle project.
+import os
 
 DEBUG = True
 TEMPLATE_DEBUG = DEBUG
@@ -20,6 +21,37 @@ DATABASES = {
      }
 }
 
+# Where games in progress are kept, see parkle.backends.  'parkle.backends.MemoryBackend'
+# keeps them in process, for a single process deployment.
+PARKLE_STATE_BACKEND = 'parkle.backends.RedisBackend'
+
+# Game state redis, see parkle.state_utils.  URL may also be a unix socket,
+# such as 'unix:///var/run/redis/redis.sock?db=0'
+PARKLE_REDIS = {
+    'URL': 'redis://127.0.0.1:6379/0',
+    'MAX_CONNECTIONS': 50,          # Per process, for each of the sync and asyncio pools
+    'SOCKET_TIMEOUT': 5.0,          # Seconds
+    'SOCKET_CONNECT_TIMEOUT': 5.0,  # Seconds
+    'HEALTH_CHECK_INTERVAL': 30,    # Seconds idle before a connection is checked on checkout
+    'COMPACT': False,               # Keep each game as one binary record, read with a single GET
+    'GAME_IDLE_TTL': 24 * 60 * 60,  # Seconds without an action before `manage.py sweep_games` reclaims a game
+    'ROUTING': 'single',            # 'single' node at URL, a 'cluster' reached from URL, or independent 'nodes'
+    'NODES': [],                    # URLs of the independent nodes for 'nodes' routing
+}
+
+# Cache of player authentication, see accounts.cache.  Each process trusts its copy of
+# a player for TTL seconds, behind a cache in the game state redis shared by every process.
+PARKLE_PLAYER_CACHE = {
+    'SIZE': 10000,          # Players kept in each process
+    'TTL': 30,              # Seconds
+    'REDIS_TTL': 60 * 60,   # Seconds
+    'REDIS': True,          # False without redis, such as with the MemoryBackend
+}
+
+# Serve the game end-points with the async views of api.async_views, set by asgi.py.
+# Under WSGI the DRF views of api.views are faster, without an event loop per request.
+PARKLE_ASYNC_VIEWS = os.environ.get('PARKLE_ASYNC_VIEWS') == '1'
+
 # Hosts/domain names that are valid for this site; required if DEBUG is False
 # See https://docs.djangoproject.com/en/{{ docs_version }}/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = ['*',]
@@ -153,7 +185,7 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.SessionAuthentication',
+        'accounts.authentication.PlayerKeyAuthentication',  # The player_api_key and player_secret_key of a request
     )
 }
 